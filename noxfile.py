@@ -124,7 +124,7 @@ def precommit(session: Session) -> None:
 @session(python=python_versions)
 def mypy(session: Session) -> None:
     """Type-check using mypy."""
-    session.install(".")
+    session.install(".[asyncio,server]")
     session.install("mypy", "pytest")
     session.run("mypy", *(session.posargs or ["src", "tests"]))
     session.run("mypy", f"--python-executable={sys.executable}", "noxfile.py")
@@ -133,7 +133,7 @@ def mypy(session: Session) -> None:
 @session(python=python_versions)
 def tests(session: Session) -> None:
     """Run the test suite."""
-    session.install(".")
+    session.install(".[asyncio,server]")
     session.install("coverage[toml]", "pytest", "pygments")
     session.run("coverage", "run", *session.posargs)
 
@@ -152,7 +152,7 @@ def coverage(session: Session) -> None:
 @session(python=python_versions[0])
 def typeguard(session: Session) -> None:
     """Runtime type checking using Typeguard."""
-    session.install(".")
+    session.install(".[asyncio,server]")
     session.install("pytest", "typeguard", "pygments")
     session.run("pytest", f"--typeguard-packages={package}", *session.posargs)
 
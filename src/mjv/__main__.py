@@ -1,12 +1,35 @@
 """Command-line interface."""
 
+import importlib
+import logging
+import os
+from pathlib import Path
+from typing import IO, Any
+
 import click
+from flask import Flask
+from sqlalchemy import or_
 
+from .apis.todo.imports import (
+    CSV_MIMETYPES,
+    DEFAULT_IMPORT_BATCH_SIZE,
+    DEFAULT_IMPORT_MAX_ERRORS,
+    NDJSON_MIMETYPES,
+    import_todos,
+    records,
+)
+from .apis.user.models import User
 from .app import create_app
-from .extensions import db
+from .audit import explain_route_queries
+from .extensions import change_log, db, hasher, shards
+
+
+@click.group()
+def cli() -> None:
+    """MJV TODO API management commands."""
 
 
-@click.command()
+@cli.command()
 @click.option("--host", default="127.0.0.1", help="The hostname to listen on.")
 @click.option("--port", default=5000, help="The port to listen on.")
 @click.option("--debug", is_flag=True, help="Enable or disable debug mode.")
@@ -18,5 +41,206 @@ def run(host: str, port: int, debug: bool) -> None:
     app.run(host=host, port=port, debug=debug)
 
 
+def load_app() -> Flask:
+    """Create the app from the current settings, with its tables."""
+    # Read the settings again, for reloads to pick up changes to them.
+    app = create_app(importlib.reload(importlib.import_module("mjv.settings")))
+    with app.app_context():
+        db.create_all()
+    return app
+
+
+@cli.command()
+@click.option("--host", default="127.0.0.1", show_default=True, help="The hostname to listen on.")
+@click.option("--port", default=5000, show_default=True, help="The port to listen on.")
+@click.option(
+    "--workers",
+    type=click.IntRange(1),
+    default=os.cpu_count() or 1,
+    show_default="number of CPUs",
+    help="Number of worker processes.",
+)
+@click.option(
+    "--threads", type=click.IntRange(1), default=4, show_default=True, help="Threads per worker."
+)
+@click.option(
+    "--backlog",
+    type=click.IntRange(1),
+    default=2048,
+    show_default=True,
+    help="Maximum number of connections waiting to be accepted.",
+)
+@click.option(
+    "--keep-alive",
+    type=click.IntRange(1),
+    default=2,
+    show_default=True,
+    help="Seconds an idle connection is held open, waiting for its next request.",
+)
+@click.option(
+    "--max-requests",
+    type=click.IntRange(0),
+    default=0,
+    show_default=True,
+    help="Replace a worker after this many requests, 0 never does.",
+)
+@click.option(
+    "--max-requests-jitter",
+    type=click.IntRange(0),
+    default=0,
+    show_default=True,
+    help="Random extra requests per worker, so workers are not all replaced at once.",
+)
+@click.option(
+    "--graceful-timeout",
+    type=click.IntRange(0),
+    default=30,
+    show_default=True,
+    help="Seconds stopping workers have to finish their requests.",
+)
+def serve(**options: Any) -> None:
+    """Serve the application with a pool of prefork workers, for production.
+
+    The app is loaded once, before the workers are forked. Send SIGHUP to reload the
+    configuration and gracefully replace the workers, SIGTERM to stop gracefully.
+    Needs the server extra.
+    """
+    try:
+        from .server import Server, ServerConfig
+    except ImportError as error:
+        raise click.ClickException('Install the server extra: pip install "mjv[server]"') from error
+    logging.basicConfig(level=logging.INFO, format="[%(process)d] %(levelname)s %(message)s")
+    Server(load_app, ServerConfig(**options)).run()
+
+
+@cli.command("check-indexes")
+@click.option("--verbose", "-v", is_flag=True, help="Print the query plan of every route.")
+def check_indexes(verbose: bool) -> None:
+    """Explain the queries of every route and fail on full table scans."""
+    app = create_app()
+    with app.app_context():
+        db.create_all()
+        plans = list(explain_route_queries())
+
+    for plan in plans:
+        if verbose or plan.full_scans:
+            click.echo(f"{plan.route}: {plan.sql}")
+            for line in plan.plan:
+                click.echo(f"    {line}")
+    if scans := [plan.route for plan in plans if plan.full_scans]:
+        raise click.ClickException(f"Full table scan in: {', '.join(scans)}")
+    click.echo(f"{len(plans)} route queries use an index.")
+
+
+def _find_user(username: str) -> User:
+    user = User.query.filter(or_(User.username == username, User.email == username)).first()
+    if user is None:
+        raise click.ClickException(f"No user {username}")
+    return user  # type: ignore
+
+
+@cli.command("import")
+@click.argument("file", type=click.File("rb"))
+@click.option("--user", "username", required=True, help="Username or email of the owner.")
+@click.option(
+    "--format",
+    "file_format",
+    type=click.Choice(["ndjson", "csv"]),
+    help="Format of FILE, by default guessed from its extension.",
+)
+@click.option("--batch-size", type=click.IntRange(1), help="Todos inserted per transaction.")
+def import_command(
+    file: IO[bytes], username: str, file_format: str | None, batch_size: int | None
+) -> None:
+    """Import todos from a newline delimited JSON or CSV FILE, one todo per line."""
+    file_format = file_format or (
+        "csv" if Path(getattr(file, "name", "")).suffix.lower() == ".csv" else "ndjson"
+    )
+    mimetype = (CSV_MIMETYPES if file_format == "csv" else NDJSON_MIMETYPES)[0]
+    app = create_app()
+    with app.app_context():
+        db.create_all()
+        user = _find_user(username)
+        with shards.using(user.id):
+            report = import_todos(
+                records(file, mimetype),
+                user.id,
+                batch_size or app.config.get("TODO_IMPORT_BATCH_SIZE", DEFAULT_IMPORT_BATCH_SIZE),
+                max_errors=app.config.get("TODO_IMPORT_MAX_ERRORS", DEFAULT_IMPORT_MAX_ERRORS),
+            )
+
+    for line, message in report.errors.items():
+        click.echo(f"line {line}: {message}", err=True)
+    click.echo(f"{report.imported} todos imported, {report.failed} lines rejected.")
+    if report.failed:
+        raise click.ClickException(f"{report.failed} lines were not imported")
+
+
+@cli.command("compact-tombstones")
+def compact_tombstones() -> None:
+    """Remove the tombstones of todos deleted before TOMBSTONE_RETENTION_DAYS, run it daily."""
+    app = load_app()
+    with app.app_context():
+        removed = change_log.compact()
+    click.echo(f"{removed} tombstones removed.")
+
+
+@cli.group("shards")
+def shards_group() -> None:
+    """Todo shards management commands."""
+
+
+@shards_group.command()
+@click.argument("username")
+@click.argument("shard", type=click.IntRange(0))
+def move(username: str, shard: int) -> None:
+    """Move the todos of USERNAME, or email, to the SHARD at that index of the shard URIs."""
+    app = load_app()
+    with app.app_context():
+        if not shards.engines(app):
+            raise click.ClickException("Sharding is not configured, set DATABASE_SHARD_URLS")
+        user = _find_user(username)
+        try:
+            moved = shards.move(user.id, shard)
+        except ValueError as error:
+            raise click.ClickException(str(error)) from error
+    click.echo(f"{moved} todos of {user} moved to shard {shard}.")
+
+
+@shards_group.command()
+def rebalance() -> None:
+    """Move the todos of every user not on their shard, like after adding shards."""
+    app = load_app()
+    with app.app_context():
+        if not shards.engines(app):
+            raise click.ClickException("Sharding is not configured, set DATABASE_SHARD_URLS")
+        users = 0
+        for user_id, source, target, moved in shards.rebalance():
+            click.echo(f"user {user_id}: {moved} todos moved from shard {source} to {target}")
+            users += 1
+    click.echo(f"{users} users moved.")
+
+
+@cli.group()
+def auth() -> None:
+    """Authentication management commands."""
+
+
+@auth.command()
+@click.option(
+    "--target-ms", default=150.0, show_default=True, help="Time budget of one password hash."
+)
+def calibrate(target_ms: float) -> None:
+    """Measure bcrypt on this host and recommend BCRYPT_LOG_ROUNDS."""
+    recommended = None
+    for rounds, elapsed in hasher.calibrate(target_ms):
+        click.echo(f"rounds={rounds:<2} {elapsed:8.1f} ms")
+        if elapsed <= target_ms:
+            recommended = rounds
+    if recommended is None:
+        raise click.ClickException(f"Even the lowest cost takes longer than {target_ms} ms")
+    click.echo(f"BCRYPT_LOG_ROUNDS={recommended}")
+
+
 if __name__ == "__main__":
-    run(prog_name="mjv")  # pragma: no cover
+    cli(prog_name="mjv")  # pragma: no cover
@@ -1,8 +1,11 @@
 """Register all publically exposed namespace."""
 
+from mjv.asgi import AsyncNamespace
 from mjv.extensions import api
 
+from .todo.async_routes import ns as async_todo
 from .todo.routes import ns as todo
+from .user.async_routes import ns as async_auth
 from .user.routes import ns as auth
 
 
@@ -10,3 +13,8 @@ def register_namespaces() -> None:
     """Initialize registered namespaces."""
     api.add_namespace(todo, path="/todo")
     api.add_namespace(auth, path="/auth")
+
+
+def async_namespaces() -> list[AsyncNamespace]:
+    """Namespaces with async resources, served by the ASGI app."""
+    return [async_todo, async_auth]
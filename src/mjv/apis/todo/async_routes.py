@@ -0,0 +1,145 @@
+"""Async todo routes, served by the ASGI app."""
+
+from http import HTTPStatus
+from typing import Any
+
+from flask import Response, current_app
+from sqlalchemy import select
+from werkzeug.exceptions import PreconditionFailed
+
+from mjv.asgi import AsyncNamespace, AsyncRequest, abort, jwt_required, make_response
+from mjv.conditional import check_not_modified, check_precondition, etag_header
+from mjv.extensions import async_db
+from mjv.pagination import DEFAULT_PAGE_SIZE, InvalidCursor, keyset_query, keyset_result
+from mjv.queries import query_budget
+
+from .models import Todo
+from .parsers import todo_list_parser, todo_parser, todo_patch_parser
+from .routes import (
+    cache_list,
+    cached_list,
+    list_criteria,
+    list_etag,
+    list_order,
+    list_state,
+    todo_model,
+)
+
+ns = AsyncNamespace("todos")
+
+
+async def _get_todo(id: int, user_id: int) -> Todo:
+    todo = await async_db.session.scalar(select(Todo).where(Todo.id == id, Todo.user_id == user_id))
+    if todo is None:
+        abort(HTTPStatus.NOT_FOUND, "Todo not found")
+    return todo
+
+
+@ns.route("/todos/", methods=["GET"])
+@jwt_required
+@query_budget(2)
+async def list_todos(request: AsyncRequest) -> Response:
+    """List tasks, one page at a time, through the list cache when enabled."""
+    user_id = request.identity
+    generation, cached = cached_list(user_id)
+    if cached is not None:
+        return cached
+    response = make_response(await _list_todos(request, user_id))
+    if generation is not None:
+        cache_list(user_id, generation, response)
+    return response
+
+
+async def _list_todos(
+    request: AsyncRequest, user_id: Any
+) -> tuple[Any, HTTPStatus, dict[str, str]]:
+    args = todo_list_parser.parse_args(req=request)
+    state = (await async_db.session.execute(list_state(user_id))).one()
+    check_not_modified(etag := list_etag(user_id, state, request.args), request.if_none_match)
+    query = select(Todo).where(*list_criteria(user_id, args, async_db.engine.dialect.name))
+    keys, descending = list_order(args["sort"])
+    if args["all"]:
+        order = [key.desc() for key in keys] if descending else keys
+        todos = (await async_db.session.scalars(query.order_by(*order))).all()
+        return request.marshal(todos, todo_model), HTTPStatus.OK, etag_header(etag)
+
+    limit = args["limit"] or current_app.config.get("TODO_PAGE_SIZE", DEFAULT_PAGE_SIZE)
+    try:
+        query = keyset_query(query, keys, limit, args["after"], descending)
+    except InvalidCursor:
+        abort(HTTPStatus.BAD_REQUEST, "Invalid pagination cursor")
+    rows = (await async_db.session.scalars(query)).all()
+    todos, cursor = keyset_result(rows, keys, limit)
+    return (
+        request.marshal(todos, todo_model),
+        HTTPStatus.OK,
+        {**etag_header(etag), **request.next_link(cursor, limit=limit)},
+    )
+
+
+@ns.route("/todos/", methods=["POST"])
+@jwt_required
+@query_budget(3)
+async def create_todo(request: AsyncRequest) -> tuple[Any, HTTPStatus]:
+    """Create a new task."""
+    args = todo_parser.parse_args(req=request)
+    todo = await Todo.acreate(user_id=request.identity, **args)
+    return request.marshal(todo, todo_model), HTTPStatus.CREATED
+
+
+@ns.route("/todos/<int:id>", methods=["GET"])
+@jwt_required
+@query_budget(1)
+async def get_todo(request: AsyncRequest, id: int) -> tuple[Any, HTTPStatus, dict[str, str]]:
+    """Fetch a given resource."""
+    todo = await _get_todo(id, request.identity)
+    check_not_modified(todo.etag, request.if_none_match)
+    return request.marshal(todo, todo_model), HTTPStatus.OK, etag_header(todo.etag)
+
+
+@ns.route("/todos/<int:id>", methods=["DELETE"])
+@jwt_required
+@query_budget(4)
+async def delete_todo(request: AsyncRequest, id: int) -> tuple[None, HTTPStatus]:
+    """Delete a task given its identifier."""
+    todo = await _get_todo(id, request.identity)
+    if check_precondition(todo.etag, request.if_match):
+        if not await Todo.abulk_delete(Todo.id == id, Todo.version == todo.version):
+            raise PreconditionFailed()
+    else:
+        await todo.adelete()
+    return None, HTTPStatus.NO_CONTENT
+
+
+@ns.route("/todos/<int:id>", methods=["PUT"])
+@jwt_required
+@query_budget(4)
+async def put_todo(request: AsyncRequest, id: int) -> tuple[Any, HTTPStatus, dict[str, str]]:
+    """Update a task given its identifier."""
+    todo = await _get_todo(id, request.identity)
+    args = todo_parser.parse_args(req=request)
+    if check_precondition(todo.etag, request.if_match):
+        updated = await Todo.aupdate_returning(Todo.id == id, Todo.version == todo.version, **args)
+        if updated is None:
+            raise PreconditionFailed()
+        todo = updated
+    else:
+        todo = await todo.aupdate(**args)
+    return request.marshal(todo, todo_model), HTTPStatus.OK, etag_header(todo.etag)
+
+
+@ns.route("/todos/<int:id>", methods=["PATCH"])
+@jwt_required
+@query_budget(2)
+async def patch_todo(request: AsyncRequest, id: int) -> tuple[Any, HTTPStatus, dict[str, str]]:
+    """Update only the given fields of a task, in a single statement."""
+    user_id = request.identity
+    if not (args := todo_patch_parser.parse_args(req=request)):
+        todo = await _get_todo(id, user_id)
+    elif not (
+        updated := await Todo.aupdate_returning(Todo.id == id, Todo.user_id == user_id, **args)
+    ):
+        abort(HTTPStatus.NOT_FOUND, "Todo not found")
+    else:
+        todo = updated
+    return request.marshal(todo, todo_model), HTTPStatus.OK, etag_header(todo.etag)
@@ -0,0 +1,115 @@
+"""Bulk import of todos from newline delimited JSON or CSV."""
+
+import csv
+import json
+from dataclasses import dataclass, field
+from typing import IO, Any, Iterable, Iterator
+
+from flask_restx import inputs
+
+from .models import Todo
+from .parsers import validate_todo
+
+NDJSON_MIMETYPES = ("application/x-ndjson", "application/jsonl", "application/json-lines")
+CSV_MIMETYPES = ("text/csv",)
+
+DEFAULT_IMPORT_BATCH_SIZE = 1000
+DEFAULT_IMPORT_MAX_ERRORS = 100
+
+# A numbered record of the upload, or the error that kept it from being read.
+Record = tuple[int, Any | ValueError]
+
+
+@dataclass
+class ImportReport:
+    """Outcome of an import.
+
+    Args:
+        imported: Number of created todos.
+        failed: Number of rejected lines.
+        errors: Error message of the first rejected lines, by line number.
+        max_errors: Maximum number of reported errors.
+    """
+
+    imported: int = 0
+    failed: int = 0
+    errors: dict[int, str] = field(default_factory=dict)
+    max_errors: int = DEFAULT_IMPORT_MAX_ERRORS
+
+    def reject(self, line: int, error: ValueError) -> None:
+        """Count line number ``line`` as rejected because of ``error``."""
+        self.failed += 1
+        if len(self.errors) < self.max_errors:
+            self.errors[line] = str(error)
+
+
+def ndjson_records(lines: Iterable[bytes]) -> Iterator[Record]:
+    """Decode a JSON document from each non blank line."""
+    for number, line in enumerate(lines, 1):
+        if not line.strip():
+            continue
+        try:
+            yield number, json.loads(line)
+        except ValueError:
+            yield number, ValueError("Invalid JSON")
+
+
+def csv_records(lines: Iterable[bytes]) -> Iterator[Record]:
+    """Read a todo from each row of a CSV with a ``task`` and optional ``completed`` header."""
+    reader = csv.DictReader(line.decode("utf-8", errors="replace") for line in lines)
+    while True:
+        try:
+            row = next(reader)
+        except StopIteration:
+            return
+        except csv.Error as error:
+            yield reader.line_num, ValueError(f"Invalid CSV: {error}")
+            continue
+        try:
+            completed = inputs.boolean(row["completed"]) if row.get("completed") else None
+        except ValueError as error:
+            yield reader.line_num, error
+            continue
+        # CSV has no null, an empty cell is a missing value.
+        yield reader.line_num, {"task": row.get("task") or None, "completed": completed}
+
+
+def records(stream: IO[bytes], mimetype: str) -> Iterator[Record]:
+    """Read the records of an upload of the given ``mimetype`` from ``stream``, line by line.
+
+    Raises:
+        ValueError: When ``mimetype`` is not a supported format.
+    """
+    if mimetype in NDJSON_MIMETYPES:
+        return ndjson_records(stream)
+    if mimetype in CSV_MIMETYPES:
+        return csv_records(stream)
+    raise ValueError(f"Unsupported format {mimetype}")
+
+
+def import_todos(
+    records: Iterable[Record],
+    user_id: int,
+    batch_size: int = DEFAULT_IMPORT_BATCH_SIZE,
+    max_errors: int = DEFAULT_IMPORT_MAX_ERRORS,
+) -> ImportReport:
+    """Create a todo of ``user_id`` for every valid record, skipping and reporting invalid ones.
+
+    Todos are inserted ``batch_size`` at a time, each batch in a transaction of its own, so an
+    upload is never held in memory at once. A failing batch leaves the previous ones imported.
+    """
+    report = ImportReport(max_errors=max_errors)
+    batch: list[dict[str, Any]] = []
+    for line, record in records:
+        try:
+            if isinstance(record, ValueError):
+                raise record
+            batch.append({"user_id": user_id, **validate_todo(record)})
+        except ValueError as error:
+            report.reject(line, error)
+            continue
+        if len(batch) >= batch_size:
+            report.imported += Todo.bulk_insert(batch)
+            batch = []
+    report.imported += Todo.bulk_insert(batch)
+    return report
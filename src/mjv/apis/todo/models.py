@@ -4,19 +4,45 @@ from datetime import UTC, datetime
 from typing import Any, Iterable, Self, override
 
 from flask_restx.fields import Boolean, DateTime, Integer, String
+from sqlalchemy import ColumnElement
 
 from mjv.database import Column, DataBasePrimitives, PkModel, reference_col
-from mjv.extensions import db
+from mjv.extensions import change_log, db, list_cache, shards
+
+
+def _timestamp_completion(**kwargs: DataBasePrimitives) -> dict[str, DataBasePrimitives]:
+    if "completed" in kwargs and kwargs["completed"]:
+        kwargs.setdefault("completed_at", datetime.now(UTC))
+    return kwargs
 
 
 class Todo(PkModel):
     """Todo ORM model."""
 
+    __table_args__ = (
+        db.Index("ix_todo_user_id_id", "user_id", "id"),
+        db.Index("ix_todo_user_id_completed_id", "user_id", "completed", "id"),
+        db.Index("ix_todo_user_id_change_seq", "user_id", "change_seq"),
+        db.Index("ix_todo_change_seq", "change_seq"),
+        # Never reuse the identifier of a deleted todo, synced clients still know it.
+        {"sqlite_autoincrement": True},
+    )
+
     task = Column(db.String(80), nullable=False)
     completed = Column(db.Boolean, default=False)
     completed_at = Column(db.DateTime)
     user_id = reference_col("user", nullable=False)
     user = db.relationship("User", back_populates="todos")
+    # Number of the last change, from the change sequence shared with the tombstones. Rows
+    # written behind the back of the models, or before the column existed, are numbered 0.
+    change_seq = Column(
+        db.Integer,
+        nullable=False,
+        default=change_log.next_change,
+        onupdate=change_log.next_change,
+        server_default="0",
+        info={"shard_local": True},
+    )
 
     def __str__(self) -> str:
         """User instance string representation."""
@@ -41,9 +67,59 @@ class Todo(PkModel):
             *super().field_descriptions(),
         )
 
+    @override
+    @classmethod
+    def bulk_create(
+        cls, rows: Iterable[dict[str, DataBasePrimitives]], commit: bool = True
+    ) -> list[Self]:
+        """Create many todos with a single INSERT statement."""
+        return super().bulk_create((_timestamp_completion(**row) for row in rows), commit)
+
+    @override
+    @classmethod
+    def bulk_insert(cls, rows: Iterable[dict[str, DataBasePrimitives]], commit: bool = True) -> int:
+        """Create many todos with a batched INSERT, without loading them back."""
+        return super().bulk_insert((_timestamp_completion(**row) for row in rows), commit)
+
     @override
     def update(self, commit: bool = True, **kwargs: DataBasePrimitives) -> Self:
         """Update specific todo fields."""
-        if "completed" in kwargs and kwargs["completed"]:
-            kwargs.setdefault("completed_at", datetime.now(UTC))
-        return super().update(commit, **kwargs)
+        return super().update(commit, **_timestamp_completion(**kwargs))
+
+    @override
+    @classmethod
+    def bulk_update(
+        cls, *criteria: ColumnElement[bool], commit: bool = True, **kwargs: DataBasePrimitives
+    ) -> int:
+        """Update specific fields of every todo matching ``criteria``."""
+        return super().bulk_update(*criteria, commit=commit, **_timestamp_completion(**kwargs))
+
+    @override
+    @classmethod
+    def update_returning(
+        cls, *criteria: ColumnElement[bool], commit: bool = True, **kwargs: DataBasePrimitives
+    ) -> Self | None:
+        """Update specific fields of the todo matching ``criteria`` in a single statement."""
+        return super().update_returning(*criteria, commit=commit, **_timestamp_completion(**kwargs))
+
+    @override
+    async def aupdate(self, commit: bool = True, **kwargs: DataBasePrimitives) -> Self:
+        """Update specific todo fields, asynchronously."""
+        return await super().aupdate(commit, **_timestamp_completion(**kwargs))
+
+    @override
+    @classmethod
+    async def aupdate_returning(
+        cls, *criteria: ColumnElement[bool], commit: bool = True, **kwargs: DataBasePrimitives
+    ) -> Self | None:
+        """Update specific fields of the todo matching ``criteria``, asynchronously."""
+        return await super().aupdate_returning(
+            *criteria, commit=commit, **_timestamp_completion(**kwargs)
+        )
+
+
+list_cache.watch(Todo, owner="user_id")
+shards.watch(Todo, key="user_id")
+change_log.watch(Todo, owner="user_id")
+shards.watch(change_log.tombstones, key="owner")
+shards.watch(change_log.counter, key=None)
@@ -1,7 +1,16 @@
 """Todo's namespace POST parsers."""
 
+from datetime import UTC, datetime
+from typing import Any
+
+from flask_restx import inputs
 from flask_restx.reqparse import RequestParser
 
+from mjv.database import DataBasePrimitives
+from mjv.pagination import MAX_PAGE_SIZE
+
+from .models import Todo
+
 
 def _todo_parser() -> RequestParser:
     parser = RequestParser()
@@ -10,4 +19,134 @@ def _todo_parser() -> RequestParser:
     return parser
 
 
+def _todo_patch_parser() -> RequestParser:
+    parser = RequestParser()
+    parser.add_argument("task", type=str, store_missing=False, help="Task details", location="json")
+    parser.add_argument(
+        "completed", type=bool, store_missing=False, help="Task completion status", location="json"
+    )
+    return parser
+
+
+def _utc_datetime(value: str) -> datetime:
+    """ISO 8601 date and time, as a naive UTC datetime like the stored timestamps.
+
+    Values without a time zone are taken to be in UTC.
+    """
+    parsed: datetime = inputs.datetime_from_iso8601(value)
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(UTC).replace(tzinfo=None)
+    return parsed
+
+
+# Orders of the todo list, a leading "-" sorts in descending order.
+SORT_KEYS = ("id", "created_at", "modified_at", "task")
+SORT_ORDERS = (*SORT_KEYS, *(f"-{key}" for key in SORT_KEYS))
+
+
+def _todo_list_parser() -> RequestParser:
+    parser = RequestParser()
+    parser.add_argument(
+        "completed", type=inputs.boolean, help="Only tasks with this status", location="args"
+    )
+    parser.add_argument(
+        "created_after",
+        type=_utc_datetime,
+        help="Only tasks created after this ISO 8601 date and time",
+        location="args",
+    )
+    parser.add_argument(
+        "completed_before",
+        type=_utc_datetime,
+        help="Only tasks completed before this ISO 8601 date and time",
+        location="args",
+    )
+    parser.add_argument(
+        "q",
+        type=str,
+        help="Only tasks containing every search term, in any order, at the start of a word on "
+        "SQLite",
+        location="args",
+    )
+    parser.add_argument(
+        "sort",
+        choices=SORT_ORDERS,
+        default="id",
+        help="Order of the tasks, prefix with '-' for descending order",
+        location="args",
+    )
+    parser.add_argument(
+        "limit",
+        type=inputs.int_range(1, MAX_PAGE_SIZE),
+        help=f"Page size, between 1 and {MAX_PAGE_SIZE}",
+        location="args",
+    )
+    parser.add_argument("after", type=str, help="Cursor of the next page", location="args")
+    parser.add_argument(
+        "all",
+        type=inputs.boolean,
+        default=False,
+        help="Opt-in to receive every task in a single, unpaginated response",
+        location="args",
+    )
+    return parser
+
+
+def _todo_filter_parser() -> RequestParser:
+    parser = RequestParser()
+    parser.add_argument(
+        "completed", type=inputs.boolean, help="Only tasks with this status", location="args"
+    )
+    parser.add_argument(
+        "ids", type=int, action="split", help="Only tasks with these identifiers", location="args"
+    )
+    return parser
+
+
+def _todo_changes_parser() -> RequestParser:
+    parser = RequestParser()
+    parser.add_argument(
+        "since", type=str, help="Cursor of the last sync, none to list every task", location="args"
+    )
+    parser.add_argument(
+        "limit",
+        type=inputs.int_range(1, MAX_PAGE_SIZE),
+        help=f"Number of changes, between 1 and {MAX_PAGE_SIZE}",
+        location="args",
+    )
+    return parser
+
+
+def _todo_bulk_update_parser() -> RequestParser:
+    parser = RequestParser()
+    parser.add_argument(
+        "completed", type=bool, required=True, help="Task completion status", location="json"
+    )
+    return parser
+
+
+def validate_todo(item: Any) -> dict[str, DataBasePrimitives]:
+    """Validate a single JSON todo against the same rules as ``todo_parser``.
+
+    Raises:
+        ValueError: Describing the first rule ``item`` violates.
+    """
+    if not isinstance(item, dict):
+        raise ValueError("Todo must be a JSON object")
+    task = item.get("task")
+    if not isinstance(task, str):
+        raise ValueError("Task details is required")
+    if len(task) > Todo.task.type.length:
+        raise ValueError(f"Task details must be at most {Todo.task.type.length} characters")
+    completed = item.get("completed")
+    if completed is not None and not isinstance(completed, bool):
+        raise ValueError("Task completion status must be a boolean")
+    return {"task": task, "completed": bool(completed)}
+
+
 todo_parser: RequestParser = _todo_parser()
+todo_patch_parser: RequestParser = _todo_patch_parser()
+todo_list_parser: RequestParser = _todo_list_parser()
+todo_filter_parser: RequestParser = _todo_filter_parser()
+todo_changes_parser: RequestParser = _todo_changes_parser()
+todo_bulk_update_parser: RequestParser = _todo_bulk_update_parser()
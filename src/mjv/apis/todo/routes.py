@@ -1,18 +1,55 @@
 """Todo routes."""
 
-from typing import Iterable
+import io
+from datetime import datetime
+from functools import wraps
+from typing import IO, Any, Callable, Iterable
 
+from flask import Response, current_app, request
 from flask_jwt_extended import get_jwt_identity, jwt_required
 from flask_restx import Resource
 from flask_restx._http import HTTPStatus
+from flask_restx.fields import Boolean, Integer, List, Nested, String
+from flask_restx.utils import unpack
+from sqlalchemy import ColumnElement, Select, func, select
+from sqlalchemy.orm import InstrumentedAttribute
+from werkzeug.datastructures import MultiDict
+from werkzeug.exceptions import PreconditionFailed
 
-from mjv.extensions import api
+from mjv.conditional import check_not_modified, check_precondition, etag_header, make_etag
+from mjv.extensions import api, db, list_cache
+from mjv.pagination import DEFAULT_PAGE_SIZE, InvalidCursor, keyset_page, next_link
+from mjv.queries import query_budget
+from mjv.replicas import on_primary
+from mjv.serializers import compile_serializer, marshal_list_with, marshal_with
+from mjv.streaming import NDJSON_MIMETYPE, ndjson_response
 
+from .imports import (
+    CSV_MIMETYPES,
+    DEFAULT_IMPORT_BATCH_SIZE,
+    DEFAULT_IMPORT_MAX_ERRORS,
+    NDJSON_MIMETYPES,
+    import_todos,
+    records,
+)
 from .models import Todo
-from .parsers import todo_parser
+from .parsers import (
+    todo_bulk_update_parser,
+    todo_changes_parser,
+    todo_filter_parser,
+    todo_list_parser,
+    todo_parser,
+    todo_patch_parser,
+    validate_todo,
+)
+from .search import matching
+from .sync import CursorExpired, todo_changes
 
 ns = api.namespace("todos", description="To-Do operations")
 
+DEFAULT_BATCH_SIZE = 500
+DEFAULT_EXPORT_YIELD_PER = 1000
+
 
 todo_model = ns.model(
     "Todo",
@@ -23,31 +60,363 @@ todo_model = ns.model(
     },
 )
 
+updated_model = ns.model(
+    "UpdatedTodos", {"updated": Integer(readOnly=True, description="Number of updated tasks")}
+)
+deleted_model = ns.model(
+    "DeletedTodos", {"deleted": Integer(readOnly=True, description="Number of deleted tasks")}
+)
+
+import_error_model = ns.model(
+    "ImportError",
+    {
+        "line": Integer(readOnly=True, description="Line number in the upload"),
+        "message": String(readOnly=True, description="Why the line was rejected"),
+    },
+)
+import_report_model = ns.model(
+    "ImportReport",
+    {
+        "imported": Integer(readOnly=True, description="Number of created tasks"),
+        "failed": Integer(readOnly=True, description="Number of rejected lines"),
+        "errors": List(
+            Nested(import_error_model),
+            readOnly=True,
+            description="Errors of the first rejected lines",
+        ),
+    },
+)
+
+changes_model = ns.model(
+    "TodoChanges",
+    {
+        "todos": List(
+            Nested(todo_model), readOnly=True, description="Tasks created or modified since"
+        ),
+        "deleted": List(
+            Integer, readOnly=True, description="Identifiers of the tasks deleted since"
+        ),
+        "cursor": String(readOnly=True, description="Cursor of the next sync"),
+        "more": Boolean(readOnly=True, description="Whether more changes follow right away"),
+    },
+)
+
+serialize_todo = compile_serializer(todo_model)
+
+
+def filter_criteria(
+    user_id: int, ids: list[int] | None = None, completed: bool | None = None
+) -> list[ColumnElement[bool]]:
+    """Criteria of the todos of ``user_id`` matching the bulk update and delete filters."""
+    criteria = [Todo.user_id == user_id]
+    if ids is not None:
+        criteria.append(Todo.id.in_(ids))
+    if completed is not None:
+        criteria.append(Todo.completed == completed)
+    return criteria
+
+
+def list_criteria(user_id: int, args: dict[str, Any], dialect: str) -> list[ColumnElement[bool]]:
+    """Criteria of the todos of ``user_id`` matching the list filters of ``args``."""
+    criteria = filter_criteria(user_id, completed=args["completed"])
+    if args["created_after"] is not None:
+        criteria.append(Todo.created_at > args["created_after"])
+    if args["completed_before"] is not None:
+        criteria.append(Todo.completed_at < args["completed_before"])
+    if args["q"]:
+        criteria.append(matching(args["q"], dialect))
+    return criteria
+
+
+def list_order(sort: str) -> tuple[tuple[InstrumentedAttribute[Any], ...], bool]:
+    """Keys ordering the todo list by ``sort``, and whether in descending order.
+
+    The identifier breaks ties, so the keys are unique as keyset pagination requires.
+    """
+    key = sort.removeprefix("-")
+    keys = (Todo.id,) if key == "id" else (getattr(Todo, key), Todo.id)
+    return keys, sort.startswith("-")
+
+
+def list_state(user_id: int) -> Select[tuple[int, int, int, datetime]]:
+    """Aggregates of the user's todo list, any created, updated or deleted todo changes them."""
+    return select(
+        func.count(Todo.id),
+        func.max(Todo.id),
+        func.sum(Todo.version),
+        func.max(Todo.modified_at),
+    ).where(Todo.user_id == user_id)
+
+
+def export_query(user_id: int) -> Select[Any]:
+    """Fields of every todo of ``user_id`` as exported, ordered by identifier."""
+    return (
+        select(*(getattr(Todo, key) for key in todo_model))
+        .where(Todo.user_id == user_id)
+        .order_by(Todo.id)
+    )
+
+
+def list_etag(user_id: int, state: Iterable[Any], args: MultiDict[str, str]) -> str:
+    """Entity tag of the user's todo list in ``state``, as listed with the query ``args``."""
+    return make_etag(Todo.__tablename__, user_id, tuple(state), sorted(args.items(multi=True)))
+
+
+def _list_etag(user_id: int) -> str:
+    return list_etag(user_id, db.session.execute(list_state(user_id)).one(), request.args)
+
+
+def cached_list(user_id: Any) -> tuple[tuple[str, str] | None, Response | None]:
+    """Generation of the lists of the user, and the cached response to the current request.
+
+    The generation is None when the request is not cached: the list cache is disabled, or a
+    field mask is requested. The response is None when missing from the cache, store it with
+    :func:`cache_list` under the generation returned. Answers ``If-None-Match`` requests with
+    *304 Not Modified* while the cached list is unchanged.
+    """
+    if not list_cache.enabled or current_app.config["RESTX_MASK_HEADER"] in request.headers:
+        return None, None
+    generation = list_cache.generation(Todo, user_id)
+    if (cached := list_cache.get(Todo, user_id, request.url, generation)) is None:
+        return generation, None
+    etag, body, headers = cached
+    check_not_modified(etag)
+    return generation, current_app.response_class(body, headers=list(headers))
+
+
+def cache_list(user_id: Any, generation: tuple[str, str], response: Response) -> None:
+    """Store the ``response`` listing the todos of the user, read after ``generation``."""
+    if response.status_code == HTTPStatus.OK:
+        headers = tuple((k, v) for k, v in response.headers.items() if k != "Content-Length")
+        value = (response.get_etag()[0], response.get_data(), headers)
+        list_cache.set(Todo, user_id, request.url, value, generation)
+
+
+def _cached_list(view: Callable[..., Any]) -> Callable[..., Any]:
+    """Read the serialized list of the user's todos through the list cache, when enabled.
+
+    Lists missing from the cache are read from the primary database, a replica lagging behind
+    could miss writes of the current generation.
+    """
+
+    @wraps(view)
+    def wrapper(*args: Any, **kwargs: Any) -> Any:
+        user_id = get_jwt_identity()
+        generation, cached = cached_list(user_id)
+        if generation is None:
+            return view(*args, **kwargs)
+        if cached is not None:
+            return cached
+
+        with on_primary():
+            response = api.make_response(*unpack(view(*args, **kwargs)))
+        cache_list(user_id, generation, response)
+        return response
+
+    return wrapper
+
 
 @ns.route("/")
 class TodoList(Resource):
     """Shows a list of all to-dos, and lets you POST to add new tasks."""
 
     @jwt_required()
+    @query_budget(2)
+    @_cached_list
     @ns.doc("users_todos")
-    @ns.marshal_list_with(todo_model)
-    def get(self) -> Iterable[Todo]:
-        """List all tasks."""
-        return Todo.query.filter_by(user_id=get_jwt_identity()).all()  # type: ignore
+    @ns.expect(todo_list_parser)
+    @ns.response(HTTPStatus.BAD_REQUEST, "Invalid pagination cursor")
+    @ns.response(HTTPStatus.NOT_MODIFIED, "Tasks not modified")
+    @marshal_list_with(ns, todo_model)
+    def get(self) -> tuple[Iterable[Todo], HTTPStatus, dict[str, str]]:
+        """List tasks, one page at a time, filtered, searched and sorted by the database.
+
+        The ``Link`` response header points at the next page, if there is one.
+        Answers ``If-None-Match`` requests with *304 Not Modified* while the tasks are unchanged.
+        """
+        args = todo_list_parser.parse_args()
+        user_id = get_jwt_identity()
+        check_not_modified(etag := _list_etag(user_id))
+        query = Todo.query.filter(*list_criteria(user_id, args, db.engine.dialect.name))
+        keys, descending = list_order(args["sort"])
+        if args["all"]:
+            order = [key.desc() for key in keys] if descending else keys
+            return query.order_by(*order).all(), HTTPStatus.OK, etag_header(etag)
+
+        limit = args["limit"] or current_app.config.get("TODO_PAGE_SIZE", DEFAULT_PAGE_SIZE)
+        try:
+            todos, cursor = keyset_page(query, keys, limit, args["after"], descending)
+        except InvalidCursor:
+            ns.abort(HTTPStatus.BAD_REQUEST, "Invalid pagination cursor")
+        return todos, HTTPStatus.OK, {**etag_header(etag), **next_link(cursor, limit=limit)}
 
     @jwt_required()
+    @query_budget(3)
     @ns.doc("create_todo")
     @ns.expect(todo_parser)
-    @ns.marshal_with(todo_model, code=HTTPStatus.CREATED)
+    @marshal_with(ns, todo_model, code=HTTPStatus.CREATED)
     def post(self) -> tuple[Todo, HTTPStatus]:
         """Create a new task."""
         return Todo.create(
             user_id=get_jwt_identity(), **todo_parser.parse_args()
         ), HTTPStatus.CREATED
 
+    @jwt_required()
+    @query_budget(2)
+    @ns.doc("update_todos")
+    @ns.expect(todo_bulk_update_parser, todo_filter_parser)
+    @ns.marshal_with(updated_model)
+    def patch(self) -> tuple[dict[str, int], HTTPStatus]:
+        """Set the completion status of every task matching the filter."""
+        criteria = filter_criteria(get_jwt_identity(), **todo_filter_parser.parse_args())
+        completed = todo_bulk_update_parser.parse_args()["completed"]
+        return {"updated": Todo.bulk_update(*criteria, completed=completed)}, HTTPStatus.OK
+
+    @jwt_required()
+    @query_budget(3)
+    @ns.doc("delete_todos")
+    @ns.expect(todo_filter_parser)
+    @ns.response(HTTPStatus.BAD_REQUEST, "A filter is required")
+    @ns.marshal_with(deleted_model)
+    def delete(self) -> tuple[dict[str, int], HTTPStatus]:
+        """Delete every task matching the filter."""
+        args = todo_filter_parser.parse_args()
+        if args["ids"] is None and args["completed"] is None:
+            ns.abort(HTTPStatus.BAD_REQUEST, "A filter is required to delete many tasks")
+        return {
+            "deleted": Todo.bulk_delete(*filter_criteria(get_jwt_identity(), **args))
+        }, HTTPStatus.OK
+
+
+@ns.route("/batch")
+class TodoBatch(Resource):
+    """Lets you POST many new tasks at once."""
+
+    @jwt_required()
+    @ns.doc("create_todos")
+    @ns.expect([todo_model])
+    @ns.response(HTTPStatus.BAD_REQUEST, "Invalid todos")
+    @ns.response(HTTPStatus.REQUEST_ENTITY_TOO_LARGE, "Too many todos")
+    @marshal_list_with(ns, todo_model, code=HTTPStatus.CREATED)
+    def post(self) -> tuple[list[Todo], HTTPStatus]:
+        """Create new tasks in a single transaction, either all of them or none."""
+        items: Any = request.get_json(silent=True)
+        if not isinstance(items, list):
+            ns.abort(HTTPStatus.BAD_REQUEST, "Expected a JSON array of todos")
+        if len(items) > (limit := current_app.config.get("TODO_BATCH_SIZE", DEFAULT_BATCH_SIZE)):
+            ns.abort(HTTPStatus.REQUEST_ENTITY_TOO_LARGE, f"At most {limit} todos per batch")
+
+        rows, errors = [], {}
+        for index, item in enumerate(items):
+            try:
+                rows.append({"user_id": get_jwt_identity(), **validate_todo(item)})
+            except ValueError as error:
+                errors[str(index)] = str(error)
+        if errors:
+            ns.abort(HTTPStatus.BAD_REQUEST, "Invalid todos", errors=errors)
+        return Todo.bulk_create(rows), HTTPStatus.CREATED
+
+
+@ns.route("/export")
+class TodoExport(Resource):
+    """Streams every to-do as newline delimited JSON."""
+
+    @jwt_required()
+    @ns.doc("export_todos")
+    @ns.produces([NDJSON_MIMETYPE])
+    @ns.response(HTTPStatus.OK, "One JSON todo per line", todo_model)
+    def get(self) -> Response:
+        """Export every task, ordered by identifier, as newline delimited JSON.
+
+        Rows are fetched from the database in batches while the response is sent, so memory use
+        does not grow with the number of tasks. Gzipped when the client accepts that encoding.
+        """
+        yield_per = current_app.config.get("TODO_EXPORT_YIELD_PER", DEFAULT_EXPORT_YIELD_PER)
+        rows = db.session.execute(
+            export_query(get_jwt_identity()).execution_options(yield_per=yield_per)
+        )
+        return ndjson_response(rows, serialize_todo, filename="todos.ndjson")
+
+
+@ns.route("/import")
+class TodoImport(Resource):
+    """Lets you POST newline delimited JSON or CSV to add many new tasks."""
+
+    @jwt_required()
+    @ns.doc("import_todos")
+    @ns.response(HTTPStatus.UNSUPPORTED_MEDIA_TYPE, "Unsupported format")
+    @ns.marshal_with(import_report_model)
+    def post(self) -> tuple[dict[str, Any], HTTPStatus]:
+        """Import tasks, one per line of a newline delimited JSON or CSV body.
+
+        The body is read incrementally and inserted in batches, each committed on its own.
+        Invalid lines are skipped and reported by line number. CSV bodies need a header with a
+        ``task`` and optionally a ``completed`` column.
+        """
+        config = current_app.config
+        stream: IO[bytes] = io.BufferedReader(request.stream)  # type: ignore
+        try:
+            upload = records(stream, request.mimetype)
+        except ValueError:
+            ns.abort(
+                HTTPStatus.UNSUPPORTED_MEDIA_TYPE,
+                f"Expected one of {', '.join(NDJSON_MIMETYPES + CSV_MIMETYPES)}",
+            )
+        report = import_todos(
+            upload,
+            get_jwt_identity(),
+            config.get("TODO_IMPORT_BATCH_SIZE", DEFAULT_IMPORT_BATCH_SIZE),
+            config.get("TODO_IMPORT_MAX_ERRORS", DEFAULT_IMPORT_MAX_ERRORS),
+        )
+        errors = [{"line": line, "message": message} for line, message in report.errors.items()]
+        return {
+            "imported": report.imported,
+            "failed": report.failed,
+            "errors": errors,
+        }, HTTPStatus.OK
+
+
+@ns.route("/changes")
+class TodoChanges(Resource):
+    """Lets clients sync the to-dos changed since their last sync."""
+
+    @jwt_required()
+    @query_budget(2)
+    @ns.doc("todo_changes")
+    @ns.expect(todo_changes_parser)
+    @ns.response(HTTPStatus.BAD_REQUEST, "Invalid sync cursor")
+    @ns.response(HTTPStatus.GONE, "Sync cursor expired")
+    @ns.marshal_with(changes_model)
+    def get(self) -> tuple[dict[str, Any], HTTPStatus]:
+        """List the tasks created, modified or deleted since the ``since`` cursor.
+
+        Pass the returned cursor as ``since`` on the next sync, right away while ``more`` is
+        set. Without a cursor every task is listed. A cursor older than the retention of deleted
+        tasks is expired, with *410 Gone*, sync again without a cursor then.
+        """
+        args = todo_changes_parser.parse_args()
+        limit = args["limit"] or current_app.config.get("TODO_PAGE_SIZE", DEFAULT_PAGE_SIZE)
+        try:
+            changes = todo_changes(get_jwt_identity(), args["since"], limit)
+        except CursorExpired:
+            ns.abort(HTTPStatus.GONE, "Sync cursor expired, sync again without a cursor")
+        except InvalidCursor:
+            ns.abort(HTTPStatus.BAD_REQUEST, "Invalid sync cursor")
+        return {
+            "todos": changes.todos,
+            "deleted": changes.deleted,
+            "cursor": changes.cursor,
+            "more": changes.more,
+        }, HTTPStatus.OK
+
+
+def todo_criteria(id: int, user_id: int) -> list[ColumnElement[bool]]:
+    """Criteria of the todo ``id``, when it belongs to ``user_id``."""
+    return [Todo.id == id, Todo.user_id == user_id]
+
 
 def _get_todo(id: int, user_id: int) -> Todo:
-    if not (todo := Todo.query.filter_by(id=id, user_id=user_id).first()):
+    if not (todo := Todo.query.filter(*todo_criteria(id, user_id)).first()):
         ns.abort(HTTPStatus.NOT_FOUND, "Todo not found")
     return todo  # type: ignore
 
@@ -59,25 +428,61 @@ class Task(Resource):
     """Show a single task item and lets you delete them."""
 
     @jwt_required()
+    @query_budget(1)
     @ns.doc("get_todo")
-    @ns.marshal_with(todo_model)
-    def get(self, id: int) -> tuple[Todo, HTTPStatus]:
+    @ns.response(HTTPStatus.NOT_MODIFIED, "Todo not modified")
+    @marshal_with(ns, todo_model)
+    def get(self, id: int) -> tuple[Todo, HTTPStatus, dict[str, str]]:
         """Fetch a given resource."""
-        return _get_todo(id, get_jwt_identity()), HTTPStatus.OK
+        todo = _get_todo(id, get_jwt_identity())
+        check_not_modified(todo.etag)
+        return todo, HTTPStatus.OK, etag_header(todo.etag)
 
     @jwt_required()
+    @query_budget(4)
     @ns.doc("delete_todo")
     @ns.response(HTTPStatus.NO_CONTENT, "Todo deleted")
+    @ns.response(HTTPStatus.PRECONDITION_FAILED, "Todo modified")
     def delete(self, id: int) -> tuple[str, HTTPStatus]:
         """Delete a task given its identifier."""
         todo = _get_todo(id, get_jwt_identity())
-        todo.delete()
+        if check_precondition(todo.etag):
+            # The todo may have changed since it was loaded, only delete the version the client saw.
+            if not Todo.bulk_delete(Todo.id == id, Todo.version == todo.version):
+                raise PreconditionFailed()
+        else:
+            todo.delete()
         return "", HTTPStatus.NO_CONTENT
 
     @jwt_required()
+    @query_budget(4)
     @ns.expect(todo_parser)
-    @ns.marshal_with(todo_model)
-    def put(self, id: int) -> tuple[Todo, HTTPStatus]:
+    @ns.response(HTTPStatus.PRECONDITION_FAILED, "Todo modified")
+    @marshal_with(ns, todo_model)
+    def put(self, id: int) -> tuple[Todo, HTTPStatus, dict[str, str]]:
         """Update a task given its identifier."""
         todo = _get_todo(id, get_jwt_identity())
-        return todo.update(**todo_parser.parse_args()), HTTPStatus.OK
+        args = todo_parser.parse_args()
+        if check_precondition(todo.etag):
+            # The todo may have changed since it was loaded, only update the version the client saw.
+            updated = Todo.update_returning(Todo.id == id, Todo.version == todo.version, **args)
+            if updated is None:
+                raise PreconditionFailed()
+            return updated, HTTPStatus.OK, etag_header(updated.etag)
+        todo = todo.update(**args)
+        return todo, HTTPStatus.OK, etag_header(todo.etag)
+
+    @jwt_required()
+    @query_budget(2)
+    @ns.doc("patch_todo")
+    @ns.expect(todo_patch_parser)
+    @marshal_with(ns, todo_model)
+    def patch(self, id: int) -> tuple[Todo, HTTPStatus, dict[str, str]]:
+        """Update only the given fields of a task, in a single statement."""
+        user_id = get_jwt_identity()
+        if not (args := todo_patch_parser.parse_args()):
+            todo = _get_todo(id, user_id)
+            return todo, HTTPStatus.OK, etag_header(todo.etag)
+        if not (updated := Todo.update_returning(*todo_criteria(id, user_id), **args)):
+            ns.abort(HTTPStatus.NOT_FOUND, "Todo not found")
+        return updated, HTTPStatus.OK, etag_header(updated.etag)  # type: ignore
@@ -0,0 +1,104 @@
+"""Full-text search of todos.
+
+On SQLite the tasks are indexed by an FTS5 virtual table, kept in sync with the todo table by
+triggers, and tasks match when they have words starting with every search term, in any order.
+Other databases match tasks containing every term anywhere, with one ``ILIKE '%term%'`` per
+term. PostgreSQL gets a trigram index for those, other databases fall back to a scan.
+"""
+
+import re
+from typing import Any
+
+import sqlalchemy
+from sqlalchemy import ColumnElement, event
+
+from mjv.extensions import db
+
+from .models import Todo
+
+FTS_TABLE = "todo_fts"
+
+_SQLITE_DDL = (
+    f"CREATE VIRTUAL TABLE {FTS_TABLE} USING fts5(task, content='todo', content_rowid='id')",
+    f"""CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_insert AFTER INSERT ON todo BEGIN
+        INSERT INTO {FTS_TABLE}(rowid, task) VALUES (new.id, new.task);
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_delete AFTER DELETE ON todo BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, task) VALUES ('delete', old.id, old.task);
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_update AFTER UPDATE OF task ON todo BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, task) VALUES ('delete', old.id, old.task);
+        INSERT INTO {FTS_TABLE}(rowid, task) VALUES (new.id, new.task);
+    END""",
+    # Index the todos created before the index.
+    f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')",
+)
+
+_POSTGRESQL_DDL = (
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    "CREATE INDEX IF NOT EXISTS ix_todo_task_trgm ON todo USING gin (task gin_trgm_ops)",
+)
+
+_fts = sqlalchemy.table(FTS_TABLE, sqlalchemy.column("rowid"))
+
+
+@event.listens_for(Todo.__table__, "after_create")
+@event.listens_for(db.metadata, "after_create")
+def _create_search_index(target: Any, connection: sqlalchemy.Connection, **kwargs: Any) -> None:
+    """Create the full-text index, on every ``create_all`` so existing databases get one too.
+
+    Also along with the todo table alone, like in shards.
+    """
+    if connection.dialect.name == "sqlite":
+        exists = connection.exec_driver_sql(
+            "SELECT 1 FROM sqlite_master WHERE name = ?", (FTS_TABLE,)
+        ).first()
+        if not exists:
+            for statement in _SQLITE_DDL:
+                connection.exec_driver_sql(statement)
+    elif connection.dialect.name == "postgresql":
+        for statement in _POSTGRESQL_DDL:
+            connection.exec_driver_sql(statement)
+
+
+@event.listens_for(db.metadata, "before_drop")
+def _drop_search_index(target: Any, connection: sqlalchemy.Connection, **kwargs: Any) -> None:
+    """Drop the full-text index along with the todo table, its triggers are dropped with it."""
+    if connection.dialect.name == "sqlite":
+        connection.exec_driver_sql(f"DROP TABLE IF EXISTS {FTS_TABLE}")
+
+
+def _words(terms: str) -> list[str]:
+    """Words of the search ``terms``, punctuation and query syntax left out."""
+    return re.findall(r"\w+", terms)
+
+
+def fts_query(terms: str) -> str:
+    """FTS5 query matching tasks with words starting with every term, in any order.
+
+    Terms are quoted, so the FTS5 query syntax in user input is searched for literally.
+    """
+    return " ".join(f'"{word}"*' for word in _words(terms))
+
+
+def _like_pattern(word: str) -> str:
+    escaped = word.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+    return f"%{escaped}%"
+
+
+def matching(terms: str, dialect: str) -> ColumnElement[bool]:
+    """Criterion of the todos whose task matches the search ``terms``, on ``dialect``."""
+    if not (words := _words(terms)):
+        return sqlalchemy.false()
+    criterion: ColumnElement[bool]
+    if dialect == "sqlite":
+        matches = (
+            sqlalchemy.select(_fts.c.rowid)
+            .select_from(_fts)
+            .where(sqlalchemy.text(f"{FTS_TABLE} MATCH :terms").bindparams(terms=fts_query(terms)))
+        )
+        criterion = Todo.id.in_(matches)
+    else:
+        words_in_task = (Todo.task.ilike(_like_pattern(word), escape="\\") for word in words)
+        criterion = sqlalchemy.and_(*words_in_task)
+    return criterion
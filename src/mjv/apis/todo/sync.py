@@ -0,0 +1,130 @@
+"""Delta sync of todos, the todos changed and deleted since the last sync of a client.
+
+The changes are listed in the order of the change sequence, records and tombstones merged. The
+cursor of a page holds the position of its last change, the shard it was read from, and when
+the client was last synced, so cursors older than the retention of the tombstones are expired.
+"""
+
+from dataclasses import dataclass
+from datetime import UTC, datetime
+from typing import Any
+
+import sqlalchemy
+
+from mjv.extensions import change_log, db
+from mjv.pagination import InvalidCursor, decode_cursor, encode_cursor
+from mjv.sharding import current_shard
+
+from .models import Todo
+
+# Kinds of changes, records come before tombstones with the same number.
+RECORD, TOMBSTONE = 0, 1
+
+_CURSOR_KEYS = (
+    sqlalchemy.column("change_seq", sqlalchemy.Integer),
+    sqlalchemy.column("kind", sqlalchemy.Integer),
+    sqlalchemy.column("id", sqlalchemy.Integer),
+    sqlalchemy.column("synced_at", sqlalchemy.DateTime),
+    sqlalchemy.column("shard", sqlalchemy.Integer),
+)
+
+
+class CursorExpired(ValueError):
+    """Raised when a sync cursor is older than the tombstones, or from another shard."""
+
+
+@dataclass
+class TodoChanges:
+    """Page of the changes of a user's todos.
+
+    Args:
+        todos: The todos created or modified since the cursor.
+        deleted: The identifiers of the todos deleted since the cursor, and not created again.
+        cursor: Cursor of the next sync.
+        more: Whether more changes follow, to fetch right away with ``cursor``.
+    """
+
+    todos: list[Todo]
+    deleted: list[int]
+    cursor: str
+    more: bool
+
+
+def _position(since: str, now: datetime) -> tuple[int, int, int, datetime]:
+    values = decode_cursor(since, _CURSOR_KEYS)  # type: ignore
+    *position, synced_at, shard = values
+    if not all(type(value) is int for value in position):
+        raise InvalidCursor(since)
+    if shard != current_shard() or synced_at < now - change_log.retention:
+        raise CursorExpired(since)
+    return (*position, synced_at)
+
+
+def changed_todos(
+    user_id: int, position: tuple[int, int, int], limit: int
+) -> sqlalchemy.Select[tuple[Todo]]:
+    """Todos of ``user_id`` changed after ``position``, in change order, ``limit + 1`` at most."""
+    seq, kind, record_id = position
+    after_record = sqlalchemy.tuple_(Todo.change_seq, Todo.id) > (seq, record_id)
+    return (
+        sqlalchemy.select(Todo)
+        .where(Todo.user_id == user_id, after_record if kind == RECORD else Todo.change_seq > seq)
+        .order_by(Todo.change_seq, Todo.id)
+        .limit(limit + 1)
+    )
+
+
+def deleted_todos(
+    user_id: int, position: tuple[int, int, int], limit: int
+) -> sqlalchemy.Select[tuple[int, int]]:
+    """Tombstones of the todos of ``user_id`` after ``position``, ``limit + 1`` at most."""
+    seq, kind, record_id = position
+    tombstones = change_log.tombstones
+    tombstone_position = sqlalchemy.tuple_(tombstones.c.change_seq, tombstones.c.record_id)
+    after_tombstone = tombstone_position > (seq, record_id)
+    return (
+        sqlalchemy.select(tombstones.c.change_seq, tombstones.c.record_id)
+        .where(
+            tombstones.c.table_name == Todo.__tablename__,
+            tombstones.c.owner == user_id,
+            after_tombstone if kind == TOMBSTONE else tombstones.c.change_seq >= seq,
+        )
+        .order_by(tombstones.c.change_seq, tombstones.c.record_id)
+        .limit(limit + 1)
+    )
+
+
+def todo_changes(user_id: int, since: str | None, limit: int) -> TodoChanges:
+    """Changes of the todos of ``user_id`` after the ``since`` cursor, at most ``limit``.
+
+    Without a cursor every todo is listed, in the order it was last changed.
+
+    Raises:
+        InvalidCursor: When the cursor can not be decoded.
+        CursorExpired: When the cursor is too old to list every delete since.
+    """
+    now = datetime.now(UTC).replace(tzinfo=None)
+    seq, kind, record_id, synced_at = (
+        (0, RECORD, 0, now) if since is None else _position(since, now)
+    )
+    position = (seq, kind, record_id)
+    todos = db.session.scalars(changed_todos(user_id, position, limit)).all()
+    tombstoned = db.session.execute(deleted_todos(user_id, position, limit)).all()
+
+    changes: list[tuple[int, int, int, Any]] = sorted(
+        [(todo.change_seq, RECORD, todo.id, todo) for todo in todos]
+        + [(change_seq, TOMBSTONE, id, None) for change_seq, id in tombstoned],
+        key=lambda change: change[:3],
+    )
+    more = len(changes) > limit
+    changes = changes[:limit]
+    if changes:
+        seq, kind, record_id, _ = changes[-1]
+    # Deletes after the last page are newer than this sync, thus than any tombstone compacted.
+    cursor = encode_cursor([seq, kind, record_id, synced_at if more else now, current_shard()])
+    todos = [todo for _, change, _, todo in changes if change == RECORD]
+    # A todo created with the identifier of a deleted one, in databases which reused them,
+    # supersedes the tombstone, so the deletes and the todos of a page apply in any order.
+    live = {todo.id for todo in todos}
+    deleted = [id for _, change, id, _ in changes if change == TOMBSTONE and id not in live]
+    return TodoChanges(todos, deleted, cursor, more)
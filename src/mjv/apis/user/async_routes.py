@@ -0,0 +1,67 @@
+"""Async user routes, served by the ASGI app."""
+
+from http import HTTPStatus
+from typing import Any
+
+from sqlalchemy import select
+from sqlalchemy.orm import undefer
+
+from mjv.asgi import AsyncNamespace, AsyncRequest, TokenError, abort, jwt_required
+from mjv.extensions import async_db
+from mjv.hashing import HasherBusy
+from mjv.queries import query_budget
+
+from .models import VERSION_CLAIM, User
+from .parsers import login_parser, password_parser, register_parser
+from .routes import hasher_busy, user_model
+
+ns = AsyncNamespace("auth")
+ns.errorhandler(HasherBusy)(hasher_busy)
+
+
+async def _current_user(request: AsyncRequest) -> User:
+    version = request.claims.get(VERSION_CLAIM)
+    if (user := await User.aget_cached(request.identity, version)) is None:
+        raise TokenError(f"Error loading the user {request.identity}")
+    return user
+
+
+@ns.route("/auth/register", methods=["POST"])
+@query_budget(1)
+async def register(request: AsyncRequest) -> tuple[Any, HTTPStatus]:
+    """Create a new user."""
+    if (user := await User.aregister(**register_parser.parse_args(req=request))) is None:
+        abort(HTTPStatus.BAD_REQUEST, "User already exists")
+    return request.marshal(user, user_model), HTTPStatus.CREATED
+
+
+@ns.route("/auth/login", methods=["POST"])
+@query_budget(3)
+async def login(request: AsyncRequest) -> tuple[dict[str, str], HTTPStatus]:
+    """User login."""
+    args = login_parser.parse_args(req=request)
+    user = await async_db.session.scalar(
+        select(User).options(undefer(User.password)).where(User.username == args["username"])
+    )
+    if user is None or not await user.averify_password(args["password"]):
+        abort(HTTPStatus.UNAUTHORIZED, "Invalid credentials")
+    await user.arehash_password(args["password"])
+    return {"access_token": user.access_token()}, HTTPStatus.OK
+
+
+@ns.route("/auth/current_user", methods=["GET"])
+@jwt_required
+@query_budget(1)
+async def get_current_user(request: AsyncRequest) -> tuple[Any, HTTPStatus]:
+    """Get current user."""
+    return request.marshal(await _current_user(request), user_model), HTTPStatus.OK
+
+
+@ns.route("/auth/current_user", methods=["PUT"])
+@jwt_required
+@query_budget(3)
+async def put_current_user(request: AsyncRequest) -> tuple[Any, HTTPStatus]:
+    """Change user password."""
+    user = await _current_user(request)
+    args = password_parser.parse_args(req=request)
+    return request.marshal(await user.achange_password(**args), user_model), HTTPStatus.OK
@@ -2,17 +2,32 @@
 
 from typing import Any, Iterable, Self, override
 
+from flask_jwt_extended import create_access_token
 from flask_restx.fields import String
+from sqlalchemy import func, inspect
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import make_transient_to_detached
 
 from mjv.database import Column, DataBasePrimitives, PkModel
-from mjv.extensions import bcrypt, db
+from mjv.extensions import async_db, db, hasher, jwt
+
+# Claim of the access tokens holding the version of the user they are issued for.
+VERSION_CLAIM = "ver"
 
 
 def _encrypt_password(
-    password: str | None, **kwargs: DataBasePrimitives
+    password: str | None = None, **kwargs: DataBasePrimitives
+) -> dict[str, DataBasePrimitives]:
+    if password:
+        kwargs["password"] = hasher.generate_password_hash(password)
+    return kwargs
+
+
+async def _aencrypt_password(
+    password: str | None = None, **kwargs: DataBasePrimitives
 ) -> dict[str, DataBasePrimitives]:
     if password:
-        kwargs["password"] = bcrypt.generate_password_hash(password).decode("utf-8")
+        kwargs["password"] = await hasher.agenerate_password_hash(password)
     return kwargs
 
 
@@ -21,7 +36,8 @@ class User(PkModel):
 
     username = Column(db.String(80), unique=True, nullable=False)
     email = Column(db.String(120), unique=True, nullable=False)
-    password = Column(db.String(128), nullable=False)
+    # Only loaded to be verified, never cached nor sent.
+    password = db.deferred(Column(db.String(128), nullable=False))
     todos = db.relationship("Todo", back_populates="user", cascade="all, delete-orphan")
 
     def __str__(self) -> str:
@@ -32,15 +48,50 @@ class User(PkModel):
         """User instance representation."""
         return f"<{self.__class__.__name__} '{self.username}'>"
 
+    def access_token(self) -> str:
+        """Access token of the user, valid until the user changes, like their password."""
+        token: str = create_access_token(
+            identity=self.id, additional_claims={VERSION_CLAIM: self.version}
+        )
+        return token
+
     def verify_password(self, password: str) -> bool:
         """Verify that the given password matches the users."""
-        return bcrypt.check_password_hash(self.password, password)  # type: ignore
+        return hasher.check_password_hash(self.password, password)
+
+    async def _apassword(self) -> str:
+        # The deferred column is not loaded on access by async sessions.
+        if "password" in inspect(self).unloaded:
+            await async_db.session.refresh(self, ["password"])
+        return str(self.password)
+
+    async def averify_password(self, password: str) -> bool:
+        """Verify that the given password matches the users, asynchronously."""
+        return await hasher.acheck_password_hash(await self._apassword(), password)
+
+    def rehash_password(self, password: str) -> Self:
+        """Rehash the verified ``password`` when it was hashed with an outdated cost."""
+        if hasher.needs_rehash(self.password):
+            return self.update(password=password)
+        return self
+
+    async def arehash_password(self, password: str) -> Self:
+        """Rehash the verified ``password`` when it was hashed with an outdated cost."""
+        if hasher.needs_rehash(await self._apassword()):
+            return await self.aupdate(password=password)
+        return self
 
     def change_password(self, old_password: str, new_password: str) -> Self | None:  # type: ignore
         """Change password if old_password is verified."""
         if self.verify_password(old_password):
             return self.update(password=new_password)
 
+    async def achange_password(self, old_password: str, new_password: str) -> Self | None:
+        """Change password if old_password is verified, asynchronously."""
+        if await self.averify_password(old_password):
+            return await self.aupdate(password=new_password)
+        return None
+
     @override
     @classmethod
     def field_descriptions(cls) -> Iterable[tuple[str, Any]]:
@@ -52,6 +103,78 @@ class User(PkModel):
             *super().field_descriptions(),
         )
 
+    @classmethod
+    def _cached_values(cls, user: Self) -> dict[str, Any]:
+        return {
+            attr.key: getattr(user, attr.key)
+            for attr in inspect(cls).column_attrs
+            if not attr.deferred
+        }
+
+    @classmethod
+    def _cache_hit(cls, user_id: int, version: int | None) -> dict[str, Any] | None:
+        values = jwt.user_cache.get(user_id)
+        if values is None or (version is not None and values["version"] != version):
+            return None
+        return values
+
+    @classmethod
+    def _cache_miss(cls, user: Self | None, version: int | None) -> Self | None:
+        if user is None or (version is not None and user.version != version):
+            return None
+        jwt.user_cache.set(user.id, cls._cached_values(user))
+        return user
+
+    @classmethod
+    def get_cached(cls, user_id: int, version: int | None = None) -> Self | None:
+        """Get a user by ID, from the per-process user cache when possible.
+
+        A cached user is attached to the current session without querying the database, and
+        without the password hash, which is loaded when needed.
+
+        Args:
+            user_id: Identifier of the user.
+            version: Version of the user a token is issued for, when it holds one. A user cached
+                with another version is read again, as the user changed in another process, and
+                None is returned when the user changed since the token was issued.
+        """
+        if (values := cls._cache_hit(user_id, version)) is None:
+            return cls._cache_miss(cls.get_by_id(user_id), version)
+        user = cls(**values)
+        make_transient_to_detached(user)
+        return db.session.merge(user, load=False)
+
+    @classmethod
+    async def aget_cached(cls, user_id: int, version: int | None = None) -> Self | None:
+        """Get a user by ID from the per-process user cache when possible, asynchronously."""
+        if (values := cls._cache_hit(user_id, version)) is None:
+            return cls._cache_miss(await cls.aget_by_id(user_id), version)
+        user = cls(**values)
+        make_transient_to_detached(user)
+        return await async_db.session.merge(user, load=False)
+
+    @classmethod
+    def register(cls, password: str, **kwargs: DataBasePrimitives) -> Self | None:
+        """Create a new user with a single INSERT, relying on the unique indexes.
+
+        Returns:
+            The new user, or None when the username or email address is already taken.
+        """
+        try:
+            return cls.bulk_create([_encrypt_password(password, **kwargs)])[0]
+        except IntegrityError:
+            db.session.rollback()
+            return None
+
+    @classmethod
+    async def aregister(cls, password: str, **kwargs: DataBasePrimitives) -> Self | None:
+        """Create a new user with a single INSERT, asynchronously, see :meth:`register`."""
+        try:
+            return await cls.acreate(password=password, **kwargs)
+        except IntegrityError:
+            await async_db.session.rollback()
+            return None
+
     @override
     @classmethod
     def create(cls, **kwargs: DataBasePrimitives) -> Self:
@@ -61,4 +184,36 @@ class User(PkModel):
     @override
     def update(self, commit: bool = True, **kwargs: DataBasePrimitives) -> Self:
         """Update specific user fields."""
-        return super().update(commit, **_encrypt_password(**kwargs))  # type: ignore
+        user = super().update(commit, **_encrypt_password(**kwargs))  # type: ignore
+        jwt.user_cache.delete(self.id)
+        return user
+
+    @override
+    def delete(self, commit: bool = True) -> None:
+        """Remove the user from the database."""
+        super().delete(commit)
+        jwt.user_cache.delete(self.id)
+
+    @override
+    @classmethod
+    async def acreate(cls, **kwargs: DataBasePrimitives) -> Self:
+        """Create a new user and save it the database, asynchronously."""
+        return await super().acreate(**await _aencrypt_password(**kwargs))  # type: ignore
+
+    @override
+    async def aupdate(self, commit: bool = True, **kwargs: DataBasePrimitives) -> Self:
+        """Update specific user fields, asynchronously."""
+        user = await super().aupdate(commit, **await _aencrypt_password(**kwargs))  # type: ignore
+        jwt.user_cache.delete(self.id)
+        return user
+
+    @override
+    async def adelete(self, commit: bool = True) -> None:
+        """Remove the user from the database, asynchronously."""
+        await super().adelete(commit)
+        jwt.user_cache.delete(self.id)
+
+
+# Usernames and email addresses differing only by case belong to the same user.
+db.Index("uq_user_username_lower", func.lower(User.username), unique=True)
+db.Index("uq_user_email_lower", func.lower(User.email), unique=True)
@@ -1,12 +1,45 @@
 """User's namespace POST Parsers."""
 
+from typing import Any, Callable
+
+from flask_restx import inputs
 from flask_restx.reqparse import RequestParser
 
+from .models import User
+
+
+def _bounded(max_length: int, validate: Callable[[str], Any] = str) -> Callable[[Any], str]:
+    """Argument type of non-blank strings of at most ``max_length`` characters."""
+
+    def bounded(value: Any) -> str:
+        if not isinstance(value, str) or not value.strip():
+            raise ValueError("(must not be blank)")
+        if len(value) > max_length:
+            raise ValueError(f"(at most {max_length} characters)")
+        try:
+            validate(value)
+        except ValueError:
+            raise ValueError("(invalid format)") from None
+        return value
+
+    return bounded
+
 
 def _register_parser() -> RequestParser:
+    # Validated up front, a user is only hashed and inserted once the request is known to be valid.
     parser = RequestParser()
-    parser.add_argument("username", type=str, required=True, help="Username is required")
-    parser.add_argument("email", type=str, required=True, help="Email is required")
+    parser.add_argument(
+        "username",
+        type=_bounded(User.username.type.length),
+        required=True,
+        help="Username is required",
+    )
+    parser.add_argument(
+        "email",
+        type=_bounded(User.email.type.length, inputs.email()),
+        required=True,
+        help="Email is required",
+    )
     parser.add_argument("password", type=str, required=True, help="Password is required")
     return parser
 
@@ -1,50 +1,65 @@
 """User routes."""
 
-from flask_jwt_extended import create_access_token, get_jwt_identity, jwt_required
+from typing import Any
+
+from flask_jwt_extended import current_user, jwt_required
 from flask_restx import Namespace, Resource
 from flask_restx._http import HTTPStatus
 from flask_restx.fields import String
+from sqlalchemy.orm import undefer
+
+from mjv.extensions import jwt
+from mjv.hashing import HasherBusy
+from mjv.queries import query_budget
+from mjv.serializers import marshal_with
 
-from .models import User
+from .models import VERSION_CLAIM, User
 from .parsers import login_parser, password_parser, register_parser
 
 ns = Namespace("auth", description="Authentication operations")
 
 user_model = ns.model(
     "User",
-    {
-        key: value
-        for key, value in User.field_descriptions()
-        if key in ("id", "username", "email", "password")
-    },
+    {key: value for key, value in User.field_descriptions() if key in ("id", "username", "email")},
 )
 
 
+@jwt.user_lookup_loader
+def load_user(jwt_header: dict[str, Any], jwt_data: dict[str, Any]) -> User | None:
+    """Load the user a token is issued to, for ``current_user``."""
+    return User.get_cached(jwt_data["sub"], jwt_data.get(VERSION_CLAIM))
+
+
+@ns.errorhandler(HasherBusy)
+@ns.doc(responses={HTTPStatus.SERVICE_UNAVAILABLE: "Too many authentication requests"})
+def hasher_busy(error: HasherBusy) -> tuple[dict[str, str], HTTPStatus, dict[str, str]]:
+    """Shed authentication load while the password hashing queue is full."""
+    return (
+        {"message": "Too many authentication requests, retry later"},
+        HTTPStatus.SERVICE_UNAVAILABLE,
+        {"Retry-After": str(error.retry_after)},
+    )
+
+
 @ns.route("/register")
 class Register(Resource):
     """User registration operations."""
 
+    @query_budget(1)
     @ns.expect(register_parser)
-    @ns.marshal_with(user_model, code=HTTPStatus.CREATED)
+    @marshal_with(ns, user_model, code=HTTPStatus.CREATED)
     def post(self) -> tuple[User, HTTPStatus]:
         """Create a new user."""
-        args = register_parser.parse_args()
-        username = args.get("username")
-        email = args.get("email")
-
-        if (
-            User.query.filter_by(username=username).first()
-            or User.query.filter_by(email=email).first()
-        ):
+        if (user := User.register(**register_parser.parse_args())) is None:
             ns.abort(HTTPStatus.BAD_REQUEST, "User already exists")
-
-        return User.create(**args), HTTPStatus.CREATED
+        return user, HTTPStatus.CREATED  # type: ignore
 
 
 @ns.route("/login")
 class Login(Resource):
     """User login operations."""
 
+    @query_budget(3)
     @ns.expect(login_parser)
     @ns.marshal_with(
         ns.model(
@@ -57,12 +72,13 @@ class Login(Resource):
         """Usere login."""
         args = login_parser.parse_args()
         username = args.get("username")
-        user = User.query.filter_by(username=username).first()
+        user = User.query.filter_by(username=username).options(undefer(User.password)).first()
 
         if user is None or not user.verify_password(args.get("password")):
             ns.abort(HTTPStatus.UNAUTHORIZED, "Invalid credentials")
+        user.rehash_password(args.get("password"))
 
-        return {"access_token": create_access_token(identity=user.id)}, HTTPStatus.OK
+        return {"access_token": user.access_token()}, HTTPStatus.OK
 
 
 @ns.route("/current_user")
@@ -70,16 +86,16 @@ class CurrentUser(Resource):
     """Current user operations."""
 
     @jwt_required()
-    @ns.marshal_with(user_model, code=HTTPStatus.OK)
+    @query_budget(0)
+    @marshal_with(ns, user_model, code=HTTPStatus.OK)
     def get(self) -> tuple[User, HTTPStatus]:
         """Get current user."""
-        return User.query.get(get_jwt_identity()), HTTPStatus.OK
+        return current_user, HTTPStatus.OK
 
     @jwt_required()
+    @query_budget(3)
     @ns.expect(password_parser)
-    @ns.marshal_with(user_model, code=HTTPStatus.OK)
+    @marshal_with(ns, user_model, code=HTTPStatus.OK)
     def put(self) -> tuple[User, HTTPStatus]:
         """Change user password."""
-        return User.query.get(get_jwt_identity()).change_password(
-            **password_parser.parse_args()
-        ), HTTPStatus.OK
+        return current_user.change_password(**password_parser.parse_args()), HTTPStatus.OK
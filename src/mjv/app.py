@@ -2,8 +2,25 @@
 
 from flask import Flask
 
-from .apis.register import register_namespaces
-from .extensions import api, bcrypt, db, jwt
+from .apis.register import async_namespaces, register_namespaces
+from .asgi import AsgiApp
+from .extensions import (
+    api,
+    async_db,
+    bcrypt,
+    change_log,
+    db,
+    group_commit,
+    hasher,
+    jwt,
+    list_cache,
+    pool_metrics,
+    query_monitor,
+    replicas,
+    request_metrics,
+    shards,
+    sqlite_tuning,
+)
 
 
 def create_app(config_object: str | object = "mjv.settings") -> Flask:
@@ -20,9 +37,45 @@ def create_app(config_object: str | object = "mjv.settings") -> Flask:
     return app
 
 
+def create_asgi_app(config_object: str | object = "mjv.settings") -> AsgiApp:
+    """Create the ASGI application factory.
+
+    Serves the todo and authentication resources asynchronously, with an async database driver,
+    and every other route with the app of :func:`create_app`. For example with uvicorn::
+
+        uvicorn --factory mjv.app:create_asgi_app
+
+    :param config_object: The configuration object to use.
+    """
+    app = create_app(config_object)
+    if shards.engines(app):
+        raise RuntimeError("The async resources do not support sharding, serve the WSGI app")
+    async_db.init_app(app)
+    with app.app_context():
+        sqlite_tuning.watch(app, async_db.engine.sync_engine)
+        pool_metrics.watch(app, "async", async_db.engine.sync_engine)
+        query_monitor.watch(app, async_db.engine.sync_engine)
+    return AsgiApp(app, async_namespaces())
+
+
 def register_extensions(app: Flask) -> None:
     """Register Flask extensions."""
+    pool_metrics.init_app(app)
     db.init_app(app)
+    sqlite_tuning.init_app(app)
+    pool_metrics.watch_db(app)
+    query_monitor.init_app(app)
     api.init_app(app)
     jwt.init_app(app)
+    replicas.init_app(app)
+    shards.init_app(app)
+    for name, engine in {**replicas.engines(app), **shards.engines(app)}.items():
+        sqlite_tuning.watch(app, engine)
+        pool_metrics.watch(app, name, engine)
+        query_monitor.watch(app, engine)
     bcrypt.init_app(app)
+    hasher.init_app(app)
+    list_cache.init_app(app)
+    change_log.init_app(app)
+    group_commit.init_app(app)
+    request_metrics.init_app(app)
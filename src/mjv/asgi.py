@@ -0,0 +1,424 @@
+"""ASGI serving, with async resources for the hot paths and the WSGI app for everything else.
+
+Async resources hold no thread while they wait on the database, so a single process can serve
+thousands of requests at once. They are handled within a request context of the Flask app, whose
+request hooks run around them like around its own routes, for metrics, query budgets and the
+read-your-writes stickiness of replicas. Routes without an async resource, like the Swagger
+docs, are served by the regular WSGI app on a thread.
+"""
+
+import asyncio
+import functools
+import json
+import sys
+from dataclasses import dataclass, field
+from http import HTTPStatus
+from io import BytesIO
+from typing import Any, Awaitable, Callable, Iterator, Mapping, MutableMapping, NoReturn
+from urllib.parse import parse_qsl, urlencode
+
+from flask import Flask, Response, current_app
+from flask_jwt_extended import decode_token
+from flask_jwt_extended.exceptions import JWTExtendedException
+from flask_restx import marshal
+from jwt import ExpiredSignatureError, InvalidTokenError
+from werkzeug.datastructures import CombinedMultiDict, ETags, Headers, MultiDict
+from werkzeug.exceptions import (
+    HTTPException,
+    MethodNotAllowed,
+    NotFound,
+    RequestEntityTooLarge,
+)
+from werkzeug.http import parse_etags
+from werkzeug.routing import Map, RequestRedirect, Rule
+
+from .extensions import async_db
+from .serializers import Serializer, compile_serializer
+
+Scope = MutableMapping[str, Any]
+Message = MutableMapping[str, Any]
+Receive = Callable[[], Awaitable[Message]]
+Send = Callable[[Message], Awaitable[None]]
+Result = tuple[Any, int, dict[str, str]] | tuple[Any, int] | Response | Any
+Handler = Callable[..., Awaitable[Result]]
+
+# Bodies are received whole before being handled, so their size is limited even without a
+# MAX_CONTENT_LENGTH.
+DEFAULT_MAX_CONTENT_LENGTH = 16 * 1024 * 1024
+
+# Serializers compiled by AsyncRequest.marshal, by the identity of their model.
+_serializers: dict[int, Serializer] = {}
+
+
+class TokenError(HTTPException):
+    """Missing or invalid access token, answered like ``flask_jwt_extended`` does."""
+
+    def __init__(self, message: str, code: int = HTTPStatus.UNAUTHORIZED) -> None:
+        """Token error with ``message``, and the status ``code`` of the response."""
+        super().__init__(message)
+        self.code = code
+
+
+@dataclass
+class AsyncRequest:
+    """HTTP request to an async resource, with its body already received."""
+
+    method: str
+    scheme: str
+    host: str
+    root_path: str
+    path: str
+    args: MultiDict[str, str]
+    headers: Headers
+    body: bytes
+    claims: dict[str, Any] = field(default_factory=dict)
+
+    @property
+    def base_url(self) -> str:
+        """URL of the request, without its query string."""
+        return f"{self.scheme}://{self.host}{self.root_path}{self.path}"
+
+    @property
+    def identity(self) -> Any:
+        """Identity of the access token, see :func:`jwt_required`."""
+        return self.claims["sub"]
+
+    @property
+    def mimetype(self) -> str:
+        """Media type of the body, without parameters."""
+        return self.headers.get("Content-Type", "").partition(";")[0].strip().lower()
+
+    @property
+    def form(self) -> MultiDict[str, str]:
+        """Fields of a URL encoded form body."""
+        if self.mimetype != "application/x-www-form-urlencoded":
+            return MultiDict()
+        return MultiDict(parse_qsl(self.body.decode("utf-8"), keep_blank_values=True))
+
+    @property
+    def values(self) -> CombinedMultiDict[str, str]:
+        """Arguments of the query string and fields of a form body combined."""
+        return CombinedMultiDict([self.args, self.form])
+
+    def get_json(self, silent: bool = False) -> Any:
+        """Decode a JSON body, like ``flask.Request.get_json``.
+
+        Raises:
+            BadRequest: When the body is no JSON, unless ``silent``.
+        """
+        if self.mimetype == "application/json" or self.mimetype.endswith("+json"):
+            try:
+                return json.loads(self.body)
+            except ValueError:
+                pass
+        if not silent:
+            abort(HTTPStatus.BAD_REQUEST, "Failed to decode JSON object")
+        return None
+
+    @property
+    def if_match(self) -> ETags:
+        """Entity tags of the ``If-Match`` header."""
+        return parse_etags(self.headers.get("If-Match"))
+
+    @property
+    def if_none_match(self) -> ETags:
+        """Entity tags of the ``If-None-Match`` header."""
+        return parse_etags(self.headers.get("If-None-Match"))
+
+    def marshal(self, data: Any, model: Mapping[str, Any]) -> Any:
+        """Serialize ``data`` with ``model``, honouring the field mask header like ``marshal_with``.
+
+        Lists are serialized item by item.
+        """
+        if mask := self.headers.get(current_app.config["RESTX_MASK_HEADER"]):
+            return marshal(data, model, mask=mask)
+        if (serialize := _serializers.get(id(model))) is None:
+            serialize = _serializers[id(model)] = compile_serializer(model)
+        if isinstance(data, (list, tuple)):
+            return [serialize(item) for item in data]
+        return serialize(data)
+
+    def next_link(self, cursor: str | None, **params: Any) -> dict[str, str]:
+        """Build a ``Link`` header pointing at the next page of this request."""
+        if cursor is None:
+            return {}
+        args = self.args.to_dict()
+        args.update({key: value for key, value in params.items() if value is not None})
+        args["after"] = cursor
+        return {"Link": f'<{self.base_url}?{urlencode(args)}>; rel="next"'}
+
+
+def abort(code: int, message: str, **kwargs: Any) -> NoReturn:
+    """Answer the request with ``code`` and a JSON ``message``, like ``Namespace.abort``."""
+    error = HTTPException(message)
+    error.code = code
+    error.data = {"message": message, **kwargs}  # type: ignore
+    raise error
+
+
+def jwt_required(handler: Handler) -> Handler:
+    """Require a valid access token, its claims are set on the request."""
+
+    @functools.wraps(handler)
+    async def wrapper(request: AsyncRequest, **kwargs: Any) -> Result:
+        scheme, _, token = request.headers.get("Authorization", "").partition(" ")
+        if scheme != "Bearer" or not token:
+            raise TokenError("Missing Authorization Header")
+        try:
+            claims = decode_token(token)
+        except ExpiredSignatureError:
+            raise TokenError("Token has expired") from None
+        except (InvalidTokenError, JWTExtendedException) as error:
+            raise TokenError(str(error), HTTPStatus.UNPROCESSABLE_ENTITY) from None
+        if claims.get("type") != "access":
+            raise TokenError("Only non-refresh tokens are allowed", HTTPStatus.UNPROCESSABLE_ENTITY)
+        request.claims = claims
+        return await handler(request, **kwargs)
+
+    return wrapper
+
+
+class AsyncNamespace:
+    """Group of async resources, the async counterpart of ``flask_restx.Namespace``."""
+
+    def __init__(self, name: str) -> None:
+        """Create an empty namespace."""
+        self.name = name
+        self.rules: list[Rule] = []
+        self.handlers: dict[str, Handler] = {}
+        self.error_handlers: dict[type[Exception], Callable[[Any], Result]] = {}
+
+    def route(self, rule: str, methods: list[str]) -> Callable[[Handler], Handler]:
+        """Register the decorated coroutine as the resource of ``rule`` for ``methods``."""
+
+        def decorator(handler: Handler) -> Handler:
+            endpoint = f"{self.name}.{handler.__name__}"
+            self.rules.append(Rule(rule, methods=methods, endpoint=endpoint))
+            self.handlers[endpoint] = handler
+            return handler
+
+        return decorator
+
+    def errorhandler(
+        self, exception: type[Exception]
+    ) -> Callable[[Callable[[Any], Result]], Callable[[Any], Result]]:
+        """Register the decorated function as the handler of ``exception``."""
+
+        def decorator(handler: Callable[[Any], Result]) -> Callable[[Any], Result]:
+            self.error_handlers[exception] = handler
+            return handler
+
+        return decorator
+
+
+def make_response(result: Result) -> Response:
+    """Response of an async resource returning ``result``, data serialized to JSON."""
+    if isinstance(result, Response):
+        return result
+    data, status, *rest = result if isinstance(result, tuple) else (result, HTTPStatus.OK)
+    headers = dict(rest[0]) if rest else {}
+    if data is None or status == HTTPStatus.NOT_MODIFIED:
+        response = Response(b"", status, headers)
+        del response.headers["Content-Type"]
+        return response
+    body = (json.dumps(data) + "\n").encode("utf-8")
+    headers.pop("Content-Type", None)
+    return Response(body, status, headers, mimetype="application/json")
+
+
+def _wsgi_environ(scope: Scope, body: bytes) -> dict[str, Any]:
+    server = scope.get("server") or ("localhost", 80)
+    environ = {
+        "REQUEST_METHOD": scope["method"],
+        "SCRIPT_NAME": scope.get("root_path", ""),
+        "PATH_INFO": scope["path"],
+        "QUERY_STRING": scope.get("query_string", b"").decode("latin-1"),
+        "SERVER_NAME": server[0],
+        "SERVER_PORT": str(server[1]),
+        "SERVER_PROTOCOL": f"HTTP/{scope.get('http_version', '1.1')}",
+        "REMOTE_ADDR": (scope.get("client") or ("", 0))[0],
+        "wsgi.version": (1, 0),
+        "wsgi.url_scheme": scope.get("scheme", "http"),
+        "wsgi.input": BytesIO(body),
+        "wsgi.errors": sys.stderr,
+        "wsgi.multithread": True,
+        "wsgi.multiprocess": True,
+        "wsgi.run_once": False,
+    }
+    for name, value in scope["headers"]:
+        key = name.decode("latin-1").upper().replace("-", "_")
+        if key not in ("CONTENT_TYPE", "CONTENT_LENGTH"):
+            key = f"HTTP_{key}"
+        value = value.decode("latin-1")
+        environ[key] = f"{environ[key]},{value}" if key in environ else value
+    environ["CONTENT_LENGTH"] = str(len(body))
+    return environ
+
+
+def _error_result(error: HTTPException) -> Result:
+    if isinstance(error, TokenError):
+        return {"msg": error.description}, error.code, {}
+    data = getattr(error, "data", None) or {"message": error.description}
+    return data, error.code, dict(error.get_headers())
+
+
+class AsgiApp:
+    """ASGI application serving async namespaces, and the WSGI ``app`` for any other route.
+
+    Requests are handled within a request context of ``app``, running its request hooks, and an
+    async database session. Bodies larger than ``MAX_CONTENT_LENGTH``, or
+    :data:`DEFAULT_MAX_CONTENT_LENGTH` when unset, are answered with *413 Content Too Large*.
+    """
+
+    def __init__(self, app: Flask, namespaces: list[AsyncNamespace]) -> None:
+        """Serve ``namespaces`` and fall back to ``app``."""
+        self.app = app
+        self.url_map = Map([rule.empty() for ns in namespaces for rule in ns.rules])
+        self.handlers = {key: value for ns in namespaces for key, value in ns.handlers.items()}
+        self.error_handlers = {
+            (ns.name, exception): handler
+            for ns in namespaces
+            for exception, handler in ns.error_handlers.items()
+        }
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        """Handle an ASGI connection."""
+        match scope["type"]:
+            case "lifespan":
+                await self._lifespan(receive, send)
+            case "http":
+                await self._http(scope, receive, send)
+
+    async def _lifespan(self, receive: Receive, send: Send) -> None:
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                with self.app.app_context():
+                    await async_db.engine.dispose()
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+
+    async def _receive_body(self, scope: Scope, receive: Receive) -> bytes | None:
+        """Body of the request, None when the client disconnected before sending it whole.
+
+        Raises:
+            RequestEntityTooLarge: As soon as the body is known to be too large.
+        """
+        limit = self.app.config["MAX_CONTENT_LENGTH"] or DEFAULT_MAX_CONTENT_LENGTH
+        for name, value in scope["headers"]:
+            if name.lower() == b"content-length" and value.isdigit() and int(value) > limit:
+                raise RequestEntityTooLarge()
+        body = bytearray()
+        while True:
+            message = await receive()
+            if message["type"] == "http.disconnect":
+                return None
+            body += message.get("body", b"")
+            if len(body) > limit:
+                raise RequestEntityTooLarge()
+            if not message.get("more_body"):
+                return bytes(body)
+
+    async def _http(self, scope: Scope, receive: Receive, send: Send) -> None:
+        try:
+            body = await self._receive_body(scope, receive)
+        except RequestEntityTooLarge as error:
+            await self._respond(send, make_response(_error_result(error)))
+            return
+        if body is None:
+            return
+
+        adapter = self.url_map.bind("", script_name=scope.get("root_path") or "/")
+        try:
+            endpoint, kwargs = adapter.match(scope["path"], scope["method"])
+        except (NotFound, MethodNotAllowed, RequestRedirect):
+            await self._wsgi(scope, body, send)
+            return
+
+        headers = Headers(
+            [(name.decode("latin-1"), value.decode("latin-1")) for name, value in scope["headers"]]
+        )
+        request = AsyncRequest(
+            method=scope["method"],
+            scheme=scope.get("scheme", "http"),
+            host=headers.get("Host", "localhost"),
+            root_path=scope.get("root_path", ""),
+            path=scope["path"],
+            args=MultiDict(
+                parse_qsl(scope.get("query_string", b"").decode("latin-1"), keep_blank_values=True)
+            ),
+            headers=headers,
+            body=body,
+        )
+        environ = _wsgi_environ(scope, body)
+        # Tears the request down, running the teardown hooks, on exit.
+        with self.app.request_context(environ):
+            response = await self._dispatch(endpoint, request, kwargs)
+            response = self.app.process_response(response)
+            await self._respond(send, response, environ)
+
+    async def _dispatch(
+        self, endpoint: str, request: AsyncRequest, kwargs: Mapping[str, Any]
+    ) -> Response:
+        try:
+            if (result := self.app.preprocess_request()) is not None:
+                return self.app.make_response(result)
+            async with async_db.session_scope():
+                return make_response(await self.handlers[endpoint](request, **kwargs))
+        except Exception as error:
+            namespace = endpoint.partition(".")[0]
+            for exception in type(error).__mro__:
+                if handler := self.error_handlers.get((namespace, exception)):
+                    return make_response(handler(error))
+            if isinstance(error, HTTPException):
+                return make_response(_error_result(error))
+            raise
+
+    @staticmethod
+    async def _respond(
+        send: Send, response: Response, environ: dict[str, Any] | None = None
+    ) -> None:
+        environ = environ or {"REQUEST_METHOD": "GET"}
+        headers = response.get_wsgi_headers(environ)
+        body = b"".join(response.get_app_iter(environ))
+        await send(
+            {
+                "type": "http.response.start",
+                "status": response.status_code,
+                "headers": [(k.encode("latin-1"), v.encode("latin-1")) for k, v in headers.items()],
+            }
+        )
+        await send({"type": "http.response.body", "body": body})
+
+    async def _wsgi(self, scope: Scope, body: bytes, send: Send) -> None:
+        started: list[Any] = []
+
+        def start_response(
+            status: str, headers: list[tuple[str, str]], exc_info: Any = None
+        ) -> Any:
+            started[:] = [int(status.split(" ", 1)[0]), headers]
+            return lambda data: None
+
+        app_iter = await asyncio.to_thread(self.app, _wsgi_environ(scope, body), start_response)
+        chunks: Iterator[bytes] = iter(app_iter)
+        try:
+            # Streamed responses are consumed on a thread too, one chunk at a time.
+            chunk = await asyncio.to_thread(next, chunks, None)
+            status, headers = started
+            await send(
+                {
+                    "type": "http.response.start",
+                    "status": status,
+                    "headers": [(k.encode("latin-1"), v.encode("latin-1")) for k, v in headers],
+                }
+            )
+            while chunk is not None:
+                if chunk:
+                    await send({"type": "http.response.body", "body": chunk, "more_body": True})
+                chunk = await asyncio.to_thread(next, chunks, None)
+            await send({"type": "http.response.body", "body": b""})
+        finally:
+            if hasattr(app_iter, "close"):
+                await asyncio.to_thread(app_iter.close)
@@ -0,0 +1,81 @@
+"""Async database access, the asyncio counterpart of the Flask-SQLAlchemy extension."""
+
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from typing import TYPE_CHECKING, AsyncIterator
+
+from flask import Flask, current_app
+from sqlalchemy.engine import make_url
+
+if TYPE_CHECKING:
+    # Imported by init_app, as the asyncio extension needs the greenlet package.
+    from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession
+
+# Async drivers of the database backends the sync configuration may use.
+ASYNC_DRIVERS = {"sqlite": "aiosqlite", "postgresql": "asyncpg", "mysql": "aiomysql"}
+
+
+def async_database_uri(uri: str) -> str:
+    """Database URI of ``uri`` using the async driver of its backend."""
+    url = make_url(uri)
+    if (driver := ASYNC_DRIVERS.get(url.get_backend_name())) is None:
+        raise ValueError(f"No async driver for {url.get_backend_name()}")
+    return url.set(drivername=f"{url.get_backend_name()}+{driver}").render_as_string(
+        hide_password=False
+    )
+
+
+class AsyncSQLAlchemy:
+    """Flask extension holding an async engine, and the async session of the current task.
+
+    The engine, along with the SQLAlchemy asyncio extension, is only loaded by :meth:`init_app`,
+    so the sync app does not need the ``asyncio`` extra installed.
+
+    Configuration:
+        SQLALCHEMY_ASYNC_DATABASE_URI: Database URI with an async driver, defaults to
+            ``SQLALCHEMY_DATABASE_URI`` with the async driver of its backend.
+        SQLALCHEMY_ENGINE_OPTIONS: Engine options, shared with the sync engine.
+    """
+
+    def __init__(self) -> None:
+        """Create the extension, without any engine."""
+        self._session: ContextVar["AsyncSession | None"] = ContextVar("async_session", default=None)
+
+    def init_app(self, app: Flask) -> None:
+        """Create the async engine of ``app``."""
+        from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+        if not app.config.get("SQLALCHEMY_ASYNC_DATABASE_URI"):
+            app.config["SQLALCHEMY_ASYNC_DATABASE_URI"] = async_database_uri(
+                app.config["SQLALCHEMY_DATABASE_URI"]
+            )
+        engine = create_async_engine(
+            app.config["SQLALCHEMY_ASYNC_DATABASE_URI"],
+            **app.config.get("SQLALCHEMY_ENGINE_OPTIONS", {}),
+        )
+        app.extensions["async_sqlalchemy"] = async_sessionmaker(engine, expire_on_commit=False)
+
+    @property
+    def engine(self) -> "AsyncEngine":
+        """Async engine of the current app."""
+        return current_app.extensions["async_sqlalchemy"].kw["bind"]  # type: ignore
+
+    @property
+    def session(self) -> "AsyncSession":
+        """Async session of the current task, see :meth:`session_scope`."""
+        if (session := self._session.get()) is None:
+            raise RuntimeError("No async session, use session_scope")
+        return session
+
+    @asynccontextmanager
+    async def session_scope(self) -> AsyncIterator["AsyncSession"]:
+        """Open an async session for the current task, closed on exit.
+
+        Committed values are not expired, as loading them again would need an ``await``.
+        """
+        async with current_app.extensions["async_sqlalchemy"]() as session:
+            token = self._session.set(session)
+            try:
+                yield session
+            finally:
+                self._session.reset(token)
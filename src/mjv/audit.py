@@ -0,0 +1,201 @@
+"""Index audit of the queries issued by the API routes.
+
+:func:`route_queries` builds the statements of every route with the helpers the routes call.
+The statements the routes actually execute are checked against them by the test suite, with
+:func:`recorded_statements` and :func:`uncovered_statements`, so a query added to a route
+without being audited fails the tests.
+"""
+
+import re
+from contextlib import contextmanager
+from typing import Any, Iterable, Iterator, NamedTuple
+
+import sqlalchemy
+from sqlalchemy import ClauseElement, Engine, event
+from sqlalchemy.engine import Connection
+from sqlalchemy.orm import undefer
+
+from .apis.todo.models import Todo
+from .apis.todo.parsers import SORT_ORDERS
+from .apis.todo.routes import (
+    export_query,
+    filter_criteria,
+    list_criteria,
+    list_order,
+    list_state,
+    todo_criteria,
+)
+from .apis.todo.sync import RECORD, TOMBSTONE, changed_todos, deleted_todos
+from .apis.user.models import User
+from .changes import COUNTER_TABLE
+from .database import DataBasePrimitives
+from .extensions import db
+from .pagination import encode_cursor, keyset_query
+
+# Placeholder values, the plan does not depend on them.
+_USER_ID = 1
+_TODO_ID = 1
+_CHANGE_SEQ = 1
+_LIMIT = 50
+_CHANGED_AT = "2024-01-01T00:00:00"
+_SORT_VALUES: dict[str, DataBasePrimitives] = {
+    "id": _TODO_ID,
+    "created_at": _CHANGED_AT,
+    "modified_at": _CHANGED_AT,
+    "task": "x",
+}
+_LIST_FILTERS = {"completed": None, "created_after": None, "completed_before": None, "q": None}
+
+
+class QueryPlan(NamedTuple):
+    """Query plan of a single route query."""
+
+    route: str
+    sql: str
+    plan: list[str]
+    full_scans: list[str]
+
+
+def _list_query(**filters: Any) -> sqlalchemy.Select[Any]:
+    criteria = list_criteria(_USER_ID, {**_LIST_FILTERS, **filters}, db.engine.dialect.name)
+    return sqlalchemy.select(Todo).where(*criteria)
+
+
+def _list_pages(sort: str) -> dict[str, sqlalchemy.Select[Any]]:
+    keys, descending = list_order(sort)
+    cursor = encode_cursor([_SORT_VALUES[key.key] for key in keys])
+    query = _list_query()
+    return {
+        f"TodoList.get (sort={sort})": keyset_query(query, keys, _LIMIT, None, descending),
+        f"TodoList.get (sort={sort}, after=)": keyset_query(
+            query, keys, _LIMIT, cursor, descending
+        ),
+    }
+
+
+def route_queries() -> dict[str, ClauseElement]:
+    """Queries issued by each route, keyed by ``Resource.method``, on the current database."""
+    by_id = Todo.id == _TODO_ID
+    seen_version = (by_id, Todo.version == 1)
+    after_record = (_CHANGE_SEQ, RECORD, _TODO_ID)
+    after_tombstone = (_CHANGE_SEQ, TOMBSTONE, _TODO_ID)
+    return {
+        "TodoList.get (state)": list_state(_USER_ID),
+        **{route: page for sort in SORT_ORDERS for route, page in _list_pages(sort).items()},
+        "TodoList.get (q=)": keyset_query(_list_query(q="todo"), (Todo.id,), _LIMIT),
+        "TodoList.get (completed=, all=)": _list_query(completed=False).order_by(Todo.id),
+        "TodoList.patch": sqlalchemy.update(Todo)
+        .where(*filter_criteria(_USER_ID, ids=[_TODO_ID]))
+        .values(completed=True),
+        "TodoList.delete": sqlalchemy.delete(Todo).where(
+            *filter_criteria(_USER_ID, completed=True)
+        ),
+        "TodoExport.get": export_query(_USER_ID),
+        "TodoChanges.get": changed_todos(_USER_ID, after_record, _LIMIT),
+        "TodoChanges.get (after a delete)": changed_todos(_USER_ID, after_tombstone, _LIMIT),
+        "TodoChanges.get (deleted)": deleted_todos(_USER_ID, after_record, _LIMIT),
+        "TodoChanges.get (deleted, after a delete)": deleted_todos(
+            _USER_ID, after_tombstone, _LIMIT
+        ),
+        "Task.get": sqlalchemy.select(Todo).where(*todo_criteria(_TODO_ID, _USER_ID)).limit(1),
+        "Task.patch": sqlalchemy.update(Todo)
+        .where(*todo_criteria(_TODO_ID, _USER_ID))
+        .values(completed=True),
+        "Task.put": sqlalchemy.update(Todo).where(by_id).values(task="todo"),
+        "Task.put (If-Match)": sqlalchemy.update(Todo).where(*seen_version).values(task="todo"),
+        "Task.put (refresh)": sqlalchemy.select(Todo).where(by_id),
+        "Task.delete": sqlalchemy.delete(Todo).where(by_id),
+        "Task.delete (If-Match)": sqlalchemy.delete(Todo).where(*seen_version),
+        "Login.post": sqlalchemy.select(User)
+        .options(undefer(User.password))
+        .filter_by(username="user")
+        .limit(1),
+        "CurrentUser.get": sqlalchemy.select(User).where(User.id == _USER_ID),
+        "CurrentUser.put": sqlalchemy.update(User)
+        .where(User.id == _USER_ID)
+        .values(password="password"),
+    }
+
+
+_PLACEHOLDER = re.compile(r"\?|%\(\w+\)s|%s|\$\d+")
+_PLACEHOLDER_LIST = re.compile(r"\((?:\?, )*\?\)")
+_UPDATE_VALUES = re.compile(r"^UPDATE (\S+) SET .*?(?= WHERE |$)")
+
+
+def statement_key(sql: str) -> str | None:
+    """The part of ``sql`` deciding how its rows are found: its table, criteria, order and limit.
+
+    Values, and the number of them in lists, are left out. None for the statements finding no
+    rows, inserts of values and advances of the single row change counter.
+    """
+    sql = _PLACEHOLDER.sub("?", " ".join(sql.split()))
+    sql = _PLACEHOLDER_LIST.sub("(?)", sql).split(" RETURNING ")[0]
+    sql = _UPDATE_VALUES.sub(r"FROM \1", sql)
+    if (start := sql.find("FROM ")) < 0 or sql.startswith(f"FROM {COUNTER_TABLE}", start):
+        return None
+    return sql[start:]
+
+
+@contextmanager
+def recorded_statements(engine: Engine) -> Iterator[list[str]]:
+    """Record the SQL of the statements ``engine`` executes within the block."""
+    statements: list[str] = []
+
+    def record(connection: Connection, cursor: Any, statement: str, *args: Any) -> None:
+        statements.append(statement)
+
+    event.listen(engine, "before_cursor_execute", record)
+    try:
+        yield statements
+    finally:
+        event.remove(engine, "before_cursor_execute", record)
+
+
+def uncovered_statements(statements: Iterable[str]) -> list[str]:
+    """The ``statements`` finding their rows unlike any of the :func:`route_queries`."""
+    dialect = db.engine.dialect
+    covered = {
+        statement_key(
+            str(query.compile(dialect=dialect, compile_kwargs={"render_postcompile": True}))
+        )
+        for query in route_queries().values()
+    }
+    return [sql for sql in statements if (key := statement_key(sql)) and key not in covered]
+
+
+# Virtual tables, like the full-text index, are always scanned, through their own index when it
+# is given constraints.
+_VIRTUAL_INDEX = re.compile(r"VIRTUAL TABLE INDEX \d+:\S")
+
+
+def _sqlite_plan(connection: Connection, sql: str) -> tuple[list[str], list[str]]:
+    plan = [row.detail for row in connection.exec_driver_sql(f"EXPLAIN QUERY PLAN {sql}")]
+    full_scans = [line for line in plan if line.startswith("SCAN ")]
+    return plan, [line for line in full_scans if not _VIRTUAL_INDEX.search(line)]
+
+
+def _postgresql_plan(connection: Connection, sql: str) -> tuple[list[str], list[str]]:
+    # Tiny tables are always scanned sequentially, make the planner prefer indexes if any exist.
+    connection.exec_driver_sql("SET LOCAL enable_seqscan = off")
+    plan = [row[0] for row in connection.exec_driver_sql(f"EXPLAIN {sql}")]
+    return plan, [line for line in plan if "Seq Scan" in line]
+
+
+_EXPLAINERS = {"sqlite": _sqlite_plan, "postgresql": _postgresql_plan}
+
+
+def explain_route_queries() -> Iterator[QueryPlan]:
+    """Explain every route query against the current database and report full table scans.
+
+    Raises:
+        NotImplementedError: When the database dialect is not supported.
+    """
+    dialect = db.engine.dialect
+    if not (explain := _EXPLAINERS.get(dialect.name)):
+        raise NotImplementedError(f"Index audit is not supported for {dialect.name!r}")
+
+    with db.engine.connect() as connection, connection.begin():
+        for route, query in route_queries().items():
+            sql = str(query.compile(dialect=dialect, compile_kwargs={"literal_binds": True}))
+            plan, full_scans = explain(connection, sql)
+            yield QueryPlan(route, sql, plan, full_scans)
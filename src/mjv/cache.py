@@ -0,0 +1,302 @@
+"""Caches, in-process by default."""
+
+import sys
+import time
+import uuid
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from threading import Lock
+from typing import Any, Callable, Generic, Hashable, Mapping, Protocol, TypeVar
+
+from flask import Flask, current_app, has_app_context
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import ORMExecuteState, Session
+from sqlalchemy.sql import operators
+from sqlalchemy.sql.elements import BinaryExpression, BindParameter, BooleanClauseList
+from werkzeug.utils import import_string
+
+K = TypeVar("K", bound=Hashable)
+K_contra = TypeVar("K_contra", bound=Hashable, contravariant=True)
+V = TypeVar("V")
+
+
+class CacheBackend(Protocol[K_contra, V]):
+    """Store of cached values, :class:`TTLCache` or an adapter of a store shared by processes."""
+
+    def get(self, key: K_contra) -> V | None:
+        """Get the value of ``key``, or None when missing or expired."""
+
+    def set(self, key: K_contra, value: V, ttl: float | None = None) -> None:
+        """Set the value of ``key`` for ``ttl`` seconds, by default those of the store."""
+
+    def delete(self, key: K_contra) -> None:
+        """Remove ``key``, if cached."""
+
+    def clear(self) -> None:
+        """Remove every entry."""
+
+
+class TTLCache(Generic[K, V]):
+    """Thread safe least recently used cache, whose entries expire after a time to live.
+
+    Args:
+        maxsize: Maximum number of entries, the least recently used are evicted first.
+        ttl: Default time to live of an entry, in seconds.
+        maxbytes: Maximum total size of the values, unlimited by default.
+        sizeof: Size of a value in bytes, for ``maxbytes``.
+    """
+
+    def __init__(
+        self,
+        maxsize: int,
+        ttl: float,
+        maxbytes: int | None = None,
+        sizeof: Callable[[V], int] = sys.getsizeof,
+    ) -> None:
+        """Create an empty cache."""
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.maxbytes = maxbytes
+        self.sizeof = sizeof
+        self.size = 0
+        self._entries: OrderedDict[K, tuple[float, V, int]] = OrderedDict()
+        self._lock = Lock()
+
+    def __len__(self) -> int:
+        """Number of entries, including the expired ones not evicted yet."""
+        return len(self._entries)
+
+    def get(self, key: K) -> V | None:
+        """Get the value of ``key``, or None when missing or expired."""
+        with self._lock:
+            if (entry := self._entries.get(key)) is None:
+                return None
+            expires_at, value, _ = entry
+            if expires_at <= time.monotonic():
+                self._remove(key)
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key: K, value: V, ttl: float | None = None) -> None:
+        """Set the value of ``key`` for ``ttl`` seconds, at most the default time to live."""
+        ttl = self.ttl if ttl is None else min(ttl, self.ttl)
+        size = self.sizeof(value) if self.maxbytes is not None else 0
+        if ttl <= 0 or self.maxsize <= 0 or (self.maxbytes is not None and size > self.maxbytes):
+            return
+        with self._lock:
+            self._remove(key)
+            self._entries[key] = (time.monotonic() + ttl, value, size)
+            self.size += size
+            while len(self._entries) > self.maxsize or (
+                self.maxbytes is not None and self.size > self.maxbytes
+            ):
+                self._remove(next(iter(self._entries)))
+
+    def _remove(self, key: K) -> None:
+        if (entry := self._entries.pop(key, None)) is not None:
+            self.size -= entry[2]
+
+    def delete(self, key: K) -> None:
+        """Remove ``key``, if cached."""
+        with self._lock:
+            self._remove(key)
+
+    def clear(self) -> None:
+        """Remove every entry."""
+        with self._lock:
+            self._entries.clear()
+            self.size = 0
+
+
+# Marker of writes to records of unknown owners, they invalidate every list.
+_ANY_OWNER = object()
+
+
+def _sizeof(value: Any) -> int:
+    if isinstance(value, (bytes, str)):
+        return len(value)
+    if isinstance(value, tuple):
+        return sum(map(_sizeof, value))
+    return sys.getsizeof(value)
+
+
+def _owners_in_criteria(whereclause: Any, column: Any) -> set[Any]:
+    """Owners selected by equality or IN criteria on ``column``, AND-ed in ``whereclause``."""
+    criteria = [] if whereclause is None else [whereclause]
+    if isinstance(whereclause, BooleanClauseList) and whereclause.operator is operators.and_:
+        criteria = list(whereclause.clauses)
+    for criterion in criteria:
+        if not isinstance(criterion, BinaryExpression) or not criterion.left.compare(column):
+            continue
+        if not isinstance(value := criterion.right, BindParameter):
+            continue
+        if criterion.operator is operators.eq:
+            return {value.effective_value}
+        if criterion.operator is operators.in_op and value.effective_value is not None:
+            return set(value.effective_value)
+    return {_ANY_OWNER}
+
+
+def _written(session: Session) -> set[tuple[type, Any]]:
+    """Models and owners written by the transaction of ``session``."""
+    return session.info.setdefault("list_cache_written", set())  # type: ignore
+
+
+@dataclass
+class _ListCacheState:
+    backend: CacheBackend[Hashable, Any]
+    hits: int = 0
+    misses: int = 0
+    invalidations: int = 0
+    lock: Lock = field(default_factory=Lock)
+
+    def count(self, counter: str) -> None:
+        with self.lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+
+
+class ListCache:
+    """Flask extension caching serialized lists of records per owner, like a user's todos.
+
+    Lists are read through the cache, and invalidated when writes to records of their owner are
+    committed, be it through the unit of work or bulk statements. A list is cached under the
+    current generation of its owner, invalidating replaces the generation, so a list read while
+    a write commits is never found again.
+
+    Configuration:
+        LIST_CACHE_ENABLED: Cache lists, disabled by default.
+        LIST_CACHE_SIZE: Maximum number of cached lists, defaults to 1024.
+        LIST_CACHE_TTL: Seconds a list is cached, defaults to 30.
+        LIST_CACHE_MAX_BYTES: Maximum total size of the cached lists, defaults to 64 MiB.
+        LIST_CACHE_BACKEND: Import path of a function creating the backend from the app, for a
+            store shared by every process. Defaults to a :class:`TTLCache` per process.
+    """
+
+    def __init__(self) -> None:
+        """Create the extension, lists are cached for the models it watches."""
+        self.owners: dict[type, str] = {}
+
+    def watch(self, model: type, owner: str = "user_id") -> None:
+        """Invalidate the lists of ``model`` records, by the value of their ``owner`` attribute."""
+        self.owners[model] = owner
+
+    def init_app(self, app: Flask) -> None:
+        """Create the backend of ``app``, when enabled."""
+        app.config.setdefault("LIST_CACHE_ENABLED", False)
+        app.config.setdefault("LIST_CACHE_SIZE", 1024)
+        app.config.setdefault("LIST_CACHE_TTL", 30)
+        app.config.setdefault("LIST_CACHE_MAX_BYTES", 64 * 1024 * 1024)
+        app.config.setdefault("LIST_CACHE_BACKEND", None)
+        if not app.config["LIST_CACHE_ENABLED"]:
+            return
+
+        if backend_factory := app.config["LIST_CACHE_BACKEND"]:
+            backend = import_string(backend_factory)(app)
+        else:
+            backend = TTLCache[Hashable, Any](
+                app.config["LIST_CACHE_SIZE"],
+                app.config["LIST_CACHE_TTL"],
+                app.config["LIST_CACHE_MAX_BYTES"],
+                _sizeof,
+            )
+        app.extensions["list_cache"] = _ListCacheState(backend)
+        if not event.contains(Session, "after_flush", self._after_flush):
+            event.listen(Session, "after_flush", self._after_flush)
+            event.listen(Session, "do_orm_execute", self._do_orm_execute)
+            event.listen(Session, "after_commit", self._after_commit)
+            event.listen(Session, "after_rollback", self._after_rollback)
+
+    @property
+    def enabled(self) -> bool:
+        """Whether lists are cached by the current app."""
+        return "list_cache" in current_app.extensions
+
+    @property
+    def state(self) -> _ListCacheState:
+        """Backend and counters of the current app."""
+        return current_app.extensions["list_cache"]  # type: ignore
+
+    def _generation(self, *key: Any) -> str:
+        key = ("generation", *key)
+        if (generation := self.state.backend.get(key)) is None:
+            generation = uuid.uuid4().hex
+            self.state.backend.set(key, generation)
+        return generation
+
+    def generation(self, model: type, owner: Any) -> tuple[str, str]:
+        """Current generation of the lists of ``model`` records of ``owner``.
+
+        Read it before querying a list, then get and set the list under it, so a list read
+        while a write commits is cached under the generation the write replaced.
+        """
+        return self._generation(model.__name__), self._generation(model.__name__, owner)
+
+    def get(
+        self, model: type, owner: Any, key: Hashable, generation: tuple[str, str]
+    ) -> Any | None:
+        """Get the list of ``model`` records of ``owner`` cached under ``key`` at ``generation``."""
+        state = self.state
+        value = state.backend.get((model.__name__, owner, *generation, key))
+        state.count("misses" if value is None else "hits")
+        return value
+
+    def set(
+        self, model: type, owner: Any, key: Hashable, value: Any, generation: tuple[str, str]
+    ) -> None:
+        """Cache the list of ``model`` records of ``owner`` under ``key``, at ``generation``."""
+        self.state.backend.set((model.__name__, owner, *generation, key), value)
+
+    def invalidate(self, model: type, owner: Any) -> None:
+        """Forget every list of ``model`` records of ``owner``, or of any owner."""
+        state = self.state
+        state.count("invalidations")
+        if owner is _ANY_OWNER:
+            state.backend.set(("generation", model.__name__), uuid.uuid4().hex)
+        else:
+            state.backend.set(("generation", model.__name__, owner), uuid.uuid4().hex)
+
+    @property
+    def stats(self) -> dict[str, int]:
+        """Hits, misses and invalidations of the current app."""
+        state = self.state
+        return {"hits": state.hits, "misses": state.misses, "invalidations": state.invalidations}
+
+    def _after_flush(self, session: Session, flush_context: Any) -> None:
+        written = _written(session)
+        for instance in (*session.new, *session.dirty, *session.deleted):
+            if (owner := self.owners.get(type(instance))) is None:
+                continue
+            # Read the loaded value only, loading expired attributes is not allowed while flushing.
+            history = inspect(instance).attrs[owner].history
+            values = [*history.unchanged, *history.added, *history.deleted] or [_ANY_OWNER]
+            written.update((type(instance), value) for value in values)
+
+    def _do_orm_execute(self, orm_execute_state: ORMExecuteState) -> None:
+        state = orm_execute_state
+        if not (state.is_insert or state.is_update or state.is_delete):
+            return
+        mapper = state.bind_mapper
+        if mapper is None or (owner := self.owners.get(mapper.class_)) is None:
+            return
+        model = mapper.class_
+        if state.is_insert:
+            parameters = state.parameters or {}
+            rows = [parameters] if isinstance(parameters, Mapping) else parameters
+            owners = {row.get(owner, _ANY_OWNER) for row in rows}
+        else:
+            # UPDATE ... RETURNING loading records is wrapped in a select from the statement.
+            statement = getattr(state.statement, "element", state.statement)
+            whereclause = statement.whereclause  # type: ignore
+            owners = _owners_in_criteria(whereclause, mapper.columns[owner])
+        _written(state.session).update((model, value) for value in owners)
+
+    def _after_commit(self, session: Session) -> None:
+        written = session.info.pop("list_cache_written", set())
+        if written and has_app_context() and self.enabled:
+            for model, owner in written:
+                self.invalidate(model, owner)
+
+    @staticmethod
+    def _after_rollback(session: Session) -> None:
+        session.info.pop("list_cache_written", None)
@@ -0,0 +1,177 @@
+"""Change log of watched models, letting clients sync only what changed since their last sync.
+
+Every INSERT or UPDATE of a watched record numbers it from the change sequence of its database,
+and every delete leaves a tombstone numbered from the same sequence. The sequence is a counter
+row incremented by the writing transaction, which holds its lock until it ends, so the numbers
+follow the order of the commits. The records and tombstones numbered after the last change a
+client saw are all that changed since.
+
+The lock serializes the transactions writing watched records to a database, from their first
+write until they end. A sequence would not, but its numbers follow the order in which writes
+start, so a client could sync past a change committed later with a lower number.
+"""
+
+from datetime import UTC, datetime, timedelta
+from typing import Any
+from weakref import WeakKeyDictionary
+
+import sqlalchemy
+from flask import Flask, current_app
+from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import event
+from sqlalchemy.engine.default import DefaultExecutionContext
+from sqlalchemy.orm import Mapper, ORMExecuteState, Session
+
+from .sharding import ShardRouter, on_shard
+
+TOMBSTONE_TABLE = "tombstone"
+COUNTER_TABLE = "change_counter"
+
+
+def _now() -> datetime:
+    # Naive UTC, like the stored timestamps.
+    return datetime.now(UTC).replace(tzinfo=None)
+
+
+class ChangeLog:
+    """Flask extension keeping a tombstone of every deleted record of the watched models.
+
+    Watched models need an ``id`` primary key and a ``change_seq`` column numbered by
+    :meth:`next_change`. Deletes through the unit of work and bulk DELETE statements are both
+    logged, in the transaction of the delete. Tombstones are kept in the ``tombstone`` table,
+    which is sharded along with the records, until compacted by :meth:`compact`. Keep the
+    transactions writing watched records short, they wait on each other for the counter row.
+
+    Configuration:
+        TOMBSTONE_RETENTION_DAYS: Days tombstones are kept before being compacted, defaults to
+            30. Clients not synced for longer have to sync everything again.
+    """
+
+    def __init__(self, db: SQLAlchemy) -> None:
+        """Keep the tombstones in the database of the ``db`` extension."""
+        self.db = db
+        self.owners: dict[type, str] = {}
+        # Number taken by each statement, shared by the records it writes.
+        self._numbers: WeakKeyDictionary[DefaultExecutionContext, int] = WeakKeyDictionary()
+        self.counter = sqlalchemy.Table(
+            COUNTER_TABLE,
+            db.metadata,
+            sqlalchemy.Column("id", sqlalchemy.Integer, primary_key=True),
+            sqlalchemy.Column("seq", sqlalchemy.Integer, nullable=False),
+        )
+        event.listen(self.counter, "after_create", self._create_counter)
+        self.tombstones = sqlalchemy.Table(
+            TOMBSTONE_TABLE,
+            db.metadata,
+            sqlalchemy.Column(
+                "id", sqlalchemy.Integer, primary_key=True, info={"shard_local": True}
+            ),
+            sqlalchemy.Column("table_name", sqlalchemy.String(64), nullable=False),
+            sqlalchemy.Column("record_id", sqlalchemy.Integer, nullable=False),
+            sqlalchemy.Column("owner", sqlalchemy.Integer, nullable=False),
+            sqlalchemy.Column(
+                "change_seq",
+                sqlalchemy.Integer,
+                nullable=False,
+                default=self.next_change,
+                info={"shard_local": True},
+            ),
+            sqlalchemy.Column("deleted_at", sqlalchemy.DateTime, nullable=False),
+            sqlalchemy.Index(
+                "ix_tombstone_table_name_owner_change_seq",
+                "table_name",
+                "owner",
+                "change_seq",
+                "record_id",
+            ),
+            sqlalchemy.Index("ix_tombstone_table_name_change_seq", "table_name", "change_seq"),
+        )
+        event.listen(Session, "do_orm_execute", self._log_bulk_delete)
+
+    def watch(self, model: type, owner: str = "user_id") -> None:
+        """Log the deletes of ``model`` records, along with the value of their ``owner``."""
+        self.owners[model] = owner
+        event.listen(model, "before_delete", self._log_delete)
+
+    def init_app(self, app: Flask) -> None:
+        """Set the retention of the tombstones of ``app``."""
+        app.config.setdefault("TOMBSTONE_RETENTION_DAYS", 30)
+
+    @property
+    def retention(self) -> timedelta:
+        """How long the current app keeps tombstones."""
+        return timedelta(days=current_app.config["TOMBSTONE_RETENTION_DAYS"])
+
+    @staticmethod
+    def _create_counter(target: Any, connection: sqlalchemy.Connection, **kwargs: Any) -> None:
+        """Start the change sequence of a new database, or shard."""
+        connection.execute(sqlalchemy.insert(target).values(id=1, seq=0))
+
+    def _advance(self, connection: sqlalchemy.Connection) -> int:
+        counter = self.counter
+        statement = (
+            sqlalchemy.update(counter).values(seq=counter.c.seq + 1).returning(counter.c.seq)
+        )
+        number: int = connection.execute(statement).scalar_one()
+        return number
+
+    def next_change(self, context: DefaultExecutionContext) -> int:
+        """Next number of the change sequence, for the records written by ``context``.
+
+        Column default of the ``change_seq`` columns, taken once per statement from the counter
+        row of the database written to, in the transaction of the statement.
+        """
+        if (number := self._numbers.get(context)) is None:
+            number = self._numbers[context] = self._advance(context.connection)
+        return number
+
+    def _log_delete(
+        self, mapper: Mapper[Any], connection: sqlalchemy.Connection, target: Any
+    ) -> None:
+        """Log the delete of ``target`` by the unit of work."""
+        connection.execute(
+            sqlalchemy.insert(self.tombstones).values(
+                table_name=mapper.local_table.name,  # type: ignore
+                record_id=target.id,
+                owner=getattr(target, self.owners[mapper.class_]),
+                deleted_at=_now(),
+            )
+        )
+
+    def _log_bulk_delete(self, state: ORMExecuteState) -> None:
+        """Log the records a bulk DELETE of a watched model is about to remove."""
+        if not state.is_delete or (mapper := state.bind_mapper) is None:
+            return
+        if (owner := self.owners.get(mapper.class_)) is None:
+            return
+        # The connection of the transaction of the DELETE, on the shard of the records if any.
+        connection = state.session.connection(bind_arguments={"mapper": mapper})
+        table = mapper.local_table
+        deleted = sqlalchemy.select(
+            sqlalchemy.literal(table.name),  # type: ignore
+            table.c.id,
+            table.c[owner],
+            sqlalchemy.literal(self._advance(connection)),
+            sqlalchemy.literal(_now(), sqlalchemy.DateTime),
+        ).where(state.statement.whereclause)  # type: ignore
+        columns = ["table_name", "record_id", "owner", "change_seq", "deleted_at"]
+        connection.execute(sqlalchemy.insert(self.tombstones).from_select(columns, deleted))
+
+    def compact(self, before: datetime | None = None) -> int:
+        """Remove the tombstones of records deleted before ``before``, on every shard.
+
+        Defaults to the tombstones older than the retention.
+
+        Returns:
+            The number of removed tombstones.
+        """
+        before = before or _now() - self.retention
+        removed = 0
+        for shard in range(len(ShardRouter.engines(current_app))) or [None]:
+            with on_shard(shard):
+                result = self.db.session.execute(
+                    sqlalchemy.delete(self.tombstones).where(self.tombstones.c.deleted_at < before)
+                )
+                removed += result.rowcount
+                self.db.session.commit()
+        return removed
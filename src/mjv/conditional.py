@@ -0,0 +1,64 @@
+"""Conditional requests, ETag based ``If-None-Match`` and ``If-Match`` handling."""
+
+import hashlib
+from typing import Any
+
+from flask import request
+from werkzeug.datastructures import ETags
+from werkzeug.exceptions import HTTPException, PreconditionFailed
+from werkzeug.http import quote_etag
+
+
+class NotModified(HTTPException):
+    """*304* `Not Modified`, the client's cached representation is still current."""
+
+    code = 304
+    description = "Not Modified"
+
+    def __init__(self, etag: str) -> None:
+        """Not modified response for the representation tagged ``etag``."""
+        super().__init__()
+        self.etag = etag
+
+    def get_headers(self, *args: Any, **kwargs: Any) -> list[tuple[str, str]]:
+        """Headers of the response, including the ``ETag``."""
+        return [*super().get_headers(*args, **kwargs), ("ETag", quote_etag(self.etag))]
+
+
+def make_etag(*parts: Any) -> str:
+    """Strong entity tag of a representation, derived from the values identifying its version."""
+    return hashlib.sha1(repr(parts).encode("utf-8"), usedforsecurity=False).hexdigest()
+
+
+def etag_header(etag: str) -> dict[str, str]:
+    """``ETag`` response header."""
+    return {"ETag": quote_etag(etag)}
+
+
+def check_not_modified(etag: str, if_none_match: ETags | None = None) -> None:
+    """Answer ``If-None-Match`` requests, by default those of the current request.
+
+    Raises:
+        NotModified: When the client already has the representation tagged ``etag``.
+    """
+    if (request.if_none_match if if_none_match is None else if_none_match).contains_weak(etag):
+        raise NotModified(etag)
+
+
+def check_precondition(etag: str, if_match: ETags | None = None) -> bool:
+    """Answer ``If-Match`` requests, by default those of the current request.
+
+    Used for optimistic concurrency control.
+
+    Returns:
+        Whether the request is conditional, that is it has an ``If-Match`` header.
+
+    Raises:
+        PreconditionFailed: When the current representation is not tagged ``etag``.
+    """
+    if_match = request.if_match if if_match is None else if_match
+    if not if_match:
+        return False
+    if not if_match.contains(etag):
+        raise PreconditionFailed()
+    return True
@@ -1,12 +1,14 @@
 """Database module, including the SQLAlchemy database object and DB-related utilities."""
 
 from datetime import UTC, datetime
+from functools import partial
 from typing import Any, Iterable, Self, TypeAlias
 
 import sqlalchemy
 from flask_restx.fields import DateTime, Integer
 
-from .extensions import db
+from .conditional import make_etag
+from .extensions import async_db, db, group_commit
 
 # Alias common SQLAlchemy names
 Column = db.Column
@@ -23,6 +25,97 @@ class CRUDMixin:
         instance = cls(**kwargs)
         return instance.save()
 
+    @classmethod
+    def bulk_create(
+        cls, rows: Iterable[dict[str, DataBasePrimitives]], commit: bool = True
+    ) -> list[Self]:
+        """Create many records with a single INSERT statement and save them to the database.
+
+        The records are returned in the order of ``rows``, populated by ``INSERT ... RETURNING``.
+        """
+        if not (rows := list(rows)):
+            return []
+        statement = sqlalchemy.insert(cls).returning(cls, sort_by_parameter_order=True)
+        instances = list(db.session.scalars(statement, rows))
+        if commit:
+            # Detach the records so the commit does not expire the values RETURNING loaded.
+            for instance in instances:
+                db.session.expunge(instance)
+            db.session.commit()
+        return instances
+
+    @classmethod
+    def bulk_insert(cls, rows: Iterable[dict[str, DataBasePrimitives]], commit: bool = True) -> int:
+        """Create many records with a batched INSERT, without loading them back.
+
+        Returns:
+            The number of created records.
+        """
+        if not (rows := list(rows)):
+            return 0
+        db.session.execute(sqlalchemy.insert(cls), rows)
+        if commit:
+            db.session.commit()
+        return len(rows)
+
+    @classmethod
+    def bulk_update(
+        cls,
+        *criteria: sqlalchemy.ColumnElement[bool],
+        commit: bool = True,
+        **kwargs: DataBasePrimitives,
+    ) -> int:
+        """Update specific fields of every record matching ``criteria`` with a single UPDATE.
+
+        Returns:
+            The number of updated records.
+        """
+        result = db.session.execute(sqlalchemy.update(cls).where(*criteria).values(**kwargs))
+        if commit:
+            db.session.commit()
+        return result.rowcount
+
+    @classmethod
+    def update_returning(
+        cls,
+        *criteria: sqlalchemy.ColumnElement[bool],
+        commit: bool = True,
+        **kwargs: DataBasePrimitives,
+    ) -> Self | None:
+        """Update specific fields of the record matching ``criteria`` in a single statement.
+
+        Uses ``UPDATE ... RETURNING``, so the record does not need to be loaded first.
+
+        Returns:
+            The updated record, or None when no record matches.
+        """
+        returning = sqlalchemy.update(cls).where(*criteria).values(**kwargs).returning(cls)
+        # Refresh the record from RETURNING, also when it is already loaded in the session.
+        statement = (
+            sqlalchemy.select(cls)
+            .from_statement(returning)
+            .execution_options(populate_existing=True)
+        )
+        instance = db.session.scalars(statement).one_or_none()
+        if commit:
+            if instance is not None:
+                # Detach the record so the commit does not expire the values RETURNING loaded.
+                db.session.expunge(instance)
+            db.session.commit()
+        return instance
+
+    @classmethod
+    def bulk_delete(cls, *criteria: sqlalchemy.ColumnElement[bool], commit: bool = True) -> int:
+        """Remove every record matching ``criteria`` with a single DELETE.
+
+        Returns:
+            The number of removed records.
+        """
+        result = db.session.execute(sqlalchemy.delete(cls).where(*criteria))
+        if commit:
+            db.session.commit()
+        return result.rowcount
+
     def update(self, commit: bool = True, **kwargs: DataBasePrimitives) -> Self:
         """Update specific fields of a record."""
         for attr, value in kwargs.items():
@@ -33,6 +126,9 @@ class CRUDMixin:
 
     def save(self, commit: bool = True) -> Self:
         """Save the record."""
+        if commit and group_commit.coalesces(db.session(), self):
+            group_commit.commit(db.session(), self)
+            return self
         db.session.add(self)
         if commit:
             db.session.commit()
@@ -40,10 +136,77 @@ class CRUDMixin:
 
     def delete(self, commit: bool = True) -> None:
         """Remove the record from the database."""
+        if commit and group_commit.coalesces(db.session(), self):
+            group_commit.commit(db.session(), self, delete=True)
+            return
         db.session.delete(self)
         if commit:
             db.session.commit()
 
+    # Async counterparts, using the async session of the current task.
+
+    @classmethod
+    async def acreate(cls, **kwargs: DataBasePrimitives) -> Self:
+        """Create a new record and save it the database, asynchronously."""
+        return await cls(**kwargs).asave()
+
+    @classmethod
+    async def aupdate_returning(
+        cls,
+        *criteria: sqlalchemy.ColumnElement[bool],
+        commit: bool = True,
+        **kwargs: DataBasePrimitives,
+    ) -> Self | None:
+        """Update specific fields of the record matching ``criteria`` in a single statement.
+
+        Returns:
+            The updated record, or None when no record matches.
+        """
+        statement = (
+            sqlalchemy.select(cls)
+            .from_statement(sqlalchemy.update(cls).where(*criteria).values(**kwargs).returning(cls))
+            .execution_options(populate_existing=True)
+        )
+        instance = (await async_db.session.scalars(statement)).one_or_none()
+        if commit:
+            await async_db.session.commit()
+        return instance
+
+    @classmethod
+    async def abulk_delete(
+        cls, *criteria: sqlalchemy.ColumnElement[bool], commit: bool = True
+    ) -> int:
+        """Remove every record matching ``criteria`` with a single DELETE, asynchronously.
+
+        Returns:
+            The number of removed records.
+        """
+        result = await async_db.session.execute(sqlalchemy.delete(cls).where(*criteria))
+        if commit:
+            await async_db.session.commit()
+        return result.rowcount
+
+    async def aupdate(self, commit: bool = True, **kwargs: DataBasePrimitives) -> Self:
+        """Update specific fields of a record, asynchronously."""
+        for attr, value in kwargs.items():
+            setattr(self, attr, value)
+        if commit:
+            return await self.asave()
+        return self
+
+    async def asave(self, commit: bool = True) -> Self:
+        """Save the record, asynchronously."""
+        async_db.session.add(self)
+        if commit:
+            await async_db.session.commit()
+        return self
+
+    async def adelete(self, commit: bool = True) -> None:
+        """Remove the record from the database, asynchronously."""
+        await async_db.session.delete(self)
+        if commit:
+            await async_db.session.commit()
+
 
 class Model(CRUDMixin, db.Model):  # type: ignore [name-defined]
     """Base model class that includes CRUD convenience methods."""
@@ -58,9 +221,17 @@ class PkModel(Model):
     """
 
     __abstract__ = True
+    # Fetch the values the database computes, like the version, with the INSERT or UPDATE itself.
+    __mapper_args__ = {"eager_defaults": True}
     id = Column(db.Integer, primary_key=True)
-    created_at = db.Column(db.DateTime, default=datetime.now(UTC))
-    modified_at = db.Column(db.DateTime, default=datetime.now(UTC), onupdate=datetime.now(UTC))
+    created_at = db.Column(db.DateTime, default=partial(datetime.now, UTC))
+    modified_at = db.Column(
+        db.DateTime, default=partial(datetime.now, UTC), onupdate=partial(datetime.now, UTC)
+    )
+    # Row version, incremented in SQL by every UPDATE, including the set-based ones.
+    version = db.Column(
+        db.Integer, nullable=False, default=1, onupdate=sqlalchemy.literal_column("version") + 1
+    )
 
     @classmethod
     def field_descriptions(cls) -> Iterable[tuple[str, Any]]:
@@ -71,6 +242,13 @@ class PkModel(Model):
             ("modified_at", DateTime(readOnly=True, description="The last modified timestamp")),
         )
 
+    @property
+    def etag(self) -> str:
+        """Strong entity tag of this version of the record."""
+        # The creation time tells apart records reusing the identifier of a deleted one.
+        created_at = self.created_at.replace(tzinfo=None)
+        return make_etag(self.__tablename__, self.id, self.version, created_at)
+
     @classmethod
     def get_by_id(cls, record_id: str | bytes | int | float) -> Self | None:  # type: ignore
         """Get record by ID."""
@@ -82,6 +260,17 @@ class PkModel(Model):
         ):
             return cls.query.session.get(cls, int(record_id))  # type: ignore
 
+    @classmethod
+    async def aget_by_id(cls, record_id: str | bytes | int | float) -> Self | None:  # type: ignore
+        """Get record by ID, asynchronously."""
+        if any(
+            (
+                isinstance(record_id, (str, bytes)) and record_id.isdigit(),
+                isinstance(record_id, (int, float)),
+            )
+        ):
+            return await async_db.session.get(cls, int(record_id))
+
 
 def reference_col(
     tablename: str,
@@ -1,11 +1,34 @@
 """Extensions module. Each extension is initialized in the app factory located in app.py."""
 
 from flask_bcrypt import Bcrypt
-from flask_jwt_extended import JWTManager
 from flask_restx import Api
 from flask_sqlalchemy import SQLAlchemy
 
-db = SQLAlchemy()
+from .async_database import AsyncSQLAlchemy
+from .cache import ListCache
+from .changes import ChangeLog
+from .group_commit import GroupCommit
+from .hashing import PasswordHasher
+from .instrumentation import RequestMetrics
+from .pool import PoolMetrics
+from .queries import QueryMonitor
+from .replicas import ReplicaRouter, RoutingSession
+from .sharding import ShardRouter
+from .sqlite import SQLiteTuning
+from .tokens import CachingJWTManager
+
+db = SQLAlchemy(session_options={"class_": RoutingSession})
+async_db = AsyncSQLAlchemy()
 api = Api(version="1.0", title="MJV API", description="A simple To-Do API", doc="/")
 bcrypt = Bcrypt()
-jwt = JWTManager()
+hasher = PasswordHasher(bcrypt)
+jwt = CachingJWTManager()
+list_cache = ListCache()
+change_log = ChangeLog(db)
+group_commit = GroupCommit(db)
+pool_metrics = PoolMetrics(db)
+query_monitor = QueryMonitor(db)
+replicas = ReplicaRouter()
+shards = ShardRouter(db)
+request_metrics = RequestMetrics()
+sqlite_tuning = SQLiteTuning(db)
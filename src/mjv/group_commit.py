@@ -0,0 +1,192 @@
+"""Group commit, sharing one transaction among the small writes of concurrent requests.
+
+Every commit waits for the database to sync its log to disk, which caps the throughput of small
+writes, like toggling todos, to the sync latency of the disk. With group commit the first write
+to arrive waits a few milliseconds for others, then applies them all in one transaction, each
+within its own savepoint so the failure of one does not fail the others. Every request still
+returns only once its write is committed.
+"""
+
+import contextvars
+from dataclasses import dataclass, field
+from threading import Event, Lock
+from typing import Any
+
+from flask import Flask, current_app
+from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import event
+from sqlalchemy.orm import Session, SessionTransaction
+
+from .metrics import Histogram
+from .sharding import current_shard, on_shard
+
+# Upper bounds fitting the number of writes committed together.
+BATCH_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128, 256)
+
+
+@dataclass
+class _Write:
+    instance: Any
+    delete: bool
+    error: BaseException | None = None
+    shard: int | None = field(default_factory=current_shard)
+
+
+@dataclass
+class _Batch:
+    writes: list[_Write] = field(default_factory=list)
+    full: Event = field(default_factory=Event)
+    done: Event = field(default_factory=Event)
+
+
+@dataclass
+class _GroupCommitState:
+    window: float
+    max_batch: int
+    pending: _Batch | None = None
+    sizes: Histogram = field(default_factory=lambda: Histogram(BATCH_BUCKETS))
+    lock: Lock = field(default_factory=Lock)
+
+
+def _wrote(session: Session, *args: Any) -> None:
+    session.info["group_commit_wrote"] = True
+
+
+def _wrote_dml(state: Any) -> None:
+    if state.is_insert or state.is_update or state.is_delete:
+        _wrote(state.session)
+
+
+def _transaction_end(session: Session, transaction: SessionTransaction) -> None:
+    if transaction.parent is None:
+        session.info.pop("group_commit_wrote", None)
+
+
+class GroupCommit:
+    """Flask extension coalescing the commits of records saved or deleted by concurrent requests.
+
+    Used by :meth:`~mjv.database.CRUDMixin.save` and :meth:`~mjv.database.CRUDMixin.delete`.
+    Only the writes of a single record, in a session without other changes, are coalesced,
+    anything else is committed on its own as usual.
+
+    Configuration:
+        GROUP_COMMIT_ENABLED: Coalesce commits, disabled by default.
+        GROUP_COMMIT_WINDOW: Seconds the first write of a batch waits for others, defaults to
+            0.002.
+        GROUP_COMMIT_MAX_BATCH: Number of writes after which a batch is committed without
+            waiting for the end of the window, defaults to 64.
+    """
+
+    def __init__(self, db: SQLAlchemy) -> None:
+        """Commit with sessions of the ``db`` extension."""
+        self.db = db
+
+    def init_app(self, app: Flask) -> None:
+        """Coalesce the commits of ``app``, when enabled."""
+        app.config.setdefault("GROUP_COMMIT_ENABLED", False)
+        app.config.setdefault("GROUP_COMMIT_WINDOW", 0.002)
+        app.config.setdefault("GROUP_COMMIT_MAX_BATCH", 64)
+        if not app.config["GROUP_COMMIT_ENABLED"]:
+            return
+
+        app.extensions["group_commit"] = _GroupCommitState(
+            app.config["GROUP_COMMIT_WINDOW"], app.config["GROUP_COMMIT_MAX_BATCH"]
+        )
+        if not event.contains(Session, "after_flush", _wrote):
+            event.listen(Session, "after_flush", _wrote)
+            event.listen(Session, "do_orm_execute", _wrote_dml)
+            event.listen(Session, "after_transaction_end", _transaction_end)
+
+    @property
+    def state(self) -> _GroupCommitState | None:
+        """Group commit state of the current app, None when disabled."""
+        return current_app.extensions.get("group_commit")
+
+    def coalesces(self, session: Session, instance: Any) -> bool:
+        """Whether committing ``instance`` in ``session`` can be coalesced with other writes.
+
+        It can when ``instance`` is the only change of ``session``, which has not written to
+        the database in its transaction yet.
+        """
+        if self.state is None or session.info.get("group_commit_wrote"):
+            return False
+        changed = (*session.new, *session.dirty, *session.deleted)
+        return all(record is instance for record in changed)
+
+    def commit(self, session: Session, instance: Any, delete: bool = False) -> None:
+        """Save, or delete, ``instance`` and commit together with concurrent writes.
+
+        The current transaction of ``session``, which only read, is ended. The record is
+        detached from it until the write is committed, then added back unless deleted.
+
+        Raises:
+            Exception: The error writing or committing the record.
+        """
+        if instance in session:
+            session.expunge(instance)
+        session.rollback()
+        write = _Write(instance, delete)
+        self._submit(write)
+        if write.error is not None:
+            raise write.error
+        if not delete:
+            session.add(instance)
+
+    def _submit(self, write: _Write) -> None:
+        state = self.state
+        assert state is not None
+        with state.lock:
+            if (batch := state.pending) is None:
+                batch = state.pending = _Batch()
+            leader = not batch.writes
+            batch.writes.append(write)
+            if len(batch.writes) >= state.max_batch:
+                state.pending = None
+                batch.full.set()
+        if not leader:
+            batch.done.wait()
+            return
+
+        batch.full.wait(state.window)
+        with state.lock:
+            if state.pending is batch:
+                state.pending = None
+        # Outside of the context of the leading request, whose metrics and query budget only
+        # account for its own work.
+        app = current_app._get_current_object()  # type: ignore
+        try:
+            contextvars.Context().run(self._apply, app, state, batch.writes)
+        finally:
+            batch.done.set()
+
+    def _apply(self, app: Flask, state: _GroupCommitState, writes: list[_Write]) -> None:
+        # Writes to different shards are committed in a transaction per shard.
+        shards: dict[int | None, list[_Write]] = {}
+        for write in writes:
+            shards.setdefault(write.shard, []).append(write)
+        with app.app_context():
+            for shard, group in shards.items():
+                state.sizes.observe(len(group))
+                with on_shard(shard):
+                    self._commit(group)
+
+    def _commit(self, writes: list[_Write]) -> None:
+        # Keep the values of the records, which are handed back to their requests.
+        with self.db.session.session_factory(expire_on_commit=False) as session:
+            for write in writes:
+                try:
+                    with session.begin_nested():
+                        session.add(write.instance)
+                        if write.delete:
+                            session.delete(write.instance)
+                    # Written, detach it so other writes of the same record can be added.
+                    session.expunge(write.instance)
+                except Exception as error:
+                    write.error = error
+                    if write.instance in session:
+                        session.expunge(write.instance)
+            try:
+                session.commit()
+            except Exception as error:
+                for write in writes:
+                    write.error = write.error or error
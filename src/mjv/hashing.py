@@ -0,0 +1,162 @@
+"""Password hashing offloaded to a bounded pool of worker threads.
+
+bcrypt is deliberately slow, running it on the request thread lets a burst of logins occupy every
+worker. Hashing runs on its own threads instead, bcrypt releases the GIL while hashing, with a
+bounded number of waiting jobs. When that queue is full :class:`HasherBusy` is raised right away.
+"""
+
+import asyncio
+import contextvars
+import os
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass, field
+from threading import BoundedSemaphore
+from typing import Any, Callable, Iterator, TypeVar
+
+from flask import Flask, current_app
+from flask_bcrypt import Bcrypt
+
+from .metrics import timed
+
+T = TypeVar("T")
+
+MIN_LOG_ROUNDS = 4
+MAX_LOG_ROUNDS = 31
+
+
+def log_rounds(pw_hash: str) -> int:
+    """Cost a bcrypt hash, formatted as ``$2b$<rounds>$<salt and digest>``, was made with."""
+    return int(pw_hash.split("$")[2])
+
+
+class HasherBusy(Exception):
+    """Raised when the password hashing queue is full."""
+
+    def __init__(self, retry_after: int) -> None:
+        """Busy error, telling clients to retry after ``retry_after`` seconds."""
+        super().__init__("Too many password hashing requests")
+        self.retry_after = retry_after
+
+
+@dataclass
+class _HasherState:
+    workers: int
+    queue_depth: int
+    retry_after: int
+    pid: int = field(default_factory=os.getpid)
+    executor: ThreadPoolExecutor = field(init=False)
+    slots: BoundedSemaphore = field(init=False)
+
+    def __post_init__(self) -> None:
+        self.executor = ThreadPoolExecutor(self.workers, thread_name_prefix="bcrypt")
+        self.slots = BoundedSemaphore(self.workers + self.queue_depth)
+
+
+def _timed_hash(function: Callable[..., T], *args: Any) -> T:
+    with timed("bcrypt"):
+        return function(*args)
+
+
+class PasswordHasher:
+    """Flask extension running the ``bcrypt`` extension on a bounded pool of worker threads.
+
+    Configuration:
+        BCRYPT_WORKERS: Number of hashing threads, defaults to the number of CPUs.
+        BCRYPT_QUEUE_DEPTH: Number of jobs allowed to wait for a thread, defaults to 4 per thread.
+        BCRYPT_RETRY_AFTER: Seconds clients are told to wait when the queue is full.
+        BCRYPT_LOG_ROUNDS: Cost of new hashes, defaults to 12.
+        BCRYPT_TARGET_MS: When set, calibrate ``BCRYPT_LOG_ROUNDS`` on startup to the highest cost
+            that hashes within this many milliseconds on this host.
+    """
+
+    def __init__(self, bcrypt: Bcrypt) -> None:
+        """Wrap the given ``bcrypt`` extension."""
+        self.bcrypt = bcrypt
+
+    def init_app(self, app: Flask) -> None:
+        """Initialize the hashing pool of ``app``."""
+        app.config.setdefault("BCRYPT_WORKERS", os.cpu_count() or 1)
+        app.config.setdefault("BCRYPT_QUEUE_DEPTH", 4 * app.config["BCRYPT_WORKERS"])
+        app.config.setdefault("BCRYPT_RETRY_AFTER", 1)
+        app.config.setdefault("BCRYPT_LOG_ROUNDS", 12)
+        if target_ms := app.config.get("BCRYPT_TARGET_MS"):
+            app.config["BCRYPT_LOG_ROUNDS"] = self.recommend_log_rounds(target_ms)
+        app.extensions["password_hasher"] = self._create_state(app)
+
+    @staticmethod
+    def _create_state(app: Flask) -> _HasherState:
+        return _HasherState(
+            app.config["BCRYPT_WORKERS"],
+            app.config["BCRYPT_QUEUE_DEPTH"],
+            app.config["BCRYPT_RETRY_AFTER"],
+        )
+
+    @property
+    def state(self) -> _HasherState:
+        """Hashing pool of the current app, recreated after a fork as threads do not survive it."""
+        state: _HasherState = current_app.extensions["password_hasher"]
+        if state.pid != os.getpid():
+            state = current_app.extensions["password_hasher"] = self._create_state(current_app)
+        return state
+
+    def _submit(self, function: Callable[..., T], *args: Any) -> "Future[T]":
+        state = self.state
+        if not state.slots.acquire(blocking=False):
+            raise HasherBusy(state.retry_after)
+        try:
+            # In a copy of the context of the caller, so the time is recorded for its request.
+            run = contextvars.copy_context().run
+            future = state.executor.submit(run, _timed_hash, function, *args)
+        except BaseException:
+            state.slots.release()
+            raise
+        future.add_done_callback(lambda _: state.slots.release())
+        return future
+
+    def generate_password_hash(self, password: str) -> str:
+        """Hash ``password`` on the hashing pool, with the configured cost."""
+        rounds = current_app.config["BCRYPT_LOG_ROUNDS"]
+        pw_hash: bytes = self._submit(self.bcrypt.generate_password_hash, password, rounds).result()
+        return pw_hash.decode("utf-8")
+
+    def check_password_hash(self, pw_hash: str, password: str) -> bool:
+        """Verify ``password`` against ``pw_hash`` on the hashing pool."""
+        matches: bool = self._submit(self.bcrypt.check_password_hash, pw_hash, password).result()
+        return matches
+
+    async def agenerate_password_hash(self, password: str) -> str:
+        """Hash ``password`` on the hashing pool, awaiting the result instead of blocking."""
+        rounds = current_app.config["BCRYPT_LOG_ROUNDS"]
+        future = self._submit(self.bcrypt.generate_password_hash, password, rounds)
+        pw_hash: bytes = await asyncio.wrap_future(future)
+        return pw_hash.decode("utf-8")
+
+    async def acheck_password_hash(self, pw_hash: str, password: str) -> bool:
+        """Verify ``password`` against ``pw_hash`` on the hashing pool, awaiting the result."""
+        future = self._submit(self.bcrypt.check_password_hash, pw_hash, password)
+        matches: bool = await asyncio.wrap_future(future)
+        return matches
+
+    def needs_rehash(self, pw_hash: str) -> bool:
+        """Whether ``pw_hash`` was made with another cost than the configured one."""
+        rounds: int = current_app.config["BCRYPT_LOG_ROUNDS"]
+        return log_rounds(pw_hash) != rounds
+
+    def calibrate(self, max_ms: float) -> Iterator[tuple[int, float]]:
+        """Measure how many milliseconds a hash takes on this host, for increasing costs.
+
+        Stops at the first cost that takes longer than ``max_ms``.
+        """
+        for rounds in range(MIN_LOG_ROUNDS, MAX_LOG_ROUNDS + 1):
+            start = time.perf_counter()
+            self.bcrypt.generate_password_hash("calibration", rounds)
+            elapsed = (time.perf_counter() - start) * 1000
+            yield rounds, elapsed
+            if elapsed > max_ms:
+                return
+
+    def recommend_log_rounds(self, target_ms: float) -> int:
+        """Highest cost that hashes within ``target_ms`` milliseconds on this host."""
+        fitting = [rounds for rounds, elapsed in self.calibrate(target_ms) if elapsed <= target_ms]
+        return max(fitting, default=MIN_LOG_ROUNDS)
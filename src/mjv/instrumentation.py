@@ -0,0 +1,340 @@
+"""Request metrics, exported in the Prometheus text format.
+
+Requests are measured by hooks of the app, per flask-restx resource and method, like
+``TodoList.get``. Every worker process keeps its own metrics. With ``METRICS_DIR`` set, each one
+also writes them to a file of the directory, named after its process id, at most every
+``METRICS_FLUSH_INTERVAL`` seconds, and a scrape adds up the files of every worker. The files of
+workers which exited are merged into a single one, without their gauges, so counters never go
+back when workers are replaced.
+"""
+
+import atexit
+import fcntl
+import os
+import tempfile
+import threading
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+from threading import Lock
+from typing import Any, Iterator, Literal
+
+from flask import Flask, Response, current_app, g, request
+
+from .metrics import (
+    DEFAULT_BUCKETS,
+    Family,
+    Histogram,
+    HistogramSnapshot,
+    dumps_families,
+    format_family,
+    loads_families,
+    merge_families,
+    start_tracking,
+    stop_tracking,
+)
+from .pool import PoolMetrics
+from .queries import current_stats
+
+PROMETHEUS_MIMETYPE = "text/plain; version=0.0.4; charset=utf-8"
+# Upper bounds, in bytes, fitting response sizes.
+SIZE_BUCKETS = (128, 512, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+# Upper bounds fitting the number of statements executed by a request.
+STATEMENT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+# Kinds of work timed within requests, see mjv.metrics.timed.
+TIMED_WORK = ("db", "bcrypt")
+
+
+_BUCKETS = {"response_size": SIZE_BUCKETS, "statements": STATEMENT_BUCKETS}
+# Statistics of the connection pools, with their type and description.
+_POOL_METRICS: tuple[tuple[str, Literal["counter", "gauge"], str], ...] = (
+    ("size", "gauge", "Connections kept by the pool."),
+    ("checked_out", "gauge", "Connections in use."),
+    ("overflow", "gauge", "Connections opened beyond the size of the pool."),
+    ("checkouts", "counter", "Connections taken from the pool."),
+    ("connects", "counter", "Connections opened."),
+    ("timeouts", "counter", "Timeouts waiting for a connection."),
+)
+# Name of the file merging the metrics of the workers which exited.
+EXITED_FILE = "exited.json"
+
+
+def _alive(path: Path) -> bool:
+    if not path.stem.isdigit():
+        return False
+    try:
+        os.kill(int(path.stem), 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def _write_file(path: Path, families: list[Family]) -> None:
+    # Written aside and renamed, so readers never see a partial file.
+    with tempfile.NamedTemporaryFile("w", dir=path.parent, suffix=".tmp", delete=False) as file:
+        file.write(dumps_families(families))
+    os.replace(file.name, path)
+
+
+def _read_directory(directory: Path) -> list[Family]:
+    """Add up the metrics of the workers writing to ``directory``."""
+    with (directory / ".lock").open("a") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        running, exited = [], []
+        for path in directory.glob("*.json"):
+            families = loads_families(path.read_text())
+            if _alive(path):
+                running.append(families)
+            else:
+                exited.append((path, [f for f in families if f.kind != "gauge"]))
+        if [path.name for path, _ in exited] != [EXITED_FILE]:
+            merged = merge_families(families for _, families in exited)
+            _write_file(directory / EXITED_FILE, merged)
+            for path, _ in exited:
+                if path.name != EXITED_FILE:
+                    path.unlink()
+            exited = [(directory / EXITED_FILE, merged)]
+    return merge_families([*running, *(families for _, families in exited)])
+
+
+@dataclass
+class _MetricsState:
+    in_flight: int = 0
+    requests: dict[tuple[str, str, int], int] = field(default_factory=dict)
+    histograms: dict[tuple[str, str, str], Histogram] = field(default_factory=dict)
+    resources: dict[str | None, str] = field(default_factory=dict)
+    lock: Lock = field(default_factory=Lock)
+    # Whether requests changed the metrics since they were last written.
+    changed: bool = False
+    # Process writing the metrics every METRICS_FLUSH_INTERVAL.
+    flusher: int | None = None
+
+    def write(self, directory: Path, families: list[Family]) -> None:
+        self.changed = False
+        _write_file(directory / f"{os.getpid()}.json", families)
+
+    def start_flusher(self, app: Flask, metrics: "RequestMetrics") -> None:
+        """Write the metrics of this process periodically, and when it exits.
+
+        Started by the first request of every worker process, after it forked.
+        """
+        with self.lock:
+            if self.flusher == (pid := os.getpid()):
+                return
+            self.flusher = pid
+        directory = Path(app.config["METRICS_DIR"])
+        interval = app.config["METRICS_FLUSH_INTERVAL"]
+
+        def flush() -> None:
+            if self.changed:
+                with app.app_context():
+                    self.write(directory, metrics.families())
+
+        def run() -> None:
+            while True:
+                time.sleep(interval)
+                flush()
+
+        threading.Thread(target=run, name="metrics-flush", daemon=True).start()
+        atexit.register(flush)
+
+    def histogram(self, name: str, resource: str, method: str) -> Histogram:
+        key = (name, resource, method)
+        if (histogram := self.histograms.get(key)) is None:
+            buckets = _BUCKETS.get(name, DEFAULT_BUCKETS)
+            with self.lock:
+                histogram = self.histograms.setdefault(key, Histogram(buckets))
+        return histogram
+
+
+class RequestMetrics:
+    """Flask extension measuring requests, and serving the metrics of the app.
+
+    Configuration:
+        METRICS_ENABLED: Measure requests and serve their metrics, disabled by default.
+        METRICS_PATH: Path of the metrics, defaults to ``/metrics``.
+        METRICS_DIR: Directory shared by the worker processes, to serve the metrics of all of
+            them, unset by default.
+        METRICS_FLUSH_INTERVAL: Seconds between writes of the metrics of a worker process to
+            ``METRICS_DIR``, 1 by default.
+    """
+
+    def init_app(self, app: Flask) -> None:
+        """Measure the requests of ``app``, when enabled."""
+        app.config.setdefault("METRICS_ENABLED", False)
+        app.config.setdefault("METRICS_PATH", "/metrics")
+        app.config.setdefault("METRICS_DIR", None)
+        app.config.setdefault("METRICS_FLUSH_INTERVAL", 1.0)
+        if not app.config["METRICS_ENABLED"]:
+            return
+        if directory := app.config["METRICS_DIR"]:
+            Path(directory).mkdir(parents=True, exist_ok=True)
+
+        app.extensions["request_metrics"] = _MetricsState()
+        app.before_request(self._before_request)
+        app.after_request(self._after_request)
+        app.teardown_request(self._teardown_request)
+        app.add_url_rule(app.config["METRICS_PATH"], "metrics", self.export)
+
+    @property
+    def state(self) -> _MetricsState:
+        """Metrics of the current app."""
+        return current_app.extensions["request_metrics"]  # type: ignore
+
+    def _resource(self, state: _MetricsState) -> str:
+        endpoint = request.url_rule.endpoint if request.url_rule else None
+        if (resource := state.resources.get(endpoint)) is None:
+            view = current_app.view_functions.get(endpoint) if endpoint else None
+            view_class = getattr(view, "view_class", None)
+            resource = view_class.__name__ if view_class else endpoint or "unmatched"
+            state.resources[endpoint] = resource
+        return resource
+
+    def _before_request(self) -> None:
+        state = self.state
+        with state.lock:
+            state.in_flight += 1
+        g.metrics_timings, g.metrics_token = start_tracking()
+        g.metrics_start = time.perf_counter()
+
+    def _after_request(self, response: Response) -> Response:
+        if "metrics_start" not in g:
+            return response
+        elapsed = time.perf_counter() - g.metrics_start
+        state = self.state
+        resource, method = self._resource(state), request.method.lower()
+        key = (resource, method, response.status_code)
+        with state.lock:
+            state.requests[key] = state.requests.get(key, 0) + 1
+        state.histogram("request_duration", resource, method).observe(elapsed)
+        # Streamed responses have no known size.
+        if not response.is_streamed and (size := response.calculate_content_length()) is not None:
+            state.histogram("response_size", resource, method).observe(size)
+        for kind in TIMED_WORK:
+            seconds = g.metrics_timings.get(kind, 0.0)
+            state.histogram(f"{kind}_duration", resource, method).observe(seconds)
+        if (stats := current_stats()) is not None:
+            state.histogram("statements", resource, method).observe(stats.count)
+        return response
+
+    def _teardown_request(self, error: BaseException | None) -> None:
+        if (token := g.pop("metrics_token", None)) is None:
+            return
+        stop_tracking(token)
+        state = self.state
+        with state.lock:
+            state.in_flight -= 1
+        if current_app.config["METRICS_DIR"]:
+            state.changed = True
+            state.start_flusher(current_app._get_current_object(), self)  # type: ignore
+
+    def families(self) -> list[Family]:
+        """Metrics of the current app, in the current process."""
+        state = self.state
+        with state.lock:
+            in_flight, requests = state.in_flight, dict(state.requests)
+            histograms = dict(state.histograms)
+
+        families = [
+            Family("mjv_requests_in_flight", "gauge", "Requests being handled.", [({}, in_flight)]),
+            Family(
+                "mjv_requests_total",
+                "counter",
+                "Requests handled.",
+                [
+                    ({"resource": resource, "method": method, "status": status}, count)
+                    for (resource, method, status), count in sorted(requests.items())
+                ],
+            ),
+        ]
+        for name, metric, help in (
+            ("request_duration", "mjv_request_duration_seconds", "Seconds spent on requests."),
+            ("response_size", "mjv_response_size_bytes", "Bytes of the response bodies."),
+            ("db_duration", "mjv_request_db_seconds", "Seconds spent on database queries."),
+            ("statements", "mjv_request_statements", "SQL statements executed."),
+            ("bcrypt_duration", "mjv_request_bcrypt_seconds", "Seconds spent hashing passwords."),
+        ):
+            samples: list[tuple[dict[str, Any], float | HistogramSnapshot]] = [
+                ({"resource": resource, "method": method}, histogram.snapshot())
+                for (kind, resource, method), histogram in sorted(histograms.items())
+                if kind == name
+            ]
+            families.append(Family(metric, "histogram", help, samples))
+
+        families.extend(self._pool_families())
+        families.extend(self._list_cache_families())
+        families.extend(self._group_commit_families())
+        return families
+
+    def samples(self) -> Iterator[str]:
+        """Lines of the metrics of the current app, in the Prometheus text format.
+
+        With ``METRICS_DIR`` set, the metrics of every worker process sharing the directory.
+        """
+        families = self.families()
+        if directory := current_app.config["METRICS_DIR"]:
+            self.state.write(Path(directory), families)
+            families = _read_directory(Path(directory))
+        for family in families:
+            yield from format_family(family)
+
+    @staticmethod
+    def _pool_families() -> Iterator[Family]:
+        if "pool_metrics" not in current_app.extensions:
+            return
+        pools = [
+            ({"engine": name}, stats.snapshot())
+            for name, stats in PoolMetrics.stats(current_app).items()
+        ]
+        for name, kind, help in _POOL_METRICS:
+            metric = f"mjv_db_pool_{name}" + ("_total" if kind == "counter" else "")
+            yield Family(
+                metric,
+                kind,
+                help,
+                [
+                    (labels, value)
+                    for labels, snapshot in pools
+                    if isinstance(value := snapshot[name], int)
+                ],
+            )
+        yield Family(
+            "mjv_db_pool_wait_seconds",
+            "histogram",
+            "Seconds spent waiting for a connection.",
+            [
+                (labels, wait)
+                for labels, snapshot in pools
+                if isinstance(wait := snapshot["wait"], HistogramSnapshot)
+            ],
+        )
+
+    @staticmethod
+    def _list_cache_families() -> Iterator[Family]:
+        if (state := current_app.extensions.get("list_cache")) is None:
+            return
+        for counter, help in (
+            ("hits", "Lists read from the cache."),
+            ("misses", "Lists read from the database."),
+            ("invalidations", "Invalidations of the lists of an owner."),
+        ):
+            metric = f"mjv_list_cache_{counter}_total"
+            yield Family(metric, "counter", help, [({}, getattr(state, counter))])
+
+    @staticmethod
+    def _group_commit_families() -> Iterator[Family]:
+        if (state := current_app.extensions.get("group_commit")) is None:
+            return
+        yield Family(
+            "mjv_group_commit_batch_size",
+            "histogram",
+            "Writes committed together.",
+            [({}, state.sizes.snapshot())],
+        )
+
+    def export(self) -> Response:
+        """Serve the metrics of the current app."""
+        body = "\n".join(self.samples()) + "\n"
+        return Response(body, mimetype=PROMETHEUS_MIMETYPE)
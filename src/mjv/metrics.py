@@ -0,0 +1,246 @@
+"""Metrics collected in-process, cheap enough to record on every request."""
+
+import bisect
+import json
+import math
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar, Token
+from dataclasses import dataclass, field
+from threading import Lock
+from typing import Any, Iterable, Iterator, Literal, Mapping, Sequence
+
+# Upper bounds, in seconds, fitting request latencies.
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+
+@dataclass(frozen=True)
+class HistogramSnapshot:
+    """Observations of a histogram at one point in time.
+
+    Args:
+        buckets: Upper bound of every bucket, the last one infinite, with the cumulative count
+            of observations up to that bound.
+        sum: Sum of every observation.
+        count: Number of observations.
+    """
+
+    buckets: tuple[tuple[float, int], ...]
+    sum: float
+    count: int
+
+
+class Histogram:
+    """Thread safe histogram, counting observations in buckets like Prometheus does.
+
+    Args:
+        buckets: Increasing upper bounds of the buckets, an infinite bucket is added.
+    """
+
+    def __init__(self, buckets: Sequence[float] = DEFAULT_BUCKETS) -> None:
+        """Create an empty histogram."""
+        self.bounds = (*sorted(buckets), math.inf)
+        self._counts = [0] * len(self.bounds)
+        self._sum = 0.0
+        self._lock = Lock()
+
+    def observe(self, value: float) -> None:
+        """Count an observation of ``value``."""
+        index = bisect.bisect_left(self.bounds, value)
+        with self._lock:
+            self._counts[index] += 1
+            self._sum += value
+
+    def snapshot(self) -> HistogramSnapshot:
+        """Current observations, with cumulative bucket counts."""
+        with self._lock:
+            counts, total = list(self._counts), self._sum
+        cumulative, buckets = 0, []
+        for bound, count in zip(self.bounds, counts, strict=True):
+            cumulative += count
+            buckets.append((bound, cumulative))
+        return HistogramSnapshot(tuple(buckets), total, cumulative)
+
+
+# Seconds spent per kind of work, like "db", by the request being handled.
+_timings: ContextVar[dict[str, float] | None] = ContextVar("timings", default=None)
+
+
+def start_tracking() -> tuple[dict[str, float], Token[dict[str, float] | None]]:
+    """Track the time spent per kind of work in the current context, until stopped.
+
+    Work done on other threads is tracked when they run in a copy of this context.
+
+    Returns:
+        The timings, in seconds by kind of work, and the token to stop tracking them.
+    """
+    timings: dict[str, float] = {}
+    return timings, _timings.set(timings)
+
+
+def stop_tracking(token: Token[dict[str, float] | None]) -> None:
+    """Stop tracking the timings started with ``token``."""
+    _timings.reset(token)
+
+
+@contextmanager
+def tracking() -> Iterator[dict[str, float]]:
+    """Track the time spent per kind of work within the block, in the returned dictionary."""
+    timings, token = start_tracking()
+    try:
+        yield timings
+    finally:
+        stop_tracking(token)
+
+
+def record(kind: str, seconds: float) -> None:
+    """Add ``seconds`` spent on ``kind`` of work to the timings being tracked, if any."""
+    if (timings := _timings.get()) is not None:
+        timings[kind] = timings.get(kind, 0.0) + seconds
+
+
+@contextmanager
+def timed(kind: str) -> Iterator[None]:
+    """Record the time spent within the block as ``kind`` of work."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record(kind, time.perf_counter() - start)
+
+
+def _format_value(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def _escape(value: Any) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(labels: Mapping[str, Any]) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in labels.items()) + "}"
+
+
+def format_sample(name: str, labels: Mapping[str, Any], value: float) -> str:
+    """Format a sample in the Prometheus text format."""
+    return f"{name}{_format_labels(labels)} {_format_value(value)}"
+
+
+def format_histogram(
+    name: str, labels: Mapping[str, Any], snapshot: HistogramSnapshot
+) -> Iterator[str]:
+    """Format the samples of a histogram in the Prometheus text format."""
+    for bound, count in snapshot.buckets:
+        yield format_sample(f"{name}_bucket", {**labels, "le": _format_value(bound)}, count)
+    yield format_sample(f"{name}_sum", labels, snapshot.sum)
+    yield format_sample(f"{name}_count", labels, snapshot.count)
+
+
+@dataclass
+class Family:
+    """Samples of a metric, with their labels.
+
+    Args:
+        name: Name of the metric, like ``mjv_requests_total``.
+        kind: Prometheus type of the metric.
+        help: Description of the metric.
+        samples: Labels and value of every sample, a snapshot for histograms.
+    """
+
+    name: str
+    kind: Literal["counter", "gauge", "histogram"]
+    help: str
+    samples: list[tuple[dict[str, Any], float | HistogramSnapshot]] = field(default_factory=list)
+
+
+def format_family(family: Family) -> Iterator[str]:
+    """Format the samples of a metric in the Prometheus text format."""
+    yield f"# HELP {family.name} {family.help}"
+    yield f"# TYPE {family.name} {family.kind}"
+    for labels, value in family.samples:
+        if isinstance(value, HistogramSnapshot):
+            yield from format_histogram(family.name, labels, value)
+        else:
+            yield format_sample(family.name, labels, value)
+
+
+def _add(
+    value: float | HistogramSnapshot, other: float | HistogramSnapshot
+) -> float | HistogramSnapshot:
+    if isinstance(value, HistogramSnapshot) and isinstance(other, HistogramSnapshot):
+        buckets = tuple(
+            (bound, count + other_count)
+            for (bound, count), (_, other_count) in zip(value.buckets, other.buckets, strict=True)
+        )
+        return HistogramSnapshot(buckets, value.sum + other.sum, value.count + other.count)
+    assert not isinstance(value, HistogramSnapshot) and not isinstance(other, HistogramSnapshot)
+    return value + other
+
+
+def merge_families(processes: Iterable[Iterable[Family]]) -> list[Family]:
+    """Add up the metrics of several processes, sample by sample.
+
+    Counters and histograms add up to the total of every process, and gauges, like the requests
+    in flight, to the sum of their current values.
+    """
+    merged: dict[str, Family] = {}
+    values: dict[str, dict[tuple[tuple[str, Any], ...], float | HistogramSnapshot]] = {}
+    for families in processes:
+        for family in families:
+            if family.name not in merged:
+                merged[family.name] = Family(family.name, family.kind, family.help)
+                values[family.name] = {}
+            samples = values[family.name]
+            for labels, value in family.samples:
+                key = tuple(labels.items())
+                samples[key] = _add(samples[key], value) if key in samples else value
+    for name, family in merged.items():
+        family.samples = [(dict(key), value) for key, value in sorted(values[name].items())]
+    return list(merged.values())
+
+
+def dumps_families(families: Iterable[Family]) -> str:
+    """Serialize metrics to JSON, read back by :func:`loads_families`."""
+    return json.dumps(
+        [
+            [
+                family.name,
+                family.kind,
+                family.help,
+                [
+                    [labels, vars(value) if isinstance(value, HistogramSnapshot) else value]
+                    for labels, value in family.samples
+                ],
+            ]
+            for family in families
+        ]
+    )
+
+
+def loads_families(data: str) -> list[Family]:
+    """Deserialize metrics serialized by :func:`dumps_families`."""
+    return [
+        Family(
+            name,
+            kind,
+            help,
+            [
+                (
+                    labels,
+                    HistogramSnapshot(
+                        tuple((bound, count) for bound, count in value["buckets"]),
+                        value["sum"],
+                        value["count"],
+                    )
+                    if isinstance(value, dict)
+                    else value,
+                )
+                for labels, value in samples
+            ],
+        )
+        for name, kind, help, samples in json.loads(data)
+    ]
@@ -0,0 +1,103 @@
+"""Keyset (cursor) pagination helpers."""
+
+import base64
+import binascii
+import json
+from datetime import datetime
+from typing import Any, Sequence
+from urllib.parse import urlencode
+
+import sqlalchemy
+from flask import request
+from sqlalchemy.orm import InstrumentedAttribute
+
+from .database import DataBasePrimitives
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+
+
+class InvalidCursor(ValueError):
+    """Raised when a pagination cursor can not be decoded."""
+
+
+def encode_cursor(values: Sequence[DataBasePrimitives | None]) -> str:
+    """Encode the sort key values of the last row into an opaque cursor, None as null."""
+    payload = json.dumps(list(values), separators=(",", ":"), default=datetime.isoformat)
+    return base64.urlsafe_b64encode(payload.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str, keys: Sequence[InstrumentedAttribute[Any]]) -> list[Any]:
+    """Decode an opaque cursor back into the values of the sort ``keys``."""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+        if not isinstance(values, list) or len(values) != len(keys):
+            raise InvalidCursor(cursor)
+        return [
+            datetime.fromisoformat(value) if isinstance(key.type, sqlalchemy.DateTime) else value
+            for key, value in zip(keys, values, strict=True)
+        ]
+    except (binascii.Error, UnicodeError, TypeError, ValueError) as error:
+        raise InvalidCursor(cursor) from error
+
+
+def keyset_query(
+    query: Any,
+    keys: Sequence[InstrumentedAttribute[Any]],
+    limit: int,
+    after: str | None = None,
+    descending: bool = False,
+) -> Any:
+    """Restrict ``query``, or a select statement, to the page after the ``after`` cursor.
+
+    The page is ordered by ``keys``, in ``descending`` order if set, and has ``limit + 1`` rows,
+    the extra row is used to tell if there is a next page, see :func:`keyset_result`.
+    """
+    if after is not None:
+        values = decode_cursor(after, keys)
+        bounds = sqlalchemy.tuple_(
+            *(sqlalchemy.literal(v, k.type) for k, v in zip(keys, values, strict=True))
+        )
+        row = sqlalchemy.tuple_(*keys)
+        query = query.filter(row < bounds if descending else row > bounds)
+    order = [key.desc() for key in keys] if descending else keys
+    return query.order_by(*order).limit(limit + 1)
+
+
+def keyset_result(
+    rows: Sequence[Any], keys: Sequence[InstrumentedAttribute[Any]], limit: int
+) -> tuple[list[Any], str | None]:
+    """Split the rows of a :func:`keyset_query` into the page and the cursor of the next page."""
+    if len(rows) <= limit:
+        return list(rows), None
+    rows = rows[:limit]
+    return list(rows), encode_cursor([getattr(rows[-1], key.key) for key in keys])
+
+
+def keyset_page(
+    query: Any,
+    keys: Sequence[InstrumentedAttribute[Any]],
+    limit: int,
+    after: str | None = None,
+    descending: bool = False,
+) -> tuple[list[Any], str | None]:
+    """Fetch one page of ``query`` ordered by ``keys``, starting after the ``after`` cursor.
+
+    Only ``limit + 1`` rows are loaded, the extra row is used to tell if there is a next page.
+
+    Returns:
+        The rows of the page and the cursor of the next page, if any.
+    """
+    rows = keyset_query(query, keys, limit, after, descending).all()
+    return keyset_result(rows, keys, limit)
+
+
+def next_link(cursor: str | None, **params: Any) -> dict[str, str]:
+    """Build a ``Link`` header pointing at the next page of the current request."""
+    if cursor is None:
+        return {}
+    args = request.args.to_dict()
+    args.update({key: value for key, value in params.items() if value is not None})
+    args["after"] = cursor
+    return {"Link": f'<{request.base_url}?{urlencode(args)}>; rel="next"'}
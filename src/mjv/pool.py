@@ -0,0 +1,211 @@
+"""Connection pool statistics, collected through SQLAlchemy pool events.
+
+When every pooled connection is checked out, requests wait for one, up to ``pool_timeout``
+seconds. Those waits look like random latency spikes, unless they are measured. They are, by
+creating the pool of every engine with a timed subclass of its pool class, see
+:class:`TimedPoolPlugin`.
+"""
+
+import logging
+import time
+from dataclasses import dataclass, field
+from threading import Lock
+from typing import Any
+
+from flask import Flask
+from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import URL, Engine, event, exc
+from sqlalchemy.dialects import plugins
+from sqlalchemy.engine import CreateEnginePlugin
+from sqlalchemy.engine.default import DefaultDialect
+from sqlalchemy.pool import Pool
+
+from .metrics import Histogram, HistogramSnapshot
+
+logger = logging.getLogger(__name__)
+
+# Upper bounds, in seconds, fitting the time it takes to get a connection from a pool.
+WAIT_BUCKETS = (0.0005, 0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+# Name of the engine plugin timing the pools, see :class:`TimedPoolPlugin`.
+TIMED_POOL_PLUGIN = "mjv_timed_pool"
+
+
+@dataclass
+class PoolStats:
+    """Live statistics of the pool of an engine.
+
+    Args:
+        engine: Engine whose pool is watched, its pool is replaced when it is disposed.
+        slow_wait: Seconds of waiting for a connection after which a warning is logged.
+    """
+
+    engine: Engine
+    slow_wait: float | None = None
+    checkouts: int = 0
+    checkins: int = 0
+    connects: int = 0
+    timeouts: int = 0
+    wait: Histogram = field(default_factory=lambda: Histogram(WAIT_BUCKETS))
+    _lock: Lock = field(default_factory=Lock, repr=False)
+
+    def count(self, counter: str) -> None:
+        """Increment ``counter`` by one."""
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+
+    def waited(self, seconds: float) -> None:
+        """Record that getting a connection took ``seconds``."""
+        self.wait.observe(seconds)
+        if self.slow_wait is not None and seconds >= self.slow_wait:
+            logger.warning(
+                "Waited %.3fs for a database connection, %s", seconds, self.engine.pool.status()
+            )
+
+    @property
+    def checked_out(self) -> int:
+        """Number of connections in use."""
+        return self.checkouts - self.checkins
+
+    @property
+    def size(self) -> int | None:
+        """Number of connections the pool keeps, None when it does not limit them."""
+        size = getattr(self.engine.pool, "size", None)
+        return size() if callable(size) else None
+
+    @property
+    def overflow(self) -> int | None:
+        """Number of connections opened beyond the size of the pool, None when not applicable."""
+        overflow = getattr(self.engine.pool, "overflow", None)
+        return overflow() if callable(overflow) else None
+
+    def snapshot(self) -> dict[str, int | None | HistogramSnapshot]:
+        """Current statistics."""
+        return {
+            "size": self.size,
+            "checked_out": self.checked_out,
+            "overflow": self.overflow,
+            "checkouts": self.checkouts,
+            "connects": self.connects,
+            "timeouts": self.timeouts,
+            "wait": self.wait.snapshot(),
+        }
+
+
+class _TimedPool(Pool):
+    """Mixin timing how long it takes to get a connection, once watched."""
+
+    _stats: PoolStats | None = None
+
+    def connect(self) -> Any:
+        if (stats := self._stats) is None:
+            return super().connect()
+        start = time.perf_counter()
+        try:
+            return super().connect()
+        except exc.TimeoutError:
+            stats.count("timeouts")
+            raise
+        finally:
+            stats.waited(time.perf_counter() - start)
+
+    def recreate(self) -> Pool:
+        pool = super().recreate()
+        if isinstance(pool, _TimedPool):
+            pool._stats = self._stats
+        return pool
+
+
+# Timed subclass of each pool class, created once.
+_timed_classes: dict[type[Pool], type[Pool]] = {}
+
+
+def _timed(pool_class: type[Pool]) -> type[Pool]:
+    if issubclass(pool_class, _TimedPool):
+        return pool_class
+    if (timed := _timed_classes.get(pool_class)) is None:
+        timed = type(f"Timed{pool_class.__name__}", (_TimedPool, pool_class), {})
+        timed = _timed_classes.setdefault(pool_class, timed)
+    return timed
+
+
+class TimedPoolPlugin(CreateEnginePlugin):
+    """Engine plugin creating the pool of the engine with a timed subclass of its pool class.
+
+    The pool class is the ``poolclass`` option, or the default one of the dialect. An engine
+    given a ``pool`` is left as is.
+    """
+
+    def __init__(self, url: URL, kwargs: dict[str, Any]) -> None:
+        """Time the pool of the engine created from ``url`` and ``kwargs``."""
+        super().__init__(url, kwargs)
+        if "pool" in kwargs:
+            return
+        pool_class: type[Pool] | None = kwargs.get("poolclass")
+        if pool_class is None:
+            dialect = url.get_dialect(kwargs.get("_is_async", False))
+            if not issubclass(dialect, DefaultDialect):
+                return
+            pool_class = dialect.get_pool_class(url)
+        kwargs["poolclass"] = _timed(pool_class)
+
+    def update_url(self, url: URL) -> URL:
+        """Keep ``url``, the plugin has no URL parameters."""
+        return url
+
+
+plugins.register(TIMED_POOL_PLUGIN, __name__, "TimedPoolPlugin")
+
+
+class PoolMetrics:
+    """Flask extension collecting the statistics of the connection pools of the app.
+
+    Configuration:
+        DB_POOL_SLOW_WAIT: Seconds of waiting for a connection after which a warning is logged,
+            defaults to 1.
+    """
+
+    def __init__(self, db: SQLAlchemy) -> None:
+        """Watch the engines of the ``db`` extension."""
+        self.db = db
+
+    def init_app(self, app: Flask) -> None:
+        """Time the pools of the engines of ``app``, before ``db`` is initialized.
+
+        The engines are created with :class:`TimedPoolPlugin`, added to
+        ``SQLALCHEMY_ENGINE_OPTIONS``. Their statistics are collected once watched, see
+        :meth:`watch_db` and :meth:`watch`.
+        """
+        app.config.setdefault("DB_POOL_SLOW_WAIT", 1.0)
+        options = app.config.setdefault("SQLALCHEMY_ENGINE_OPTIONS", {})
+        if TIMED_POOL_PLUGIN not in options.get("plugins", []):
+            app.config["SQLALCHEMY_ENGINE_OPTIONS"] = {
+                **options,
+                "plugins": [*options.get("plugins", []), TIMED_POOL_PLUGIN],
+            }
+        app.extensions["pool_metrics"] = {}
+
+    def watch_db(self, app: Flask) -> None:
+        """Watch the pools of the engines of ``db``, once initialized."""
+        with app.app_context():
+            for bind_key, engine in self.db.engines.items():
+                self.watch(app, bind_key or "default", engine)
+
+    @staticmethod
+    def watch(app: Flask, name: str, engine: Engine) -> PoolStats:
+        """Collect statistics of the pool of ``engine``, under ``name``."""
+        stats = PoolStats(engine, app.config.get("DB_POOL_SLOW_WAIT"))
+        app.extensions["pool_metrics"][name] = stats
+
+        event.listen(engine, "checkout", lambda *args: stats.count("checkouts"))
+        event.listen(engine, "checkin", lambda *args: stats.count("checkins"))
+        event.listen(engine, "connect", lambda *args: stats.count("connects"))
+        # Pools recreating this one, when the engine is disposed, keep its statistics.
+        if isinstance(engine.pool, _TimedPool):
+            engine.pool._stats = stats
+        return stats
+
+    @staticmethod
+    def stats(app: Flask) -> dict[str, PoolStats]:
+        """Statistics of the pools of ``app``, by engine name."""
+        return app.extensions["pool_metrics"]  # type: ignore
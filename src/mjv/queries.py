@@ -0,0 +1,205 @@
+"""Per-request SQL statement counting, slow statement log and query budgets.
+
+Statements are counted and timed by cursor events of the engines, and failing ones by their
+error event. Routes declare how many statements they are expected to issue with
+:func:`query_budget`, so a lazy load added to a hot path, or a loop issuing one query per row,
+is noticed before it reaches production.
+"""
+
+import functools
+import inspect
+import logging
+import time
+from contextvars import ContextVar
+from dataclasses import dataclass
+from typing import Any, Callable, TypeVar
+from weakref import WeakKeyDictionary
+
+from flask import Flask, Response, current_app, g
+from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import Engine, event
+from sqlalchemy.engine import ExceptionContext, ExecutionContext
+
+from .metrics import record
+
+F = TypeVar("F", bound=Callable[..., Any])
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class QueryStats:
+    """Statements executed within a request.
+
+    Args:
+        count: Number of statements.
+        seconds: Time spent executing them.
+    """
+
+    count: int = 0
+    seconds: float = 0.0
+
+
+_stats: ContextVar[QueryStats | None] = ContextVar("query_stats", default=None)
+
+
+def current_stats() -> QueryStats | None:
+    """Statements executed by the request being handled, None outside of requests."""
+    return _stats.get()
+
+
+class QueryBudgetExceeded(Exception):
+    """Raised when a route executes more statements than its budget, see :func:`query_budget`."""
+
+
+def parameters_shape(parameters: Any, executemany: bool = False) -> str:
+    """Describe ``parameters`` by their names and types, without their values.
+
+    Values may be passwords or personal data, and are irrelevant to why a statement is slow.
+    """
+    if executemany:
+        return f"{len(parameters)} x {parameters_shape(parameters[0])}" if parameters else "[]"
+    if isinstance(parameters, dict):
+        fields = (f"{key}: {type(value).__name__}" for key, value in parameters.items())
+        return "{" + ", ".join(fields) + "}"
+    if isinstance(parameters, (list, tuple)):
+        return "(" + ", ".join(type(value).__name__ for value in parameters) + ")"
+    return type(parameters).__name__
+
+
+def _over_budget(route: str, count: int, budget: int) -> None:
+    message = f"{route} executed {count} statements, its budget is {budget}"
+    if current_app.config["QUERY_BUDGET_RAISE"]:
+        raise QueryBudgetExceeded(message)
+    logger.warning(message)
+
+
+def query_budget(budget: int) -> Callable[[F], F]:
+    """Declare how many statements the decorated route may execute.
+
+    Put it above the marshalling decorators, so marshalling is accounted for too, and below
+    ``jwt_required``, whose user lookup is cached. Going over budget logs a warning, or raises
+    :class:`QueryBudgetExceeded` with ``QUERY_BUDGET_RAISE``. Async routes are decorated alike.
+    """
+
+    def decorator(route: F) -> F:
+        def checked(stats: QueryStats, start: int) -> None:
+            if (count := stats.count - start) > budget:
+                _over_budget(route.__qualname__, count, budget)
+
+        @functools.wraps(route)
+        def wrapper(*args: Any, **kwargs: Any) -> Any:
+            if (stats := _stats.get()) is None:
+                return route(*args, **kwargs)
+            start = stats.count
+            result = route(*args, **kwargs)
+            checked(stats, start)
+            return result
+
+        @functools.wraps(route)
+        async def async_wrapper(*args: Any, **kwargs: Any) -> Any:
+            if (stats := _stats.get()) is None:
+                return await route(*args, **kwargs)
+            start = stats.count
+            result = await route(*args, **kwargs)
+            checked(stats, start)
+            return result
+
+        decorated = async_wrapper if inspect.iscoroutinefunction(route) else wrapper
+        decorated.query_budget = budget  # type: ignore
+        return decorated  # type: ignore
+
+    return decorator
+
+
+class QueryMonitor:
+    """Flask extension counting the statements of every request, and logging slow ones.
+
+    Configuration:
+        QUERY_SLOW_THRESHOLD: Seconds after which a statement is logged with the shape of its
+            parameters, defaults to 0.5. None disables the log.
+        QUERY_BUDGET_RAISE: Raise when a route goes over its query budget instead of warning,
+            defaults to ``TESTING``.
+        SERVER_TIMING: Add a ``Server-Timing`` header with the database time of every response,
+            defaults to ``DEBUG``.
+    """
+
+    def __init__(self, db: SQLAlchemy) -> None:
+        """Watch the engines of the ``db`` extension."""
+        self.db = db
+
+    def init_app(self, app: Flask) -> None:
+        """Watch the engines of ``app``, after ``db`` is initialized, and count per request."""
+        app.config.setdefault("QUERY_SLOW_THRESHOLD", 0.5)
+        app.config.setdefault("QUERY_BUDGET_RAISE", app.testing)
+        app.config.setdefault("SERVER_TIMING", app.debug)
+        with app.app_context():
+            for engine in self.db.engines.values():
+                self.watch(app, engine)
+        app.before_request(self._before_request)
+        app.teardown_request(self._teardown_request)
+        if app.config["SERVER_TIMING"]:
+            app.after_request(self._server_timing)
+
+    @staticmethod
+    def watch(app: Flask, engine: Engine) -> None:
+        """Count and time the statements executed by ``engine``, failing ones included."""
+        threshold = app.config["QUERY_SLOW_THRESHOLD"]
+        # Start of the statement of each execution, forgotten along with the execution.
+        starts: WeakKeyDictionary[ExecutionContext, float] = WeakKeyDictionary()
+
+        def executed(
+            statement: str, parameters: Any, context: ExecutionContext | None, executemany: bool
+        ) -> None:
+            if context is None or (start := starts.pop(context, None)) is None:
+                return
+            elapsed = time.perf_counter() - start
+            record("db", elapsed)
+            if (stats := _stats.get()) is not None:
+                stats.count += 1
+                stats.seconds += elapsed
+            if threshold is not None and elapsed >= threshold:
+                shape = parameters_shape(parameters, executemany)
+                logger.warning(
+                    "Slow statement took %.3fs: %s, parameters %s", elapsed, statement, shape
+                )
+
+        @event.listens_for(engine, "before_cursor_execute")
+        def before(
+            conn: Any, cursor: Any, statement: str, parameters: Any, context: Any, *_: Any
+        ) -> None:
+            if context is not None:
+                starts[context] = time.perf_counter()
+
+        @event.listens_for(engine, "after_cursor_execute")
+        def after(
+            conn: Any, cursor: Any, statement: str, parameters: Any, context: Any, executemany: bool
+        ) -> None:
+            executed(statement, parameters, context, executemany)
+
+        @event.listens_for(engine, "handle_error")
+        def failed(error: ExceptionContext) -> None:
+            context = error.execution_context
+            executemany = context is not None and context.executemany
+            executed(error.statement or "", error.parameters, context, executemany)
+
+    @staticmethod
+    def _before_request() -> None:
+        g.query_stats_token = _stats.set(QueryStats())
+        g.query_stats_start = time.perf_counter()
+
+    @staticmethod
+    def _teardown_request(error: BaseException | None) -> None:
+        if (token := g.pop("query_stats_token", None)) is not None:
+            _stats.reset(token)
+
+    @staticmethod
+    def _server_timing(response: Response) -> Response:
+        if (stats := _stats.get()) is None:
+            return response
+        elapsed = time.perf_counter() - g.query_stats_start
+        response.headers.add(
+            "Server-Timing", f'db;dur={stats.seconds * 1000:.1f};desc="{stats.count} statements"'
+        )
+        response.headers.add("Server-Timing", f"app;dur={elapsed * 1000:.1f}")
+        return response
@@ -0,0 +1,263 @@
+"""Read replicas, serving the reads of safe requests while writes go to the primary database.
+
+Replicas lag behind the primary, so after a user writes, the requests of the user read from the
+primary for a few seconds, long enough to read their own writes. The users who wrote recently are
+known by the identity of their access token, and clients keeping cookies also carry the time of
+their last write in a signed cookie. Replicas failing a health check are skipped until they pass
+one again, reads fall back to the primary in the meantime.
+"""
+
+import logging
+import math
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from itertools import count
+from threading import Lock
+from typing import Any, Hashable, Iterator
+
+import sqlalchemy
+from flask import Flask, Response, current_app, g, request
+from flask_sqlalchemy.session import Session
+from itsdangerous import BadSignature, URLSafeTimedSerializer
+from sqlalchemy import Engine, event, exc
+from sqlalchemy.sql import CompoundSelect, Select
+from werkzeug.utils import import_string
+
+from .cache import CacheBackend, TTLCache
+from .sharding import bind_for
+from .tokens import request_identity
+
+logger = logging.getLogger(__name__)
+
+SAFE_METHODS = frozenset(("GET", "HEAD", "OPTIONS"))
+STICKY_COOKIE = "replica_sticky"
+
+# Replica engine reading for the request being handled, None to read from the primary.
+_replica: ContextVar[Engine | None] = ContextVar("replica", default=None)
+
+
+@contextmanager
+def on_primary() -> Iterator[None]:
+    """Read from the primary database within the block, even during a safe request."""
+    token = _replica.set(None)
+    try:
+        yield
+    finally:
+        _replica.reset(token)
+
+
+class RoutingSession(Session):
+    """Session reading from the replica chosen for the current request, if any.
+
+    Flushes, and statements other than SELECT, always go to the primary. Statements on sharded
+    tables go to the selected shard, see :mod:`mjv.sharding`.
+    """
+
+    def get_bind(
+        self,
+        mapper: Any | None = None,
+        clause: Any | None = None,
+        bind: Engine | sqlalchemy.Connection | None = None,
+        **kwargs: Any,
+    ) -> Engine | sqlalchemy.Connection:
+        """Select the shard, or the replica for reads of safe requests, or the model engine."""
+        if bind is None and (shard := bind_for(mapper, clause)) is not None:
+            return shard
+        if (
+            bind is None
+            and (replica := _replica.get()) is not None
+            and not self._flushing
+            and isinstance(clause, (Select, CompoundSelect))
+        ):
+            return replica
+        return super().get_bind(mapper, clause, bind, **kwargs)
+
+
+@dataclass
+class Replica:
+    """Replica database, and its health.
+
+    Args:
+        name: Name of the replica, like ``replica_0``.
+        engine: Engine of the replica.
+    """
+
+    name: str
+    engine: Engine
+    healthy: bool = True
+    checked_at: float = float("-inf")
+    _lock: Lock = field(default_factory=Lock, repr=False)
+
+    def check(self, interval: float) -> bool:
+        """Whether the replica is healthy, checked again once the last check is ``interval`` old.
+
+        Only one thread checks at a time, the others go by the outcome of the last check.
+        """
+        if time.monotonic() - self.checked_at < interval or not self._lock.acquire(False):
+            return self.healthy
+        try:
+            with self.engine.connect() as connection:
+                connection.exec_driver_sql("SELECT 1")
+        except exc.SQLAlchemyError as error:
+            self.failed(error)
+        else:
+            if not self.healthy:
+                logger.warning("Read replica %s is back, reading from it", self.name)
+            self.healthy, self.checked_at = True, time.monotonic()
+        finally:
+            self._lock.release()
+        return self.healthy
+
+    def failed(self, error: BaseException) -> None:
+        """Skip the replica until the next health check, after it failed with ``error``."""
+        if self.healthy:
+            logger.warning("Read replica %s failed, reading from the primary: %s", self.name, error)
+        self.healthy, self.checked_at = False, time.monotonic()
+
+
+@dataclass
+class _ReplicasState:
+    replicas: list[Replica]
+    health_interval: float
+    sticky_seconds: float
+    # Identities of the users who wrote within the last sticky seconds.
+    writers: CacheBackend[Hashable, bool]
+    # Signs the time of the last write of a client in its sticky cookie, None without cookie.
+    signer: URLSafeTimedSerializer | None
+    turns: "count[int]" = field(default_factory=count)
+
+    def choose(self) -> Replica | None:
+        """Next healthy replica, in turn, None when all of them are unhealthy."""
+        start = next(self.turns)
+        for offset in range(len(self.replicas)):
+            replica = self.replicas[(start + offset) % len(self.replicas)]
+            if replica.check(self.health_interval):
+                return replica
+        return None
+
+
+class ReplicaRouter:
+    """Flask extension routing the reads of safe requests to read replicas.
+
+    Configuration:
+        SQLALCHEMY_REPLICA_URIS: Database URIs of the replicas, none by default.
+        REPLICA_STICKY_SECONDS: Seconds after a write during which the requests of the user
+            read from the primary, defaults to 5.
+        REPLICA_STICKY_SIZE: Maximum number of users who wrote recently, remembered by each
+            process, defaults to 10000.
+        REPLICA_STICKY_BACKEND: Import path of a function creating the store of the users who
+            wrote recently from the app, for a store shared by every process. Defaults to a
+            :class:`TTLCache` per process.
+        REPLICA_STICKY_COOKIE: Whether clients are also told they wrote by a cookie signed with
+            ``SECRET_KEY``, which every process honors, defaults to True.
+        REPLICA_HEALTH_INTERVAL: Seconds between health checks of a replica, defaults to 10.
+    """
+
+    def init_app(self, app: Flask) -> None:
+        """Create the replica engines of ``app``, and route the reads of its safe requests."""
+        app.config.setdefault("SQLALCHEMY_REPLICA_URIS", [])
+        app.config.setdefault("REPLICA_STICKY_SECONDS", 5.0)
+        app.config.setdefault("REPLICA_STICKY_SIZE", 10000)
+        app.config.setdefault("REPLICA_STICKY_BACKEND", None)
+        app.config.setdefault("REPLICA_STICKY_COOKIE", True)
+        app.config.setdefault("REPLICA_HEALTH_INTERVAL", 10.0)
+        if not (uris := app.config["SQLALCHEMY_REPLICA_URIS"]):
+            return
+        signer = None
+        if app.config["REPLICA_STICKY_COOKIE"]:
+            if not app.secret_key:
+                raise RuntimeError("Read replicas need a SECRET_KEY to sign the sticky cookie")
+            signer = URLSafeTimedSerializer(app.secret_key, salt=STICKY_COOKIE)
+        if backend_factory := app.config["REPLICA_STICKY_BACKEND"]:
+            writers = import_string(backend_factory)(app)
+        else:
+            writers = TTLCache[Hashable, bool](
+                app.config["REPLICA_STICKY_SIZE"], app.config["REPLICA_STICKY_SECONDS"]
+            )
+
+        options = app.config.get("SQLALCHEMY_ENGINE_OPTIONS", {})
+        replicas = [
+            Replica(f"replica_{index}", sqlalchemy.create_engine(uri, **options))
+            for index, uri in enumerate(uris)
+        ]
+        for replica in replicas:
+            event.listen(replica.engine, "handle_error", self._handle_error(replica))
+        app.extensions["replicas"] = _ReplicasState(
+            replicas,
+            app.config["REPLICA_HEALTH_INTERVAL"],
+            app.config["REPLICA_STICKY_SECONDS"],
+            writers,
+            signer,
+        )
+        app.before_request(self._before_request)
+        app.after_request(self._after_request)
+        app.teardown_request(self._teardown_request)
+
+    @staticmethod
+    def engines(app: Flask) -> dict[str, Engine]:
+        """Engines of the replicas of ``app``, by name."""
+        if (state := app.extensions.get("replicas")) is None:
+            return {}
+        return {replica.name: replica.engine for replica in state.replicas}
+
+    @staticmethod
+    def replicas(app: Flask) -> list[Replica]:
+        """Replicas of ``app``."""
+        state: _ReplicasState | None = app.extensions.get("replicas")
+        return state.replicas if state is not None else []
+
+    @staticmethod
+    def _handle_error(replica: Replica) -> Any:
+        def handle_error(context: sqlalchemy.ExceptionContext) -> None:
+            if context.is_disconnect or isinstance(
+                context.sqlalchemy_exception, exc.OperationalError
+            ):
+                replica.failed(context.original_exception)
+
+        return handle_error
+
+    @staticmethod
+    def _before_request() -> None:
+        if request.method not in SAFE_METHODS:
+            return
+        state: _ReplicasState = current_app.extensions["replicas"]
+        # Users who wrote recently read their writes from the primary.
+        if (identity := request_identity()) is not None and state.writers.get(identity):
+            return
+        if state.signer is not None and (cookie := request.cookies.get(STICKY_COOKIE)):
+            try:
+                # Whole seconds, the resolution of the signed timestamps.
+                state.signer.loads(cookie, max_age=math.ceil(state.sticky_seconds))
+            except BadSignature:
+                pass
+            else:
+                return
+        if (replica := state.choose()) is not None:
+            g.replica_token = _replica.set(replica.engine)
+
+    @staticmethod
+    def _after_request(response: Response) -> Response:
+        if request.method in SAFE_METHODS or response.status_code >= 400:
+            return response
+        state: _ReplicasState = current_app.extensions["replicas"]
+        if state.sticky_seconds <= 0:
+            return response
+        if (identity := request_identity()) is not None:
+            state.writers.set(identity, True, state.sticky_seconds)
+        if state.signer is not None:
+            response.set_cookie(
+                STICKY_COOKIE,
+                state.signer.dumps(True),
+                max_age=math.ceil(state.sticky_seconds),
+                secure=request.is_secure,
+                httponly=True,
+                samesite="Lax",
+            )
+        return response
+
+    @staticmethod
+    def _teardown_request(error: BaseException | None) -> None:
+        if (token := g.pop("replica_token", None)) is not None:
+            _replica.reset(token)
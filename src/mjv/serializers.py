@@ -0,0 +1,143 @@
+"""Precompiled serialization of marshalled models.
+
+``marshal_with`` looks up, formats and masks every field of every row through generic
+flask-restx code. For the plain field types our models use that work is known up front, so it is
+compiled once into a function building the very same dict.
+
+Opt-in with the ``FAST_SERIALIZER`` setting, the responses stay byte for byte the same.
+The ``FAST_JSON`` setting additionally encodes every response with orjson, when it is installed.
+Its output is compact and not ASCII escaped, so it does change the bytes of the responses.
+"""
+
+from datetime import datetime
+from functools import wraps
+from http import HTTPStatus
+from typing import Any, Callable, Mapping
+
+from flask import current_app, request
+from flask_restx import Namespace, fields, inputs, marshal
+from flask_restx.marshalling import make
+from flask_restx.representations import output_json as restx_output_json
+from flask_restx.utils import unpack
+
+from .extensions import api
+
+try:
+    import orjson
+
+    _HAS_ORJSON = True
+except ImportError:  # pragma: no cover
+    _HAS_ORJSON = False
+
+Serializer = Callable[[Any], dict[str, Any]]
+
+
+def _iso8601(field: fields.DateTime) -> Callable[[Any], str]:
+    def iso8601(value: Any) -> str:
+        return value.isoformat() if isinstance(value, datetime) else field.format(value)
+
+    return iso8601
+
+
+def _formatter(field: fields.Raw) -> Callable[[Any], Any] | None:
+    """Specialised ``field.format``, or None when the field needs the generic ``output``."""
+    if field.attribute is not None or field.default is not None or field.mask:
+        return None
+    match field:
+        case fields.String():
+            return str
+        case fields.Integer():
+            return int
+        case fields.Boolean():
+            return inputs.boolean  # type: ignore
+        case fields.DateTime(dt_format="iso8601"):
+            return _iso8601(field)
+    return None
+
+
+def compile_serializer(model: Mapping[str, Any]) -> Serializer:
+    """Compile the fields of ``model`` into a function serializing one row like ``marshal``."""
+    model = getattr(model, "resolved", model)
+    scope: dict[str, Any] = {"_marshal": marshal, "_model": model, "Mapping": Mapping}
+    items = []
+    for index, (key, field) in enumerate(model.items()):
+        if isinstance(field, dict):
+            scope[f"_field{index}"] = field
+            items.append(f"{key!r}: _marshal(row, _field{index})")
+            continue
+        scope[f"_field{index}"] = field = make(field)
+        if (formatter := _formatter(field)) is None or not key.isidentifier():
+            items.append(f"{key!r}: _field{index}.output({key!r}, row)")
+        else:
+            scope[f"_format{index}"] = formatter
+            items.append(
+                f"{key!r}: None if (value := getattr(row, {key!r}, None)) is None"
+                f" else _format{index}(value)"
+            )
+    source = "\n".join(
+        (
+            "def serialize(row):",
+            "    if isinstance(row, Mapping):",
+            "        return _marshal(row, _model)",
+            f"    return {{{', '.join(items)}}}",
+        )
+    )
+    exec(compile(source, f"<serializer {getattr(model, 'name', 'model')}>", "exec"), scope)
+    return scope["serialize"]  # type: ignore
+
+
+def marshal_with(
+    ns: Namespace,
+    model: Mapping[str, Any],
+    as_list: bool = False,
+    code: HTTPStatus = HTTPStatus.OK,
+    description: str | None = None,
+) -> Callable[[Callable[..., Any]], Callable[..., Any]]:
+    """Drop-in for ``ns.marshal_with``, precompiling the serializer when ``FAST_SERIALIZER`` is on.
+
+    The model is documented exactly like ``ns.marshal_with`` does, and requests with a field mask
+    header still go through ``ns.marshal_with``.
+    """
+
+    def decorator(func: Callable[..., Any]) -> Callable[..., Any]:
+        marshalled = ns.marshal_with(model, as_list, code, description)(func)
+        serialize = compile_serializer(model)
+
+        @wraps(func)
+        def wrapper(*args: Any, **kwargs: Any) -> Any:
+            config = current_app.config
+            if not config.get("FAST_SERIALIZER") or config["RESTX_MASK_HEADER"] in request.headers:
+                return marshalled(*args, **kwargs)
+            data, status, headers = unpack(func(*args, **kwargs))
+            if isinstance(data, (list, tuple)):
+                return [serialize(row) for row in data], status, headers
+            return serialize(data), status, headers
+
+        return wrapper
+
+    return decorator
+
+
+def marshal_list_with(ns: Namespace, model: Mapping[str, Any], **kwargs: Any) -> Any:
+    """Drop-in for ``ns.marshal_list_with``, see :func:`marshal_with`."""
+    return marshal_with(ns, model, True, **kwargs)
+
+
+@api.representation("application/json")
+def output_json(data: Any, code: int, headers: Mapping[str, str] | None = None) -> Any:
+    """Encode responses with orjson, when ``FAST_JSON`` is on and orjson is installed.
+
+    Falls back to the flask-restx encoder in debug mode or when ``RESTX_JSON`` is configured.
+    """
+    config = current_app.config
+    if (
+        not (_HAS_ORJSON and config.get("FAST_JSON"))
+        or current_app.debug
+        or config.get("RESTX_JSON")
+    ):
+        return restx_output_json(data, code, headers)
+    response = current_app.response_class(
+        orjson.dumps(data, option=orjson.OPT_APPEND_NEWLINE), code, mimetype="application/json"
+    )
+    response.headers.extend(headers or {})
+    return response
@@ -0,0 +1,110 @@
+"""Production server, the app served by the prefork workers of gunicorn.
+
+Needs the ``server`` extra. The arbiter process loads the app once and forks the workers, which
+share the preloaded app copy-on-write. Each worker serves connections on a pool of threads. An
+idle keep-alive connection is closed after ``keep_alive`` seconds, while a request may take as
+long as its client needs to send it or receive its response. The arbiter replaces workers that
+exit and reacts to signals:
+
+* ``SIGTERM`` stops gracefully, workers finish the requests they are serving.
+* ``SIGINT`` and ``SIGQUIT`` stop immediately.
+* ``SIGHUP`` reloads gracefully, the app is loaded again and new workers replace the current
+  ones. Changes to the configuration apply, changes to the code need a restart.
+
+Workers fork, which only POSIX systems do.
+"""
+
+from dataclasses import dataclass
+from typing import Any, Callable
+
+from flask import Flask
+from gunicorn.app.base import BaseApplication
+
+from .extensions import db, replicas, shards
+
+
+@dataclass
+class ServerConfig:
+    """Settings of the prefork server.
+
+    Args:
+        host: Hostname to listen on.
+        port: Port to listen on, 0 picks a free one.
+        workers: Number of worker processes.
+        threads: Number of threads serving connections in each worker.
+        backlog: Maximum number of connections waiting to be accepted.
+        keep_alive: Seconds an idle connection is held open, waiting for its next request.
+        max_requests: Requests a worker serves before it is replaced, 0 never replaces it.
+        max_requests_jitter: Random extra requests per worker, so workers are not all replaced
+            at once.
+        graceful_timeout: Seconds a stopping worker has to finish its requests before it is killed.
+    """
+
+    host: str = "127.0.0.1"
+    port: int = 5000
+    workers: int = 2
+    threads: int = 4
+    backlog: int = 2048
+    keep_alive: int = 2
+    max_requests: int = 0
+    max_requests_jitter: int = 0
+    graceful_timeout: int = 30
+
+
+def post_fork(arbiter: Any, worker: Any) -> None:
+    """Dispose of the database connections a new worker inherited from the arbiter.
+
+    Connections opened before the fork are shared with the arbiter, never reuse them.
+    """
+    app = arbiter.app.wsgi()
+    with app.app_context():
+        engines = (
+            *db.engines.values(),
+            *replicas.engines(app).values(),
+            *shards.engines(app).values(),
+        )
+        for engine in engines:
+            engine.dispose(close=False)
+
+
+class Server(BaseApplication):
+    """Gunicorn application serving the app on a pool of prefork workers.
+
+    Args:
+        load_app: Factory of the app, called once on start and again on every reload.
+        config: Settings of the server.
+    """
+
+    def __init__(self, load_app: Callable[[], Flask], config: ServerConfig) -> None:
+        """Configure the server, the app is only loaded by :meth:`run`."""
+        self.load_app = load_app
+        self.config = config
+        super().__init__()
+
+    def load_config(self) -> None:
+        """Set the gunicorn settings from :attr:`config`."""
+        host = f"[{self.config.host}]" if ":" in self.config.host else self.config.host
+        settings = {
+            "bind": f"{host}:{self.config.port}",
+            "workers": self.config.workers,
+            "worker_class": "gthread",
+            "threads": self.config.threads,
+            "backlog": self.config.backlog,
+            "keepalive": self.config.keep_alive,
+            "max_requests": self.config.max_requests,
+            "max_requests_jitter": self.config.max_requests_jitter,
+            "graceful_timeout": self.config.graceful_timeout,
+            "preload_app": True,
+            "post_fork": post_fork,
+        }
+        for name, value in settings.items():
+            self.cfg.set(name, value)
+
+    def load(self) -> Flask:
+        """Load the app, in the arbiter before the workers fork."""
+        return self.load_app()
+
+    def reload(self) -> None:
+        """Reload the settings, and load the app again for the new workers."""
+        super().reload()
+        self.callable = None
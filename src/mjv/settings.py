@@ -6,6 +6,8 @@ For local development, use a .env file to set
 environment variables.
 """
 
+import os
+
 from environs import Env
 
 env = Env()
@@ -14,6 +16,58 @@ env.read_env()
 ENV = env.str("FLASK_ENV", default="production")
 DEBUG = ENV == "development"
 SQLALCHEMY_DATABASE_URI = env.str("DATABASE_URL")
+SQLALCHEMY_ASYNC_DATABASE_URI = env.str("ASYNC_DATABASE_URL", default=None)
+SQLALCHEMY_REPLICA_URIS = env.list("DATABASE_REPLICA_URLS", default=[])
+REPLICA_STICKY_SECONDS = env.float("REPLICA_STICKY_SECONDS", default=5)
+REPLICA_STICKY_SIZE = env.int("REPLICA_STICKY_SIZE", default=10000)
+REPLICA_STICKY_BACKEND = env.str("REPLICA_STICKY_BACKEND", default=None)
+REPLICA_STICKY_COOKIE = env.bool("REPLICA_STICKY_COOKIE", default=True)
+REPLICA_HEALTH_INTERVAL = env.float("REPLICA_HEALTH_INTERVAL", default=10)
+SQLALCHEMY_SHARD_URIS = env.list("DATABASE_SHARD_URLS", default=[])
+SHARD_PIN_REFRESH = env.float("SHARD_PIN_REFRESH", default=30)
+SHARD_ID_BLOCK = env.int("SHARD_ID_BLOCK", default=100)
+SQLALCHEMY_ENGINE_OPTIONS = {
+    option: value
+    for option, value in (
+        ("pool_size", env.int("DB_POOL_SIZE", default=None)),
+        ("max_overflow", env.int("DB_MAX_OVERFLOW", default=None)),
+        ("pool_timeout", env.float("DB_POOL_TIMEOUT", default=None)),
+        ("pool_recycle", env.int("DB_POOL_RECYCLE", default=None)),
+        ("pool_pre_ping", env.bool("DB_POOL_PRE_PING", default=None)),
+    )
+    # Unset options keep the defaults of the engine, which depend on the database.
+    if value is not None
+}
+SQLITE_PROFILE = env.str("SQLITE_PROFILE", default=None)
+SQLITE_PRAGMAS = env.dict("SQLITE_PRAGMAS", default={})
+DB_POOL_SLOW_WAIT = env.float("DB_POOL_SLOW_WAIT", default=1.0)
+QUERY_SLOW_THRESHOLD = env.float("QUERY_SLOW_THRESHOLD", default=0.5)
+SERVER_TIMING = env.bool("SERVER_TIMING", default=DEBUG)
 SECRET_KEY = env.str("SECRET_KEY")
 JWT_SECRET_KEY = env.str("JWT_SECRET_KEY")
 JWT_ACCESS_TOKEN_EXPIRES = 3600  # 1 hour
+TODO_PAGE_SIZE = env.int("TODO_PAGE_SIZE", default=50)
+TODO_BATCH_SIZE = env.int("TODO_BATCH_SIZE", default=500)
+TODO_EXPORT_YIELD_PER = env.int("TODO_EXPORT_YIELD_PER", default=1000)
+TODO_IMPORT_BATCH_SIZE = env.int("TODO_IMPORT_BATCH_SIZE", default=1000)
+TODO_IMPORT_MAX_ERRORS = env.int("TODO_IMPORT_MAX_ERRORS", default=100)
+LIST_CACHE_ENABLED = env.bool("LIST_CACHE_ENABLED", default=False)
+LIST_CACHE_SIZE = env.int("LIST_CACHE_SIZE", default=1024)
+LIST_CACHE_TTL = env.float("LIST_CACHE_TTL", default=30)
+LIST_CACHE_MAX_BYTES = env.int("LIST_CACHE_MAX_BYTES", default=64 * 1024 * 1024)
+LIST_CACHE_BACKEND = env.str("LIST_CACHE_BACKEND", default=None)
+GROUP_COMMIT_ENABLED = env.bool("GROUP_COMMIT_ENABLED", default=False)
+GROUP_COMMIT_WINDOW = env.float("GROUP_COMMIT_WINDOW", default=0.002)
+GROUP_COMMIT_MAX_BATCH = env.int("GROUP_COMMIT_MAX_BATCH", default=64)
+TOMBSTONE_RETENTION_DAYS = env.int("TOMBSTONE_RETENTION_DAYS", default=30)
+EXPORT_GZIP_LEVEL = env.int("EXPORT_GZIP_LEVEL", default=6)
+BCRYPT_WORKERS = env.int("BCRYPT_WORKERS", default=os.cpu_count() or 1)
+BCRYPT_QUEUE_DEPTH = env.int("BCRYPT_QUEUE_DEPTH", default=4 * BCRYPT_WORKERS)
+BCRYPT_RETRY_AFTER = env.int("BCRYPT_RETRY_AFTER", default=1)
+BCRYPT_LOG_ROUNDS = env.int("BCRYPT_LOG_ROUNDS", default=12)
+BCRYPT_TARGET_MS = env.float("BCRYPT_TARGET_MS", default=None)
+FAST_SERIALIZER = env.bool("FAST_SERIALIZER", default=False)
+FAST_JSON = env.bool("FAST_JSON", default=False)
+METRICS_ENABLED = env.bool("METRICS_ENABLED", default=False)
+METRICS_DIR = env.str("METRICS_DIR", default=None)
+METRICS_FLUSH_INTERVAL = env.float("METRICS_FLUSH_INTERVAL", default=1.0)
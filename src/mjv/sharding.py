@@ -0,0 +1,395 @@
+"""Horizontal sharding, spreading the records of watched models over several databases.
+
+Records are placed by a key, like the user owning them, on the shard picked by a stable hash of
+the key, unless the key is pinned to another shard after being moved. Every request routes the
+statements on sharded tables to the shard of the user of its access token, elsewhere select the
+shard with :meth:`ShardRouter.using`.
+
+Sharded records take their identifiers from blocks reserved in the primary database, unique
+across the shards, so they keep them when moved to another shard.
+"""
+
+import contextvars
+import hashlib
+import logging
+import os
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from threading import Lock
+from typing import Any, Collection, Iterator, Mapping, MutableMapping
+
+import sqlalchemy
+from flask import Flask, current_app, g, has_app_context
+from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import Engine, event, exc
+from sqlalchemy.orm import Mapper, ORMExecuteState, Session
+from sqlalchemy.schema import CreateTable
+from sqlalchemy.sql.util import find_tables
+
+from .tokens import request_identity
+
+logger = logging.getLogger(__name__)
+
+# Index of the shard of the current request or block, None when not selected.
+_shard: ContextVar[int | None] = ContextVar("shard", default=None)
+
+
+class ShardNotSelected(RuntimeError):
+    """Raised when a sharded table is queried without selecting a shard first."""
+
+
+def shard_of(key: Any, count: int) -> int:
+    """Index of the shard of ``key`` among ``count`` shards, the same in every process."""
+    digest = hashlib.blake2b(str(key).encode("utf-8"), digest_size=8).digest()
+    return int.from_bytes(digest, "big") % count
+
+
+def current_shard() -> int | None:
+    """Index of the shard selected for the current request or block, if any."""
+    return _shard.get()
+
+
+@contextmanager
+def on_shard(index: int | None) -> Iterator[None]:
+    """Route the statements on sharded tables within the block to the shard at ``index``."""
+    token = _shard.set(index)
+    try:
+        yield
+    finally:
+        _shard.reset(token)
+
+
+@dataclass
+class _Copy:
+    """Records of a key copied from a shard to another, by table."""
+
+    # Identifiers of the records on the shard copied from, and of those inserted on the other.
+    copied: dict[sqlalchemy.Table, list[Any]] = field(default_factory=dict)
+    inserted: dict[sqlalchemy.Table, list[Any]] = field(default_factory=dict)
+    count: int = 0
+
+
+@dataclass
+class _ShardsState:
+    engines: list[Engine]
+    primary: Engine
+    tables: Collection[sqlalchemy.Table]
+    pin_refresh: float
+    id_block: int
+    pins: dict[str, int] = field(default_factory=dict)
+    loaded_at: float = float("-inf")
+    lock: Lock = field(default_factory=Lock)
+    ids: Iterator[int] = iter(())
+    ids_pid: int = 0
+    ids_lock: Lock = field(default_factory=Lock)
+
+
+def bind_for(mapper: Any | None, clause: Any | None) -> Engine | None:
+    """Engine of the selected shard when the statement is on a sharded table, otherwise None.
+
+    Raises:
+        ShardNotSelected: When the statement is on a sharded table and no shard is selected.
+    """
+    if not has_app_context() or (state := current_app.extensions.get("shards")) is None:
+        return None
+    if mapper is not None:
+        sharded = sqlalchemy.inspect(mapper).local_table in state.tables
+    else:
+        tables = find_tables(clause, include_crud=True) if clause is not None else ()
+        sharded = any(table in state.tables for table in tables)
+    if not sharded:
+        return None
+    if (index := _shard.get()) is None:
+        raise ShardNotSelected("Select the shard with ShardRouter.using before querying")
+    return state.engines[index]  # type: ignore
+
+
+class ShardRouter:
+    """Flask extension routing the records of watched models to their shard.
+
+    Keys moved off the shard of their hash are pinned in the ``shard_pin`` table of the
+    primary database. The blocks of identifiers of the sharded records are reserved in its
+    ``shard_id_block`` table.
+
+    Configuration:
+        SQLALCHEMY_SHARD_URIS: Database URIs of the shards, none by default to keep every record
+            in the primary database. Their order matters, a shard is known by its index.
+        SHARD_PIN_REFRESH: Seconds after which the pins are read again, defaults to 30.
+        SHARD_ID_BLOCK: Number of identifiers reserved at once by each process, defaults to 100.
+            Records created by different processes are not numbered in the order of creation.
+    """
+
+    def __init__(self, db: SQLAlchemy) -> None:
+        """Keep the pins in the primary database of the ``db`` extension."""
+        self.db = db
+        self.keys: dict[sqlalchemy.Table, str | None] = {}
+        self.pins = sqlalchemy.Table(
+            "shard_pin",
+            db.metadata,
+            sqlalchemy.Column("key", sqlalchemy.String(64), primary_key=True),
+            sqlalchemy.Column("shard", sqlalchemy.Integer, nullable=False),
+        )
+        self.id_blocks = sqlalchemy.Table(
+            "shard_id_block",
+            db.metadata,
+            sqlalchemy.Column("id", sqlalchemy.Integer, primary_key=True),
+            sqlite_autoincrement=True,
+        )
+        # Tables of the models whose records keep their identifier when moved.
+        self.identified: set[sqlalchemy.Table] = set()
+        event.listen(db.metadata, "after_create", self._create_shard_tables)
+        event.listen(Session, "do_orm_execute", self._identify_bulk_insert)
+
+    def watch(self, model: type[Any] | sqlalchemy.Table, key: str | None = "user_id") -> None:
+        """Shard the records of ``model``, or table, by the value of their ``key`` attribute.
+
+        Without a key, every shard has its own copy of the table, whose records are not moved.
+        Records of models keep their identifier when moved, unless it is local to the shard.
+        """
+        table = model if isinstance(model, sqlalchemy.Table) else model.__table__
+        self.keys[table] = key
+        if key is None or isinstance(model, sqlalchemy.Table):
+            return
+        (primary_key,) = table.primary_key.columns
+        if not primary_key.info.get("shard_local"):
+            self.identified.add(table)
+            event.listen(model, "before_insert", self._identify)
+
+    def init_app(self, app: Flask) -> None:
+        """Create the shard engines of ``app``, and route each request to a shard."""
+        app.config.setdefault("SQLALCHEMY_SHARD_URIS", [])
+        app.config.setdefault("SHARD_PIN_REFRESH", 30.0)
+        app.config.setdefault("SHARD_ID_BLOCK", 100)
+        if not (uris := app.config["SQLALCHEMY_SHARD_URIS"]):
+            return
+
+        options = app.config.get("SQLALCHEMY_ENGINE_OPTIONS", {})
+        with app.app_context():
+            primary = self.db.engine
+        app.extensions["shards"] = _ShardsState(
+            [sqlalchemy.create_engine(uri, **options) for uri in uris],
+            primary,
+            self.keys.keys(),
+            app.config["SHARD_PIN_REFRESH"],
+            app.config["SHARD_ID_BLOCK"],
+        )
+        app.before_request(self._before_request)
+        app.teardown_request(self._teardown_request)
+
+    @staticmethod
+    def engines(app: Flask) -> dict[str, Engine]:
+        """Engines of the shards of ``app``, by name."""
+        if (state := app.extensions.get("shards")) is None:
+            return {}
+        return {f"shard_{index}": engine for index, engine in enumerate(state.engines)}
+
+    @property
+    def state(self) -> _ShardsState | None:
+        """Shards of the current app, None when not sharded."""
+        return current_app.extensions.get("shards")
+
+    def _pinned(self, state: _ShardsState) -> dict[str, int]:
+        if time.monotonic() - state.loaded_at >= state.pin_refresh and state.lock.acquire(False):
+            # Outside of the context of the request, whose query budget covers its own work.
+            try:
+                contextvars.Context().run(self._load_pins, state)
+            finally:
+                state.lock.release()
+        return state.pins
+
+    def _load_pins(self, state: _ShardsState) -> None:
+        try:
+            with state.primary.connect() as connection:
+                rows = connection.execute(sqlalchemy.select(self.pins.c.key, self.pins.c.shard))
+                state.pins = dict(rows.tuples().all())
+        except exc.DBAPIError:
+            logger.exception("Could not read the shard pins, keeping the previous ones")
+        state.loaded_at = time.monotonic()
+
+    def _next_id(self, state: _ShardsState) -> int:
+        with state.ids_lock:
+            # Processes forked after reserving a block each reserve their own.
+            if state.ids_pid != os.getpid() or (id := next(state.ids, None)) is None:
+                # Outside of the context of the request, like the pins.
+                block = contextvars.Context().run(self._reserve_block, state)
+                state.ids_pid = os.getpid()
+                state.ids = iter(
+                    range((block - 1) * state.id_block + 1, block * state.id_block + 1)
+                )
+                id = next(state.ids)
+        return id
+
+    def _reserve_block(self, state: _ShardsState) -> int:
+        with state.primary.begin() as primary:
+            (block,) = primary.execute(sqlalchemy.insert(self.id_blocks)).inserted_primary_key
+        return int(block)
+
+    def _identify(
+        self, mapper: Mapper[Any], connection: sqlalchemy.Connection, target: Any
+    ) -> None:
+        """Number a record inserted by the unit of work, when sharded."""
+        (primary_key,) = mapper.primary_key
+        if has_app_context() and (state := self.state) is not None:
+            if getattr(target, primary_key.key) is None:
+                setattr(target, primary_key.key, self._next_id(state))
+
+    def _identify_bulk_insert(self, orm_execute_state: ORMExecuteState) -> None:
+        """Number the records of a bulk INSERT of a watched model, when sharded."""
+        mapper = orm_execute_state.bind_mapper
+        if not orm_execute_state.is_insert or mapper is None:
+            return
+        if mapper.local_table not in self.identified or not has_app_context():
+            return
+        if (state := self.state) is None or not (parameters := orm_execute_state.parameters):
+            return
+        (primary_key,) = mapper.primary_key
+        for row in [parameters] if isinstance(parameters, Mapping) else parameters:
+            # Numbered in place, the rows are those the statement executes with.
+            if isinstance(row, MutableMapping) and row.get(primary_key.key) is None:
+                row[primary_key.key] = self._next_id(state)
+
+    def shard_for(self, key: Any) -> int | None:
+        """Index of the shard of ``key``, None when not sharded."""
+        if (state := self.state) is None:
+            return None
+        if (pinned := self._pinned(state).get(str(key))) is not None:
+            return pinned
+        return shard_of(key, len(state.engines))
+
+    @contextmanager
+    def using(self, key: Any) -> Iterator[None]:
+        """Route the statements on sharded tables within the block to the shard of ``key``."""
+        with on_shard(self.shard_for(key)):
+            yield
+
+    def _before_request(self) -> None:
+        if (identity := request_identity()) is not None:
+            g.shard_token = _shard.set(self.shard_for(identity))
+
+    @staticmethod
+    def _teardown_request(error: BaseException | None) -> None:
+        if (token := g.pop("shard_token", None)) is not None:
+            _shard.reset(token)
+
+    def _create_shard_tables(
+        self, target: Any, connection: sqlalchemy.Connection, **kw: Any
+    ) -> None:
+        """Create the sharded tables in every shard, along with those of the primary database."""
+        if not has_app_context() or (state := self.state) is None:
+            return
+        if connection.engine is not state.primary:
+            return
+        for engine in state.engines:
+            with engine.begin() as shard:
+                for table in self.keys:
+                    if sqlalchemy.inspect(shard).has_table(table.name):
+                        continue
+                    # Referenced tables, like the users, are in the primary database.
+                    shard.execute(CreateTable(table, include_foreign_key_constraints=[]))
+                    for index in table.indexes:
+                        index.create(shard)
+                    table.dispatch.after_create(
+                        table,
+                        shard,
+                        checkfirst=False,
+                        _ddl_runner=None,
+                        _is_metadata_operation=False,
+                    )
+
+    def move(self, key: Any, target: int) -> int:
+        """Move the records of ``key`` to the shard at ``target``, and pin it there if needed.
+
+        Records keep their identifiers. They are copied to the target shard before the key is
+        pinned there, then removed from the other shards. A move failing before the pin removes
+        its copies, one failing after is completed by moving the key again. Records written to
+        the previous shard by processes which did not read the new pin yet are left behind,
+        :meth:`rebalance` moves them.
+
+        Returns:
+            The number of moved records.
+        """
+        state = self.state
+        if state is None or not 0 <= target < len(state.engines):
+            raise ValueError(f"No shard {target}")
+        copies: dict[int, _Copy] = {}
+        try:
+            for source in range(len(state.engines)):
+                if source != target:
+                    copies[source] = self._copy_records(state, key, source, target)
+            with state.primary.begin() as primary:
+                primary.execute(sqlalchemy.delete(self.pins).where(self.pins.c.key == str(key)))
+                if target != shard_of(key, len(state.engines)):
+                    pin = {"key": str(key), "shard": target}
+                    primary.execute(sqlalchemy.insert(self.pins), pin)
+        except BaseException:
+            for copy in copies.values():
+                self._remove_records(state.engines[target], copy.inserted)
+            raise
+        state.loaded_at = float("-inf")
+        for source, copy in copies.items():
+            self._remove_records(state.engines[source], copy.copied)
+        return sum(copy.count for copy in copies.values())
+
+    def _keyed(self) -> Iterator[tuple[sqlalchemy.Table, str]]:
+        return ((table, key) for table, key in self.keys.items() if key is not None)
+
+    def _copy_records(self, state: _ShardsState, key: Any, source: int, target: int) -> _Copy:
+        copy = _Copy()
+        with state.engines[source].connect() as old, state.engines[target].begin() as new:
+            for table, column in self._keyed():
+                rows = old.execute(sqlalchemy.select(table).where(table.c[column] == key))
+                records = [dict(row) for row in rows.mappings()]
+                if not records:
+                    continue
+                (primary_key,) = table.primary_key.columns
+                copy.copied[table] = [record[primary_key.name] for record in records]
+                copy.count += len(records)
+                # Values local to a shard, like change sequence numbers, are taken anew.
+                for local in (c.name for c in table.columns if c.info.get("shard_local")):
+                    for record in records:
+                        del record[local]
+                if table in self.identified:
+                    # Left by a move which failed after copying them.
+                    copied = primary_key.in_(copy.copied[table]) & (table.c[column] == key)
+                    present = set(new.scalars(sqlalchemy.select(primary_key).where(copied)))
+                    records = [r for r in records if r[primary_key.name] not in present]
+                if records:
+                    inserted = new.execute(sqlalchemy.insert(table).returning(primary_key), records)
+                    copy.inserted[table] = list(inserted.scalars())
+        return copy
+
+    @staticmethod
+    def _remove_records(engine: Engine, records: dict[sqlalchemy.Table, list[Any]]) -> None:
+        if not records:
+            return
+        with engine.begin() as connection:
+            for table, ids in records.items():
+                (primary_key,) = table.primary_key.columns
+                connection.execute(sqlalchemy.delete(table).where(primary_key.in_(ids)))
+
+    def _move_records(self, state: _ShardsState, key: Any, source: int, target: int) -> int:
+        copy = self._copy_records(state, key, source, target)
+        self._remove_records(state.engines[source], copy.copied)
+        return copy.count
+
+    def rebalance(self) -> Iterator[tuple[Any, int, int, int]]:
+        """Move every key whose records are not on its shard, like after adding shards.
+
+        Yields:
+            The key, the shards moved from and to, and the number of moved records.
+        """
+        if (state := self.state) is None:
+            return
+        for source, engine in enumerate(state.engines):
+            with engine.connect() as connection:
+                keys = {
+                    key
+                    for table, column in self._keyed()
+                    for key in connection.scalars(sqlalchemy.select(table.c[column]).distinct())
+                }
+            for key in sorted(keys):
+                if (target := self.shard_for(key)) != source:
+                    moved = self._move_records(state, key, source, target)  # type: ignore
+                    yield key, source, target, moved  # type: ignore
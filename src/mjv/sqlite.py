@@ -0,0 +1,126 @@
+"""SQLite tuning profiles, applied to every connection when it is opened.
+
+With the default rollback journal a writer locks readers out, and concurrent writers fail with
+"database is locked" right away. In WAL mode readers and a writer proceed concurrently, and
+writers wait for each other up to ``busy_timeout`` milliseconds, so a single database file
+serves several worker processes.
+"""
+
+import atexit
+import logging
+import re
+from typing import Any, Mapping
+from weakref import WeakSet
+
+from flask import Flask
+from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import Engine, event
+
+logger = logging.getLogger(__name__)
+
+PROFILES: dict[str, dict[str, Any]] = {
+    "production": {
+        "journal_mode": "WAL",
+        # In WAL mode, NORMAL is safe from corruption, a power loss may only undo the last
+        # transactions.
+        "synchronous": "NORMAL",
+        "busy_timeout": 5000,
+        "mmap_size": 256 * 1024 * 1024,
+        # Negative sizes are in KiB: 64 MiB of page cache per connection.
+        "cache_size": -64 * 1024,
+        "temp_store": "MEMORY",
+    },
+}
+
+# Engines whose pooled connections are optimized and closed when the process exits.
+_optimized: WeakSet[Engine] = WeakSet()
+
+_NAME = re.compile(r"\w+")
+_VALUE = re.compile(r"-?\w+")
+
+
+def pragmas(profile: str | None, overrides: Mapping[str, Any] | None = None) -> dict[str, Any]:
+    """PRAGMAs of ``profile``, with ``overrides``, where None unsets a PRAGMA of the profile.
+
+    Raises:
+        ValueError: When the profile is unknown, or a PRAGMA is not a name and a plain value.
+    """
+    if profile is not None and profile not in PROFILES:
+        raise ValueError(f"Unknown SQLite profile {profile!r}, pick one of {', '.join(PROFILES)}")
+    merged = {**PROFILES.get(profile or "", {}), **(overrides or {})}
+    for name, value in merged.items():
+        if not _NAME.fullmatch(name) or not (value is None or _VALUE.fullmatch(str(value))):
+            raise ValueError(f"Invalid SQLite PRAGMA {name} = {value}")
+    return {name: value for name, value in merged.items() if value is not None}
+
+
+class SQLiteTuning:
+    """Flask extension applying a tuning profile to the connections of SQLite engines.
+
+    Configuration:
+        SQLITE_PROFILE: Name of the profile of :data:`PROFILES` to apply, None by default to
+            keep the defaults of SQLite.
+        SQLITE_PRAGMAS: PRAGMAs overriding those of the profile, by name.
+        SQLITE_OPTIMIZE: Run ``PRAGMA optimize`` on the pooled connections, and close them, when
+            the process exits, enabled by default along with a profile.
+    """
+
+    def __init__(self, db: SQLAlchemy) -> None:
+        """Tune the engines of the ``db`` extension."""
+        self.db = db
+
+    def init_app(self, app: Flask) -> None:
+        """Tune the SQLite engines of ``app``, after ``db`` is initialized."""
+        app.config.setdefault("SQLITE_PROFILE", None)
+        app.config.setdefault("SQLITE_PRAGMAS", {})
+        app.config.setdefault("SQLITE_OPTIMIZE", app.config["SQLITE_PROFILE"] is not None)
+        with app.app_context():
+            for engine in self.db.engines.values():
+                self.watch(app, engine)
+
+    @staticmethod
+    def watch(app: Flask, engine: Engine) -> None:
+        """Apply the configured PRAGMAs to the connections of ``engine``, if it is SQLite."""
+        if engine.dialect.name != "sqlite":
+            return
+        settings = pragmas(app.config["SQLITE_PROFILE"], app.config["SQLITE_PRAGMAS"])
+        if settings:
+            event.listen(engine, "connect", lambda conn, record: _execute(conn, settings))
+        if app.config["SQLITE_OPTIMIZE"]:
+            _optimized.add(engine)
+
+
+def _execute(dbapi_connection: Any, settings: Mapping[str, Any]) -> None:
+    cursor = dbapi_connection.cursor()
+    try:
+        for name, value in settings.items():
+            cursor.execute(f"PRAGMA {name}" if value is None else f"PRAGMA {name} = {value}")
+            if name == "journal_mode" and (mode := cursor.fetchone()[0]).lower() != value.lower():
+                # In-memory databases cannot use WAL.
+                logger.info("SQLite journal mode is %s instead of %s", mode, value)
+    finally:
+        cursor.close()
+
+
+def _optimize(dbapi_connection: Any, connection_record: Any) -> None:
+    try:
+        _execute(dbapi_connection, {"optimize": None})
+    except Exception:
+        # The connection is being closed anyway, maybe because it is broken.
+        logger.warning("PRAGMA optimize failed", exc_info=True)
+
+
+@atexit.register
+def _optimize_on_exit() -> None:
+    """Optimize and close the pooled connections of the watched engines, on exit.
+
+    ``PRAGMA optimize`` analyzes the tables the queries of each connection would have benefited
+    from, so it runs on every pooled connection, right before it is closed. Pooled connections
+    are not closed when the process exits, unless disposed.
+    """
+    for engine in list(_optimized):
+        event.listen(engine, "close", _optimize)
+        try:
+            engine.dispose()
+        finally:
+            event.remove(engine, "close", _optimize)
@@ -0,0 +1,54 @@
+"""Streamed newline delimited JSON responses."""
+
+import json
+import zlib
+from typing import Any, Callable, Iterable, Iterator
+
+from flask import Response, current_app, request, stream_with_context
+
+NDJSON_MIMETYPE = "application/x-ndjson"
+
+# Bytes gathered before a chunk is written out, few large writes beat many tiny ones.
+CHUNK_SIZE = 64 * 1024
+
+
+def ndjson_lines(rows: Iterable[Any], serialize: Callable[[Any], Any]) -> Iterator[bytes]:
+    """Encode ``rows`` one JSON document per line, gathered into chunks of about ``CHUNK_SIZE``."""
+    chunk = bytearray()
+    for row in rows:
+        chunk += json.dumps(serialize(row), ensure_ascii=False).encode("utf-8")
+        chunk += b"\n"
+        if len(chunk) >= CHUNK_SIZE:
+            yield bytes(chunk)
+            chunk.clear()
+    if chunk:
+        yield bytes(chunk)
+
+
+def gzip_chunks(chunks: Iterable[bytes], level: int = 6) -> Iterator[bytes]:
+    """Compress ``chunks`` into a single gzip stream, flushing after every chunk."""
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    for chunk in chunks:
+        if compressed := compressor.compress(chunk) + compressor.flush(zlib.Z_SYNC_FLUSH):
+            yield compressed
+    yield compressor.flush()
+
+
+def ndjson_response(
+    rows: Iterable[Any], serialize: Callable[[Any], Any], filename: str | None = None
+) -> Response:
+    """Stream ``rows`` as newline delimited JSON, gzipped when the client accepts it.
+
+    The rows are consumed lazily while the response is sent, within the request context.
+    """
+    chunks = ndjson_lines(rows, serialize)
+    response = Response(mimetype=NDJSON_MIMETYPE)
+    if request.accept_encodings["gzip"]:
+        level = current_app.config.get("EXPORT_GZIP_LEVEL", 6)
+        chunks = gzip_chunks(chunks, level)
+        response.content_encoding = "gzip"
+    response.response = stream_with_context(chunks)
+    response.vary.add("Accept-Encoding")
+    if filename:
+        response.headers.set("Content-Disposition", "attachment", filename=filename)
+    return response
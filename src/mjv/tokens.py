@@ -0,0 +1,84 @@
+"""JWT manager caching verified token claims."""
+
+import hashlib
+import time
+from typing import Any
+
+from flask import Flask, current_app, request
+from flask_jwt_extended import JWTManager, decode_token
+from flask_jwt_extended.exceptions import JWTExtendedException
+from jwt import PyJWTError
+
+from .cache import TTLCache
+
+
+class CachingJWTManager(JWTManager):
+    """JWT manager that caches the claims of verified tokens, so they are not verified each request.
+
+    Claims are cached by a hash of the token, at most until the token expires. Revoked token and
+    token type checks still run on every request, they happen after decoding.
+
+    It also holds the per-process cache of the users tokens are issued to, see ``user_cache``.
+
+    Configuration:
+        JWT_CLAIMS_CACHE_SIZE: Maximum number of cached tokens, defaults to 1024.
+        JWT_CLAIMS_CACHE_TTL: Maximum seconds a token is cached, defaults to 300.
+        JWT_USER_CACHE_SIZE: Maximum number of cached users, defaults to 1024.
+        JWT_USER_CACHE_TTL: Seconds a user is cached, defaults to 60.
+    """
+
+    def init_app(self, app: Flask, add_context_processor: bool = False) -> None:
+        """Register the extension, and its caches, with ``app``."""
+        super().init_app(app, add_context_processor)
+        app.config.setdefault("JWT_CLAIMS_CACHE_SIZE", 1024)
+        app.config.setdefault("JWT_CLAIMS_CACHE_TTL", 300)
+        app.config.setdefault("JWT_USER_CACHE_SIZE", 1024)
+        app.config.setdefault("JWT_USER_CACHE_TTL", 60)
+        app.extensions["jwt_claims_cache"] = TTLCache[tuple[str, str | None], dict[str, Any]](
+            app.config["JWT_CLAIMS_CACHE_SIZE"], app.config["JWT_CLAIMS_CACHE_TTL"]
+        )
+        app.extensions["jwt_user_cache"] = TTLCache[Any, dict[str, Any]](
+            app.config["JWT_USER_CACHE_SIZE"], app.config["JWT_USER_CACHE_TTL"]
+        )
+
+    @property
+    def user_cache(self) -> TTLCache[Any, dict[str, Any]]:
+        """Column values of recently seen users of the current app, by identity."""
+        return current_app.extensions["jwt_user_cache"]  # type: ignore
+
+    def _decode_jwt_from_config(
+        self, encoded_token: str, csrf_value: str | None = None, allow_expired: bool = False
+    ) -> dict[str, Any]:
+        # flask-jwt-extended has no public hook around decoding, every token it verifies goes
+        # through this private method. The dependency is pinned to the minor release it is
+        # overridden for, and tests/tokens_test.py fails when its signature changes.
+        if allow_expired:
+            return super()._decode_jwt_from_config(encoded_token, csrf_value, allow_expired)
+
+        cache: TTLCache[tuple[str, str | None], dict[str, Any]] = current_app.extensions[
+            "jwt_claims_cache"
+        ]
+        key = (hashlib.sha256(encoded_token.encode("utf-8")).hexdigest(), csrf_value)
+        if (claims := cache.get(key)) is None:
+            claims = super()._decode_jwt_from_config(encoded_token, csrf_value, allow_expired)
+            if "exp" in claims:
+                cache.set(key, claims, claims["exp"] - time.time())
+            else:
+                cache.set(key, claims)
+        return claims
+
+
+def request_identity() -> Any:
+    """Identity of the access token of the current request, None without a valid one.
+
+    Lets requests be routed before their route verifies the token, whose claims are cached.
+    """
+    header = request.headers.get(current_app.config["JWT_HEADER_NAME"], "")
+    scheme, _, token = header.partition(" ")
+    if scheme != current_app.config["JWT_HEADER_TYPE"] or not token:
+        return None
+    try:
+        return decode_token(token).get(current_app.config["JWT_IDENTITY_CLAIM"])
+    except (JWTExtendedException, PyJWTError):
+        # The route rejects the token.
+        return None
@@ -16,6 +16,7 @@ from flask.testing import FlaskClient
         pytest.param(
             "put", "/todos/1", {"task": "Updated Task", "completed": True}, id="update a todo"
         ),
+        pytest.param("patch", "/todos/1", {"completed": True}, id="patch a todo"),
         pytest.param("delete", "/todos/1", None, id="delete todo"),
     ],
 )
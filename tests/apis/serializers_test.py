@@ -0,0 +1,67 @@
+import json
+
+import pytest
+from flask import Flask
+from flask.testing import FlaskClient
+from flask_restx import marshal
+
+from mjv.apis.todo.models import Todo
+from mjv.apis.todo.routes import todo_model
+from mjv.apis.user.models import User
+from mjv.apis.user.routes import user_model
+from mjv.serializers import compile_serializer
+
+
+@pytest.fixture(scope="module")
+def todos(new_user: User) -> list[Todo]:
+    todos = [Todo.create(task=f"Task {index}", user_id=new_user.id) for index in range(3)]
+    todos[0].update(completed=True)
+    todos[1].update(task="Tâche ☑")
+    return todos
+
+
+def test_compiled_serializer_matches_marshal(todos: list[Todo], new_user: User) -> None:
+    serialize = compile_serializer(todo_model)
+    for todo in todos:
+        assert json.dumps(serialize(todo)) == json.dumps(marshal(todo, todo_model))
+    serialize = compile_serializer(user_model)
+    assert json.dumps(serialize(new_user)) == json.dumps(marshal(new_user, user_model))
+
+
+def test_compiled_serializer_accepts_mappings() -> None:
+    serialize = compile_serializer(todo_model)
+    row = {"id": 1, "task": "Task", "completed": False}
+    assert serialize(row) == marshal(row, todo_model)
+
+
+@pytest.mark.parametrize(
+    "url", [pytest.param("/todos/?all=true", id="list"), pytest.param("/todos/1", id="item")]
+)
+def test_fast_serializer_responses_are_identical(
+    app: Flask,
+    authenticated_client: FlaskClient,
+    todos: list[Todo],
+    url: str,
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    with monkeypatch.context() as patch:
+        patch.setitem(app.config, "FAST_SERIALIZER", True)
+        fast = authenticated_client.get(url)
+        masked = authenticated_client.get(url, headers={"X-Fields": "id,task"})
+    assert fast.data == authenticated_client.get(url).data
+    assert '"completed"' not in masked.text
+
+
+def test_fast_json_responses(
+    app: Flask,
+    authenticated_client: FlaskClient,
+    todos: list[Todo],
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    orjson = pytest.importorskip("orjson")
+    with monkeypatch.context() as patch:
+        patch.setitem(app.config, "FAST_SERIALIZER", True)
+        patch.setitem(app.config, "FAST_JSON", True)
+        fast = authenticated_client.get("/todos/?all=true")
+    standard = authenticated_client.get("/todos/?all=true")
+    assert fast.data == orjson.dumps(standard.get_json()) + b"\n"
@@ -1,9 +1,18 @@
+import gzip
+import json
+import re
 from http import HTTPStatus
-from typing import Iterator
+from typing import Any, Iterator
 
 import pytest
+import sqlalchemy
+from flask import Flask
 from flask.testing import FlaskClient
 
+from mjv.apis.todo.models import Todo
+from mjv.apis.user.models import User
+from mjv.extensions import db
+
 
 @pytest.fixture
 def volitile_todos(authenticated_client: FlaskClient) -> Iterator[tuple[FlaskClient, int]]:
@@ -57,3 +66,439 @@ def test_delete_todo(volitile_todos: tuple[FlaskClient, int]) -> None:
 
     response = client.get(f"/todos/{todo_id}")
     assert response.status_code == HTTPStatus.NOT_FOUND
+
+
+@pytest.fixture
+def many_todos(authenticated_client: FlaskClient) -> Iterator[tuple[FlaskClient, list[int]]]:
+    """Populate database with enough todos to span several pages."""
+    ids = [
+        authenticated_client.post("/todos/", json={"task": f"Task {index}"}).get_json()["id"]
+        for index in range(5)
+    ]
+    yield authenticated_client, ids
+    for todo_id in ids:
+        authenticated_client.delete(f"/todos/{todo_id}")
+
+
+def test_get_todos_paginated(many_todos: tuple[FlaskClient, list[int]]) -> None:
+    client, ids = many_todos
+    seen: list[int] = []
+    url = "/todos/?limit=2"
+    while url:
+        response = client.get(url)
+        assert response.status_code == HTTPStatus.OK
+        page = response.get_json()
+        assert len(page) <= 2
+        seen.extend(todo["id"] for todo in page)
+        link = re.match(r"<(?P<url>[^>]+)>; rel=\"next\"", response.headers.get("Link", ""))
+        url = link["url"] if link else ""
+    assert seen == sorted(seen)
+    assert set(ids) <= set(seen)
+
+
+def test_get_todos_unbounded(many_todos: tuple[FlaskClient, list[int]]) -> None:
+    client, ids = many_todos
+    response = client.get("/todos/?all=true&limit=1")
+    assert response.status_code == HTTPStatus.OK
+    assert "Link" not in response.headers
+    assert set(ids) <= {todo["id"] for todo in response.get_json()}
+
+
+@pytest.mark.parametrize(
+    "query",
+    [
+        pytest.param("after=not-a-cursor", id="garbage cursor"),
+        pytest.param("after=WzEsMl0", id="cursor with too many keys"),
+        pytest.param("limit=0", id="limit too small"),
+    ],
+)
+def test_get_todos_bad_request(authenticated_client: FlaskClient, query: str) -> None:
+    response = authenticated_client.get(f"/todos/?{query}")
+    assert response.status_code == HTTPStatus.BAD_REQUEST
+
+
+def _all_pages(client: FlaskClient, url: str) -> list[dict[str, Any]]:
+    todos: list[dict[str, Any]] = []
+    while url:
+        response = client.get(url)
+        assert response.status_code == HTTPStatus.OK
+        todos.extend(response.get_json())
+        link = re.match(r"<(?P<url>[^>]+)>; rel=\"next\"", response.headers.get("Link", ""))
+        url = link["url"] if link else ""
+    return todos
+
+
+def test_get_todos_sorted_descending(many_todos: tuple[FlaskClient, list[int]]) -> None:
+    client, ids = many_todos
+    seen = [todo["id"] for todo in _all_pages(client, "/todos/?limit=2&sort=-id")]
+    assert seen == sorted(seen, reverse=True)
+    assert set(ids) <= set(seen)
+
+
+def test_get_todos_sorted_by_task(many_todos: tuple[FlaskClient, list[int]]) -> None:
+    client, _ = many_todos
+    tasks = [todo["task"] for todo in _all_pages(client, "/todos/?limit=2&sort=task")]
+    assert tasks == sorted(tasks)
+
+
+def test_get_todos_filtered(many_todos: tuple[FlaskClient, list[int]]) -> None:
+    client, ids = many_todos
+    client.patch(f"/todos/{ids[0]}", json={"completed": True})
+    completed = client.get("/todos/?all=true&completed=true").get_json()
+    assert [todo["id"] for todo in completed] == [ids[0]]
+    pending = {todo["id"] for todo in client.get("/todos/?all=true&completed=false").get_json()}
+    assert ids[0] not in pending
+    assert set(ids[1:]) <= pending
+
+    later = client.get("/todos/?all=true&created_after=2999-01-01T00:00:00Z")
+    assert later.status_code == HTTPStatus.OK
+    assert later.get_json() == []
+
+
+def test_search_todos(many_todos: tuple[FlaskClient, list[int]]) -> None:
+    client, ids = many_todos
+    client.put(f"/todos/{ids[1]}", json={"task": "Buy groceries"})
+    found = client.get("/todos/?all=true&q=groc").get_json()
+    assert [todo["id"] for todo in found] == [ids[1]]
+
+    client.put(f"/todos/{ids[1]}", json={"task": "Task 1"})
+    assert client.get("/todos/?all=true&q=groc").get_json() == []
+    assert ids[1] in {todo["id"] for todo in client.get("/todos/?all=true&q=task").get_json()}
+
+
+@pytest.mark.parametrize("q", ['"', "NEAR(", "*", "task OR", "%"])
+def test_search_todos_syntax_is_literal(many_todos: tuple[FlaskClient, list[int]], q: str) -> None:
+    client, _ = many_todos
+    response = client.get("/todos/", query_string={"q": q, "all": "true"})
+    assert response.status_code == HTTPStatus.OK
+
+
+@pytest.mark.parametrize(
+    "query",
+    [
+        pytest.param("sort=password", id="unknown sort key"),
+        pytest.param("completed=maybe", id="not a boolean"),
+        pytest.param("created_after=yesterday", id="not a datetime"),
+    ],
+)
+def test_get_todos_bad_filter(authenticated_client: FlaskClient, query: str) -> None:
+    response = authenticated_client.get(f"/todos/?{query}")
+    assert response.status_code == HTTPStatus.BAD_REQUEST
+
+
+def test_create_todos_batch(authenticated_client: FlaskClient) -> None:
+    todos = [{"task": "First"}, {"task": "Second", "completed": True}, {"task": "Third"}]
+    response = authenticated_client.post("/todos/batch", json=todos)
+    assert response.status_code == HTTPStatus.CREATED
+    data = response.get_json()
+    assert [todo["task"] for todo in data] == ["First", "Second", "Third"]
+    assert [todo["completed"] for todo in data] == [False, True, False]
+    assert all(todo["id"] for todo in data)
+    for todo in data:
+        assert authenticated_client.get(f"/todos/{todo['id']}").status_code == HTTPStatus.OK
+        authenticated_client.delete(f"/todos/{todo['id']}")
+
+
+@pytest.mark.parametrize(
+    "payload",
+    [
+        pytest.param({"task": "Not a list"}, id="not an array"),
+        pytest.param([{"task": "Valid"}, {"completed": True}], id="missing task"),
+        pytest.param([{"task": "Valid"}, {"task": "x" * 81}], id="task too long"),
+        pytest.param([{"task": "Valid"}, {"task": "Valid", "completed": "yes"}], id="bad status"),
+    ],
+)
+def test_create_todos_batch_is_atomic(authenticated_client: FlaskClient, payload: object) -> None:
+    before = authenticated_client.get("/todos/?all=true").get_json()
+    response = authenticated_client.post("/todos/batch", json=payload)
+    assert response.status_code == HTTPStatus.BAD_REQUEST
+    assert authenticated_client.get("/todos/?all=true").get_json() == before
+
+
+def test_update_todos_by_ids(many_todos: tuple[FlaskClient, list[int]]) -> None:
+    client, ids = many_todos
+    selected = ",".join(map(str, ids[:3]))
+    response = client.patch(f"/todos/?ids={selected}", json={"completed": True})
+    assert response.status_code == HTTPStatus.OK
+    assert response.get_json() == {"updated": 3}
+    todos = {todo["id"]: todo for todo in client.get("/todos/?all=true").get_json()}
+    assert all(todos[todo_id]["completed"] for todo_id in ids[:3])
+    assert all(todos[todo_id]["completed_at"] for todo_id in ids[:3])
+    assert not any(todos[todo_id]["completed"] for todo_id in ids[3:])
+
+
+def test_delete_todos_by_filter(many_todos: tuple[FlaskClient, list[int]]) -> None:
+    client, ids = many_todos
+    client.patch(f"/todos/?ids={ids[0]},{ids[1]}", json={"completed": True})
+    response = client.delete("/todos/?completed=true")
+    assert response.status_code == HTTPStatus.OK
+    assert response.get_json()["deleted"] >= 2
+    remaining = {todo["id"] for todo in client.get("/todos/?all=true").get_json()}
+    assert remaining.isdisjoint(ids[:2])
+    assert set(ids[2:]) <= remaining
+
+
+def test_delete_todos_requires_filter(many_todos: tuple[FlaskClient, list[int]]) -> None:
+    client, ids = many_todos
+    response = client.delete("/todos/")
+    assert response.status_code == HTTPStatus.BAD_REQUEST
+    assert set(ids) <= {todo["id"] for todo in client.get("/todos/?all=true").get_json()}
+
+
+def test_patch_todo(volitile_todos: tuple[FlaskClient, int]) -> None:
+    client, todo_id = volitile_todos
+    response = client.patch(f"/todos/{todo_id}", json={"completed": True})
+    assert response.status_code == HTTPStatus.OK
+    data = response.get_json()
+    assert data["task"] == "Initial Task"
+    assert data["completed"]
+    assert data["completed_at"]
+
+    response = client.patch(f"/todos/{todo_id}", json={"task": "Patched Task"})
+    assert response.status_code == HTTPStatus.OK
+    data = response.get_json()
+    assert data["task"] == "Patched Task"
+    assert data["completed"]
+
+
+def test_patch_todo_single_statement(volitile_todos: tuple[FlaskClient, int]) -> None:
+    client, todo_id = volitile_todos
+    statements: list[str] = []
+
+    def record(*args: Any) -> None:
+        statements.append(args[2])
+
+    sqlalchemy.event.listen(db.engine, "before_cursor_execute", record)
+    try:
+        client.patch(f"/todos/{todo_id}", json={"task": "Patched Task"})
+    finally:
+        sqlalchemy.event.remove(db.engine, "before_cursor_execute", record)
+    # The todo is updated in a single statement, after taking its change number.
+    assert len(statements) == 2
+    assert statements[0].startswith("UPDATE change_counter")
+    assert statements[1].startswith("UPDATE todo")
+
+
+def test_patch_missing_todo(authenticated_client: FlaskClient) -> None:
+    response = authenticated_client.patch("/todos/999999", json={"completed": True})
+    assert response.status_code == HTTPStatus.NOT_FOUND
+
+
+def test_get_todo_not_modified(volitile_todos: tuple[FlaskClient, int]) -> None:
+    client, todo_id = volitile_todos
+    etag = client.get(f"/todos/{todo_id}").headers["ETag"]
+    response = client.get(f"/todos/{todo_id}", headers={"If-None-Match": etag})
+    assert response.status_code == HTTPStatus.NOT_MODIFIED
+    assert response.headers["ETag"] == etag
+    assert not response.data
+
+    client.patch(f"/todos/{todo_id}", json={"completed": True})
+    response = client.get(f"/todos/{todo_id}", headers={"If-None-Match": etag})
+    assert response.status_code == HTTPStatus.OK
+    assert response.headers["ETag"] != etag
+
+
+def test_get_todos_not_modified(volitile_todos: tuple[FlaskClient, int]) -> None:
+    client, todo_id = volitile_todos
+    etag = client.get("/todos/").headers["ETag"]
+    assert client.get("/todos/", headers={"If-None-Match": etag}).status_code == (
+        HTTPStatus.NOT_MODIFIED
+    )
+    assert client.get("/todos/?limit=1", headers={"If-None-Match": etag}).status_code == (
+        HTTPStatus.OK
+    )
+
+    client.patch("/todos/", json={"completed": True})
+    response = client.get("/todos/", headers={"If-None-Match": etag})
+    assert response.status_code == HTTPStatus.OK
+    assert response.headers["ETag"] != etag
+
+
+def test_put_todo_if_match(volitile_todos: tuple[FlaskClient, int]) -> None:
+    client, todo_id = volitile_todos
+    etag = client.get(f"/todos/{todo_id}").headers["ETag"]
+    response = client.put(f"/todos/{todo_id}", json={"task": "First"}, headers={"If-Match": etag})
+    assert response.status_code == HTTPStatus.OK
+    assert response.get_json()["task"] == "First"
+    assert response.headers["ETag"] != etag
+
+    response = client.put(f"/todos/{todo_id}", json={"task": "Second"}, headers={"If-Match": etag})
+    assert response.status_code == HTTPStatus.PRECONDITION_FAILED
+    assert client.get(f"/todos/{todo_id}").get_json()["task"] == "First"
+
+
+def test_delete_todo_if_match(volitile_todos: tuple[FlaskClient, int]) -> None:
+    client, todo_id = volitile_todos
+    etag = client.get(f"/todos/{todo_id}").headers["ETag"]
+    client.patch(f"/todos/{todo_id}", json={"task": "Changed"})
+    response = client.delete(f"/todos/{todo_id}", headers={"If-Match": etag})
+    assert response.status_code == HTTPStatus.PRECONDITION_FAILED
+
+    etag = client.get(f"/todos/{todo_id}").headers["ETag"]
+    response = client.delete(f"/todos/{todo_id}", headers={"If-Match": etag})
+    assert response.status_code == HTTPStatus.NO_CONTENT
+
+
+def test_export_todos(many_todos: tuple[FlaskClient, list[int]]) -> None:
+    client, ids = many_todos
+    response = client.get("/todos/export")
+    assert response.status_code == HTTPStatus.OK
+    assert response.mimetype == "application/x-ndjson"
+    assert "Content-Encoding" not in response.headers
+    exported = [json.loads(line) for line in response.data.splitlines()]
+    assert exported == client.get("/todos/?all=true").get_json()
+    assert set(ids) <= {todo["id"] for todo in exported}
+
+
+def test_export_todos_gzipped(many_todos: tuple[FlaskClient, list[int]]) -> None:
+    client, _ = many_todos
+    response = client.get("/todos/export", headers={"Accept-Encoding": "gzip"})
+    assert response.status_code == HTTPStatus.OK
+    assert response.content_encoding == "gzip"
+    assert gzip.decompress(response.data) == client.get("/todos/export").data
+
+
+@pytest.fixture
+def imported(authenticated_client: FlaskClient) -> Iterator[None]:
+    """Delete the todos a test imported afterwards."""
+    before = {todo["id"] for todo in authenticated_client.get("/todos/?all=true").get_json()}
+    yield
+    after = {todo["id"] for todo in authenticated_client.get("/todos/?all=true").get_json()}
+    if created := after - before:
+        authenticated_client.delete(f"/todos/?ids={','.join(map(str, created))}")
+
+
+def test_import_ndjson(
+    app: Flask,
+    authenticated_client: FlaskClient,
+    imported: None,
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    body = "\n".join(
+        (
+            '{"task": "Imported 1"}',
+            "not json",
+            "",
+            '{"task": "Imported 2", "completed": true}',
+            '{"completed": true}',
+            '{"task": "Imported 3"}',
+        )
+    )
+    monkeypatch.setitem(app.config, "TODO_IMPORT_BATCH_SIZE", 2)
+    response = authenticated_client.post(
+        "/todos/import", data=body, content_type="application/x-ndjson"
+    )
+    assert response.status_code == HTTPStatus.OK
+    assert response.get_json() == {
+        "imported": 3,
+        "failed": 2,
+        "errors": [
+            {"line": 2, "message": "Invalid JSON"},
+            {"line": 5, "message": "Task details is required"},
+        ],
+    }
+    todos = authenticated_client.get("/todos/?all=true").get_json()
+    completed = {todo["task"]: todo["completed_at"] for todo in todos if todo["completed"]}
+    assert {"Imported 1", "Imported 3"} <= {todo["task"] for todo in todos}
+    assert completed["Imported 2"] is not None
+
+
+def test_import_csv(authenticated_client: FlaskClient, imported: None) -> None:
+    body = 'task,completed\nFirst,false\n"Second, quoted",true\nThird,maybe\n'
+    response = authenticated_client.post("/todos/import", data=body, content_type="text/csv")
+    assert response.status_code == HTTPStatus.OK
+    report = response.get_json()
+    assert (report["imported"], report["failed"]) == (2, 1)
+    assert report["errors"][0]["line"] == 4
+    tasks = {todo["task"] for todo in authenticated_client.get("/todos/?all=true").get_json()}
+    assert {"First", "Second, quoted"} <= tasks
+
+
+def test_import_unsupported_format(authenticated_client: FlaskClient) -> None:
+    response = authenticated_client.post("/todos/import", json=[{"task": "Task"}])
+    assert response.status_code == HTTPStatus.UNSUPPORTED_MEDIA_TYPE
+
+
+def _sync(client: FlaskClient, since: str | None = None, limit: int = 50) -> dict[str, Any]:
+    """Every change since the ``since`` cursor, fetched ``limit`` at a time."""
+    todos: dict[int, dict[str, Any]] = {}
+    deleted: list[int] = []
+    more = True
+    while more:
+        url = f"/todos/changes?limit={limit}" + (f"&since={since}" if since else "")
+        response = client.get(url)
+        assert response.status_code == HTTPStatus.OK
+        page = response.get_json()
+        assert len(page["todos"]) + len(page["deleted"]) <= limit
+        todos.update((todo["id"], todo) for todo in page["todos"])
+        deleted.extend(page["deleted"])
+        since, more = page["cursor"], page["more"]
+    return {"todos": todos, "deleted": deleted, "cursor": since}
+
+
+@pytest.mark.parametrize("limit", [1, 50])
+def test_todo_changes(authenticated_client: FlaskClient, limit: int) -> None:
+    cursor = _sync(authenticated_client)["cursor"]
+    kept = authenticated_client.post("/todos/", json={"task": "Kept"}).get_json()["id"]
+    gone = authenticated_client.post("/todos/", json={"task": "Gone"}).get_json()["id"]
+    authenticated_client.patch(f"/todos/{kept}", json={"completed": True})
+    authenticated_client.delete(f"/todos/{gone}")
+
+    changes = _sync(authenticated_client, cursor, limit)
+    assert list(changes["todos"]) == [kept]
+    assert changes["todos"][kept]["completed"] is True
+    assert changes["deleted"] == [gone]
+
+    unchanged = _sync(authenticated_client, changes["cursor"])
+    assert (unchanged["todos"], unchanged["deleted"]) == ({}, [])
+    authenticated_client.delete(f"/todos/{kept}")
+    assert _sync(authenticated_client, unchanged["cursor"])["deleted"] == [kept]
+
+
+def test_todo_changes_delete_then_create(authenticated_client: FlaskClient) -> None:
+    old = authenticated_client.post("/todos/", json={"task": "Old"}).get_json()["id"]
+    cursor = _sync(authenticated_client)["cursor"]
+    authenticated_client.delete(f"/todos/{old}")
+    new = authenticated_client.post("/todos/", json={"task": "New"}).get_json()["id"]
+
+    changes = _sync(authenticated_client, cursor)
+    assert new != old
+    assert (list(changes["todos"]), changes["deleted"]) == ([new], [old])
+    authenticated_client.delete(f"/todos/{new}")
+
+
+def test_todo_changes_reused_id(authenticated_client: FlaskClient, new_user: User) -> None:
+    """Test a todo created again with a deleted identifier supersedes its tombstone."""
+    old = authenticated_client.post("/todos/", json={"task": "Old"}).get_json()["id"]
+    cursor = _sync(authenticated_client)["cursor"]
+    authenticated_client.delete(f"/todos/{old}")
+    Todo.create(id=old, task="Reused", user_id=new_user.id)
+
+    changes = _sync(authenticated_client, cursor)
+    assert changes["deleted"] == []
+    assert changes["todos"][old]["task"] == "Reused"
+    authenticated_client.delete(f"/todos/{old}")
+
+
+def test_todo_changes_of_one_statement_paginated(
+    many_todos: tuple[FlaskClient, list[int]],
+) -> None:
+    client, ids = many_todos
+    cursor = _sync(client)["cursor"]
+    query = ",".join(map(str, ids))
+    assert client.patch(f"/todos/?ids={query}", json={"completed": True}).get_json() == {
+        "updated": len(ids)
+    }
+    assert sorted(_sync(client, cursor, limit=2)["todos"]) == sorted(ids)
+
+
+def test_todo_changes_invalid_cursor(
+    app: Flask, authenticated_client: FlaskClient, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    response = authenticated_client.get("/todos/changes?since=not-a-cursor")
+    assert response.status_code == HTTPStatus.BAD_REQUEST
+
+    cursor = _sync(authenticated_client)["cursor"]
+    monkeypatch.setitem(app.config, "TOMBSTONE_RETENTION_DAYS", 0)
+    response = authenticated_client.get(f"/todos/changes?since={cursor}")
+    assert response.status_code == HTTPStatus.GONE
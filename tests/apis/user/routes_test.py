@@ -1,8 +1,14 @@
 from http import HTTPStatus
+from typing import Any, NoReturn
 
+import pytest
+import sqlalchemy
+from flask import Flask
 from flask.testing import FlaskClient
 
 from mjv.apis.user.models import User
+from mjv.extensions import db, hasher, jwt
+from mjv.hashing import HasherBusy, log_rounds
 
 
 def test_register_existing_user(client: FlaskClient, new_user: User) -> None:
@@ -13,6 +19,40 @@ def test_register_existing_user(client: FlaskClient, new_user: User) -> None:
     assert response.status_code == HTTPStatus.BAD_REQUEST
 
 
+@pytest.mark.parametrize(
+    "payload",
+    [
+        {"username": "TestUser", "email": "other@example.com"},
+        {"username": "other", "email": "TestUser@Example.com"},
+    ],
+)
+def test_register_existing_user_ignores_case(
+    client: FlaskClient, new_user: User, payload: dict[str, str]
+) -> None:
+    response = client.post("/auth/register", json={**payload, "password": "password"})
+    assert response.status_code == HTTPStatus.BAD_REQUEST
+    assert response.get_json()["message"] == "User already exists"
+
+
+@pytest.mark.parametrize(
+    "payload",
+    [
+        {"username": " ", "email": "blank@example.com"},
+        {"username": "x" * 81, "email": "long@example.com"},
+        {"username": "invalid", "email": "not an email"},
+    ],
+)
+def test_register_validates_before_hashing(
+    client: FlaskClient, monkeypatch: pytest.MonkeyPatch, payload: dict[str, str]
+) -> None:
+    def unexpected(password: str) -> NoReturn:
+        raise AssertionError("Hashed an invalid registration")
+
+    monkeypatch.setattr(hasher, "generate_password_hash", unexpected)
+    response = client.post("/auth/register", json={**payload, "password": "password"})
+    assert response.status_code == HTTPStatus.BAD_REQUEST
+
+
 def test_register(client: FlaskClient) -> None:
     response = client.post(
         "/auth/register",
@@ -47,3 +87,75 @@ def test_change_password(authenticated_client: FlaskClient) -> None:
     user_data = response.get_json()
     assert user_data["username"] == "testuser"
     assert user_data["email"] == "testuser@example.com"
+
+
+def test_login_when_hasher_busy(
+    client: FlaskClient, new_user: User, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    def busy(*args: Any) -> NoReturn:
+        raise HasherBusy(retry_after=3)
+
+    monkeypatch.setattr(hasher, "check_password_hash", busy)
+    response = client.post(
+        "/auth/login", json={"username": new_user.username, "password": "password"}
+    )
+    assert response.status_code == HTTPStatus.SERVICE_UNAVAILABLE
+    assert response.headers["Retry-After"] == "3"
+
+
+def test_login_rehashes_outdated_password(
+    client: FlaskClient, app: Flask, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    with monkeypatch.context() as patch:
+        patch.setitem(app.config, "BCRYPT_LOG_ROUNDS", 4)
+        user = User.create(username="rehash", email="rehash@example.com", password="password")
+    assert log_rounds(user.password) == 4
+
+    response = client.post("/auth/login", json={"username": "rehash", "password": "password"})
+    assert response.status_code == HTTPStatus.OK
+    user = User.query.filter_by(username="rehash").first()
+    assert log_rounds(user.password) == app.config["BCRYPT_LOG_ROUNDS"]
+    assert user.verify_password("password")
+
+
+def test_current_user_is_cached(authenticated_client: FlaskClient, new_user: User) -> None:
+    authenticated_client.get("/auth/current_user")
+    statements: list[str] = []
+
+    def record(*args: Any) -> None:
+        statements.append(args[2])
+
+    sqlalchemy.event.listen(db.engine, "before_cursor_execute", record)
+    try:
+        response = authenticated_client.get("/auth/current_user")
+    finally:
+        sqlalchemy.event.remove(db.engine, "before_cursor_execute", record)
+    assert response.status_code == HTTPStatus.OK
+    assert not statements
+
+    new_user.update(email="cached@example.com")
+    assert authenticated_client.get("/auth/current_user").get_json()["email"] == (
+        "cached@example.com"
+    )
+
+
+def test_password_change_revokes_tokens(client: FlaskClient) -> None:
+    """Test a password changed by another process refreshes the cached user, revoking old tokens."""
+    user = User.create(username="versioned", email="versioned@example.com", password="password")
+    login = client.post("/auth/login", json={"username": "versioned", "password": "password"})
+    old_token = {"Authorization": f"Bearer {login.get_json()['access_token']}"}
+    assert client.get("/auth/current_user", headers=old_token).status_code == HTTPStatus.OK
+    assert "password" not in jwt.user_cache.get(user.id)  # type: ignore
+
+    # Changed by another worker process, the user cache of this one is left as it is.
+    db.session.execute(
+        sqlalchemy.update(User)
+        .where(User.id == user.id)
+        .values(password=hasher.generate_password_hash("changed"))
+    )
+    db.session.commit()
+    new_token = {"Authorization": f"Bearer {User.get_by_id(user.id).access_token()}"}  # type: ignore
+    assert client.get("/auth/current_user", headers=new_token).status_code == HTTPStatus.OK
+    assert client.get("/auth/current_user", headers=old_token).status_code == (
+        HTTPStatus.UNAUTHORIZED
+    )
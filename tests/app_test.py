@@ -19,3 +19,9 @@ def test_namespace_registration(app: Flask) -> None:
     with app.app_context():
         registered_namespaces = [namespace.name for namespace in api.namespaces]
         assert "todos" in registered_namespaces, "Namespace 'todos' not registered correctly"
+
+
+def test_swagger_specification(app: Flask) -> None:
+    response = app.test_client().get("/swagger.json")
+    assert response.status_code == 200
+    assert "/todos/" in response.get_json()["paths"]
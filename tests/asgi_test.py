@@ -0,0 +1,264 @@
+"""Test cases for the ASGI app."""
+
+import asyncio
+import json
+from http import HTTPStatus
+from typing import Any, Iterator, MutableMapping
+
+import pytest
+
+from mjv.app import create_asgi_app
+from mjv.asgi import AsgiApp
+from mjv.extensions import async_db, db, list_cache
+
+pytest.importorskip("aiosqlite")
+
+Response = tuple[int, dict[str, str], bytes]
+
+
+@pytest.fixture(scope="module")
+def asgi_app(tmp_path_factory: pytest.TempPathFactory) -> Iterator[AsgiApp]:
+    """ASGI app on a SQLite file, shared by the sync and the async engine."""
+
+    class Config:
+        SQLALCHEMY_DATABASE_URI = f"sqlite:///{tmp_path_factory.mktemp('asgi') / 'mjv.db'}"
+        TESTING = True
+        JWT_SECRET_KEY = "not-so-secret"
+        BCRYPT_LOG_ROUNDS = 4
+
+    asgi_app = create_asgi_app(Config)
+    with asgi_app.app.app_context():
+        db.create_all()
+    yield asgi_app
+    with asgi_app.app.app_context():
+        asyncio.run(async_db.engine.dispose())
+        db.drop_all()
+
+
+async def request(
+    app: AsgiApp,
+    method: str,
+    path: str,
+    body: Any = None,
+    headers: dict[str, str] | None = None,
+    query: str = "",
+    chunks: int = 1,
+) -> Response:
+    """Send a request to ``app``, its body in that many ``chunks``, and collect its response."""
+    content = b"" if body is None else json.dumps(body).encode()
+    headers = {"Host": "testserver", **(headers or {})}
+    if body is not None:
+        headers["Content-Type"] = "application/json"
+    scope = {
+        "type": "http",
+        "method": method,
+        "path": path,
+        "root_path": "",
+        "query_string": query.encode(),
+        "headers": [(k.lower().encode(), v.encode()) for k, v in headers.items()],
+        "scheme": "http",
+        "server": ("testserver", 80),
+    }
+    size = -(-len(content) // chunks) or 1
+    messages = [
+        {"type": "http.request", "body": content[start : start + size], "more_body": True}
+        for start in range(0, len(content), size)
+    ] or [{"type": "http.request", "body": b""}]
+    messages[-1]["more_body"] = False
+    sent: list[MutableMapping[str, Any]] = []
+
+    async def receive() -> dict[str, Any]:
+        return messages.pop(0) if messages else {"type": "http.disconnect"}
+
+    async def send(message: MutableMapping[str, Any]) -> None:
+        sent.append(message)
+
+    await app(scope, receive, send)
+    response_headers: dict[str, str] = {}
+    for name, value in sent[0]["headers"]:
+        # Repeated headers are combined, like HTTP allows.
+        key = name.decode().lower()
+        response_headers[key] = ", ".join(filter(None, [response_headers.get(key), value.decode()]))
+    return sent[0]["status"], response_headers, b"".join(m.get("body", b"") for m in sent[1:])
+
+
+@pytest.fixture(scope="module")
+def token(asgi_app: AsgiApp) -> str:
+    """Register a user through the ASGI app and log in."""
+    user = {"username": "async", "email": "async@example.com", "password": "password"}
+    status, _, _ = asyncio.run(request(asgi_app, "POST", "/auth/register", user))
+    assert status == HTTPStatus.CREATED
+    status, _, body = asyncio.run(request(asgi_app, "POST", "/auth/login", user))
+    assert status == HTTPStatus.OK
+    access_token: str = json.loads(body)["access_token"]
+    return access_token
+
+
+def test_asgi_todos(asgi_app: AsgiApp, token: str) -> None:
+    auth = {"Authorization": f"Bearer {token}"}
+
+    async def scenario() -> None:
+        status, _, body = await request(asgi_app, "POST", "/todos/", {"task": "Async"}, auth)
+        assert status == HTTPStatus.CREATED
+        todo = json.loads(body)
+        url = f"/todos/{todo['id']}"
+
+        status, headers, body = await request(asgi_app, "GET", url, headers=auth)
+        assert (status, json.loads(body)) == (HTTPStatus.OK, todo)
+        status, _, _ = await request(
+            asgi_app, "GET", url, headers={**auth, "If-None-Match": headers["etag"]}
+        )
+        assert status == HTTPStatus.NOT_MODIFIED
+
+        status, _, body = await request(asgi_app, "PATCH", url, {"completed": True}, auth)
+        assert status == HTTPStatus.OK
+        assert json.loads(body)["completed_at"] is not None
+        status, _, body = await request(
+            asgi_app, "PUT", url, {"task": "Updated"}, {**auth, "If-Match": headers["etag"]}
+        )
+        assert status == HTTPStatus.PRECONDITION_FAILED
+        status, _, body = await request(asgi_app, "PUT", url, {"task": "Updated"}, auth)
+        assert json.loads(body)["task"] == "Updated"
+
+        status, _, body = await request(asgi_app, "GET", "/todos/", headers=auth)
+        assert [todo["task"] for todo in json.loads(body)] == ["Updated"]
+        status, _, _ = await request(asgi_app, "DELETE", url, headers=auth)
+        assert status == HTTPStatus.NO_CONTENT
+        status, _, body = await request(asgi_app, "GET", url, headers=auth)
+        assert (status, json.loads(body)) == (HTTPStatus.NOT_FOUND, {"message": "Todo not found"})
+
+    asyncio.run(scenario())
+
+
+def test_asgi_concurrent_requests(asgi_app: AsgiApp, token: str) -> None:
+    auth = {"Authorization": f"Bearer {token}"}
+
+    async def scenario() -> list[Response]:
+        return await asyncio.gather(
+            *(
+                request(asgi_app, "POST", "/todos/", {"task": f"Task {index}"}, auth)
+                for index in range(50)
+            )
+        )
+
+    assert {status for status, _, _ in asyncio.run(scenario())} == {HTTPStatus.CREATED}
+    status, headers, body = asyncio.run(
+        request(asgi_app, "GET", "/todos/", headers=auth, query="limit=20")
+    )
+    assert len(json.loads(body)) == 20
+    assert 'rel="next"' in headers["link"]
+
+
+def test_asgi_current_user(asgi_app: AsgiApp, token: str) -> None:
+    status, _, body = asyncio.run(
+        request(asgi_app, "GET", "/auth/current_user", headers={"Authorization": f"Bearer {token}"})
+    )
+    assert status == HTTPStatus.OK
+    assert json.loads(body)["username"] == "async"
+
+
+def test_asgi_change_password(asgi_app: AsgiApp) -> None:
+    async def scenario() -> None:
+        user = {"username": "async-pw", "email": "async-pw@example.com", "password": "password"}
+        await request(asgi_app, "POST", "/auth/register", user)
+        _, _, body = await request(asgi_app, "POST", "/auth/login", user)
+        auth = {"Authorization": f"Bearer {json.loads(body)['access_token']}"}
+        password = {"old_password": "password", "new_password": "changed"}
+        status, _, body = await request(asgi_app, "PUT", "/auth/current_user", password, auth)
+        assert status == HTTPStatus.OK
+        assert "password" not in json.loads(body)
+        status, _, _ = await request(asgi_app, "GET", "/auth/current_user", headers=auth)
+        assert status == HTTPStatus.UNAUTHORIZED
+        status, _, _ = await request(
+            asgi_app, "POST", "/auth/login", {**user, "password": "changed"}
+        )
+        assert status == HTTPStatus.OK
+
+    asyncio.run(scenario())
+
+
+def test_asgi_requires_token(asgi_app: AsgiApp) -> None:
+    status, _, body = asyncio.run(request(asgi_app, "GET", "/todos/"))
+    assert status == HTTPStatus.UNAUTHORIZED
+    assert json.loads(body) == {"msg": "Missing Authorization Header"}
+
+
+def test_asgi_validation(asgi_app: AsgiApp, token: str) -> None:
+    auth = {"Authorization": f"Bearer {token}"}
+    status, _, body = asyncio.run(request(asgi_app, "POST", "/todos/", {}, auth))
+    assert status == HTTPStatus.BAD_REQUEST
+    assert "task" in json.loads(body)["errors"]
+
+
+def test_asgi_falls_back_to_wsgi(asgi_app: AsgiApp) -> None:
+    status, headers, body = asyncio.run(request(asgi_app, "GET", "/swagger.json"))
+    assert status == HTTPStatus.OK
+    assert headers["content-type"] == "application/json"
+    assert "/todos/" in json.loads(body)["paths"]
+
+
+@pytest.mark.parametrize("headers, chunks", [({"Content-Length": "100"}, 1), ({}, 4)])
+def test_asgi_body_too_large(
+    asgi_app: AsgiApp, token: str, monkeypatch: pytest.MonkeyPatch, headers: Any, chunks: int
+) -> None:
+    """Test bodies over MAX_CONTENT_LENGTH are refused, declared or as they are received."""
+    monkeypatch.setitem(asgi_app.app.config, "MAX_CONTENT_LENGTH", 64)
+    headers = {**headers, "Authorization": f"Bearer {token}"}
+    status, _, _ = asyncio.run(
+        request(asgi_app, "POST", "/todos/", {"task": "x" * 100}, headers, chunks=chunks)
+    )
+    assert status == HTTPStatus.REQUEST_ENTITY_TOO_LARGE
+
+
+@pytest.fixture(scope="module")
+def hooked_app(tmp_path_factory: pytest.TempPathFactory) -> Iterator[AsgiApp]:
+    """ASGI app with metrics, list cache and a replica, the request hooks of the app."""
+    database = tmp_path_factory.mktemp("hooked") / "mjv.db"
+
+    class Config:
+        SQLALCHEMY_DATABASE_URI = f"sqlite:///{database}"
+        SQLALCHEMY_REPLICA_URIS = [f"sqlite:///{database}"]
+        REPLICA_STICKY_COOKIE = False
+        TESTING = True
+        JWT_SECRET_KEY = "not-so-secret"
+        BCRYPT_LOG_ROUNDS = 4
+        METRICS_ENABLED = True
+        SERVER_TIMING = True
+        LIST_CACHE_ENABLED = True
+
+    asgi_app = create_asgi_app(Config)
+    with asgi_app.app.app_context():
+        db.create_all()
+    yield asgi_app
+    with asgi_app.app.app_context():
+        asyncio.run(async_db.engine.dispose())
+        db.drop_all()
+
+
+def test_asgi_runs_request_hooks(hooked_app: AsgiApp) -> None:
+    """Test async resources are measured, timed, cached and make their writers sticky."""
+    user = {"username": "hooked", "email": "hooked@example.com", "password": "password"}
+
+    async def scenario() -> None:
+        await request(hooked_app, "POST", "/auth/register", user)
+        _, _, body = await request(hooked_app, "POST", "/auth/login", user)
+        auth = {"Authorization": f"Bearer {json.loads(body)['access_token']}"}
+        status, headers, _ = await request(hooked_app, "POST", "/todos/", {"task": "Hook"}, auth)
+        assert status == HTTPStatus.CREATED
+        assert "statements" in headers["server-timing"]
+        with hooked_app.app.app_context():
+            assert hooked_app.app.extensions["replicas"].writers.get(1)
+
+        _, first, listed = await request(hooked_app, "GET", "/todos/", headers=auth)
+        status, cached, body = await request(hooked_app, "GET", "/todos/", headers=auth)
+        assert (status, cached["etag"], body) == (HTTPStatus.OK, first["etag"], listed)
+        assert '"0 statements"' in cached["server-timing"]
+        with hooked_app.app.app_context():
+            assert list_cache.stats["hits"] == 1
+
+        _, _, body = await request(hooked_app, "GET", "/metrics")
+        metrics = body.decode()
+        assert 'mjv_requests_total{resource="TodoList",method="post",status="201"} 1' in metrics
+        assert 'mjv_requests_total{resource="TodoList",method="get",status="200"} 2' in metrics
+
+    asyncio.run(scenario())
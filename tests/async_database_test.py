@@ -0,0 +1,22 @@
+"""Test cases for the async database module."""
+
+import pytest
+
+from mjv.async_database import async_database_uri
+
+
+@pytest.mark.parametrize(
+    ("uri", "expected"),
+    [
+        ("sqlite:///mjv.db", "sqlite+aiosqlite:///mjv.db"),
+        ("postgresql://user:secret@db/mjv", "postgresql+asyncpg://user:secret@db/mjv"),
+        ("postgresql+psycopg2://db/mjv", "postgresql+asyncpg://db/mjv"),
+    ],
+)
+def test_async_database_uri(uri: str, expected: str) -> None:
+    assert async_database_uri(uri) == expected
+
+
+def test_async_database_uri_unsupported() -> None:
+    with pytest.raises(ValueError, match="No async driver"):
+        async_database_uri("oracle://db/mjv")
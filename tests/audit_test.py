@@ -0,0 +1,73 @@
+from typing import Any
+
+from flask import Flask
+from flask.testing import FlaskClient
+
+from mjv.audit import (
+    explain_route_queries,
+    recorded_statements,
+    route_queries,
+    statement_key,
+    uncovered_statements,
+)
+from mjv.extensions import db
+
+
+def test_route_queries_use_an_index(app: Flask) -> None:
+    plans = list(explain_route_queries())
+    assert [plan.route for plan in plans] == list(route_queries())
+    assert all(plan.plan for plan in plans)
+    assert not [plan for plan in plans if plan.full_scans]
+
+
+def _exercise_routes(client: FlaskClient) -> None:
+    credentials = {"username": "auditor", "password": "password123"}
+    client.post("/auth/register", json={**credentials, "email": "auditor@example.com"})
+    token = client.post("/auth/login", json=credentials).json["access_token"]  # type: ignore
+    headers = {"Authorization": f"Bearer {token}"}
+
+    def call(method: str, url: str, **kwargs: Any) -> Any:
+        kwargs["headers"] = {**headers, **kwargs.get("headers", {})}
+        response = client.open(url, method=method, **kwargs)
+        assert response.status_code < 400, (method, url, response.status_code)
+        return response
+
+    call("GET", "/auth/current_user")
+    ids = [call("POST", "/todos/", json={"task": f"todo {n}"}).json["id"] for n in range(3)]
+    ids += [todo["id"] for todo in call("POST", "/todos/batch", json=[{"task": "batch"}]).json]
+    call("POST", "/todos/import", data=b'{"task": "import"}\n', content_type="application/x-ndjson")
+    for sort in ("id", "-created_at", "task"):
+        call("GET", call("GET", f"/todos/?limit=1&sort={sort}").headers["Link"][1:].split(">")[0])
+    call("GET", "/todos/?q=todo")
+    call("GET", "/todos/?all=true&completed=false")
+    call("GET", "/todos/export")
+    etag = call("GET", f"/todos/{ids[0]}").headers["ETag"]
+    call("PUT", f"/todos/{ids[0]}", json={"task": "put"}, headers={"If-Match": etag})
+    call("PUT", f"/todos/{ids[0]}", json={"task": "put again"})
+    call("PATCH", f"/todos/{ids[0]}", json={"completed": True})
+    call("PATCH", f"/todos/?ids={ids[1]}", json={"completed": True})
+    call("DELETE", "/todos/?completed=true")
+    etag = call("GET", f"/todos/{ids[2]}").headers["ETag"]
+    call("DELETE", f"/todos/{ids[2]}", headers={"If-Match": etag})
+    call("DELETE", f"/todos/{ids[3]}")
+    cursor = call("GET", "/todos/changes?limit=1").json["cursor"]
+    call("GET", f"/todos/changes?since={cursor}")
+    password = {"old_password": credentials["password"], "new_password": "password456"}
+    call("PUT", "/auth/current_user", json=password)
+
+
+def test_route_queries_cover_the_routes(app: Flask, client: FlaskClient) -> None:
+    with recorded_statements(db.engine) as statements:
+        _exercise_routes(client)
+    assert [sql for sql in statements if statement_key(sql)]
+    assert not uncovered_statements(statements)
+
+
+def test_statement_key() -> None:
+    assert statement_key("SELECT todo.id FROM todo WHERE todo.id IN (?, ?)") == (
+        "FROM todo WHERE todo.id IN (?)"
+    )
+    assert statement_key("UPDATE todo SET task=%(task)s WHERE todo.id = %(id_1)s RETURNING id") == (
+        "FROM todo WHERE todo.id = ?"
+    )
+    assert statement_key("INSERT INTO todo (task) VALUES (?)") is None
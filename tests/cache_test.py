@@ -0,0 +1,160 @@
+from http import HTTPStatus
+from typing import Any, Iterator
+
+import pytest
+from flask import Flask
+from flask.testing import FlaskClient
+from flask_jwt_extended import create_access_token
+from sqlalchemy import and_, or_
+
+from mjv.apis.todo.models import Todo
+from mjv.apis.user.models import User
+from mjv.app import create_app
+from mjv.cache import _ANY_OWNER, TTLCache, _owners_in_criteria
+from mjv.extensions import db, list_cache
+
+
+def test_ttl_cache_get_set() -> None:
+    cache = TTLCache[str, int](maxsize=2, ttl=60)
+    cache.set("a", 1)
+    assert cache.get("a") == 1
+    assert cache.get("b") is None
+    cache.delete("a")
+    assert cache.get("a") is None
+
+
+def test_ttl_cache_evicts_least_recently_used() -> None:
+    cache = TTLCache[str, int](maxsize=2, ttl=60)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.get("a")
+    cache.set("c", 3)
+    assert cache.get("a") == 1
+    assert cache.get("b") is None
+    assert len(cache) == 2
+
+
+def test_ttl_cache_expires(monkeypatch: pytest.MonkeyPatch) -> None:
+    now = 1000.0
+    monkeypatch.setattr("mjv.cache.time.monotonic", lambda: now)
+    cache = TTLCache[str, int](maxsize=2, ttl=60)
+    cache.set("a", 1)
+    cache.set("b", 2, ttl=10)
+    cache.set("c", 3, ttl=0)
+    now += 30
+    assert cache.get("a") == 1
+    assert cache.get("b") is None
+    assert cache.get("c") is None
+
+
+def test_ttl_cache_evicts_over_maxbytes() -> None:
+    cache = TTLCache[str, bytes](maxsize=10, ttl=60, maxbytes=10, sizeof=len)
+    cache.set("a", b"12345")
+    cache.set("b", b"12345")
+    cache.set("c", b"123")
+    assert cache.get("a") is None
+    assert cache.get("b") == b"12345"
+    assert cache.size == 8
+    cache.set("d", b"12345678901")
+    assert cache.get("d") is None
+
+
+def test_owners_in_criteria() -> None:
+    user_id = Todo.__table__.c.user_id
+    assert _owners_in_criteria(and_(Todo.user_id == 1, Todo.id == 2), user_id) == {1}
+    assert _owners_in_criteria(Todo.user_id.in_([1, 2]), user_id) == {1, 2}
+    assert _owners_in_criteria(Todo.id == 2, user_id) == {_ANY_OWNER}
+    assert _owners_in_criteria(or_(Todo.user_id == 1, Todo.id == 2), user_id) == {_ANY_OWNER}
+
+
+class ListCacheConfig:
+    SQLALCHEMY_DATABASE_URI = "sqlite:///:memory:"
+    TESTING = True
+    JWT_SECRET_KEY = "not-so-secret"
+    LIST_CACHE_ENABLED = True
+    METRICS_ENABLED = True
+
+
+@pytest.fixture(scope="module")
+def cached_app() -> Iterator[Flask]:
+    app = create_app(ListCacheConfig)
+    with app.app_context():
+        db.create_all()
+        yield app
+        db.drop_all()
+
+
+@pytest.fixture(scope="module")
+def users(cached_app: Flask) -> list[FlaskClient]:
+    clients = []
+    for name in ("alice", "bob"):
+        user = User.create(username=name, email=f"{name}@example.com", password="password")
+        client = cached_app.test_client()
+        client.environ_base["HTTP_AUTHORIZATION"] = f"Bearer {create_access_token(user.id)}"
+        clients.append(client)
+    return clients
+
+
+def test_list_cache_hit(users: list[FlaskClient]) -> None:
+    alice, _ = users
+    alice.post("/todos/", json={"task": "First"})
+    before = list_cache.stats
+    first = alice.get("/todos/")
+    second = alice.get("/todos/")
+    assert second.get_data() == first.get_data()
+    assert second.headers["ETag"] == first.headers["ETag"]
+    assert list_cache.stats["misses"] == before["misses"] + 1
+    assert list_cache.stats["hits"] == before["hits"] + 1
+    not_modified = alice.get("/todos/", headers={"If-None-Match": first.headers["ETag"]})
+    assert not_modified.status_code == HTTPStatus.NOT_MODIFIED
+
+
+@pytest.mark.parametrize(
+    "write",
+    [
+        lambda client, id: client.post("/todos/", json={"task": "Another"}),
+        lambda client, id: client.put(f"/todos/{id}", json={"task": "Changed"}),
+        lambda client, id: client.patch(f"/todos/{id}", json={"completed": True}),
+        lambda client, id: client.patch("/todos/", json={"completed": False}),
+        lambda client, id: client.post("/todos/batch", json=[{"task": "Batch"}]),
+        lambda client, id: client.delete(f"/todos/{id}"),
+    ],
+)
+def test_list_cache_invalidated_by_writes(users: list[FlaskClient], write: Any) -> None:
+    alice, _ = users
+    id = alice.post("/todos/", json={"task": "Write me"}).get_json()["id"]
+    cached = alice.get("/todos/?all=true").get_json()
+    write(alice, id)
+    assert alice.get("/todos/?all=true").get_json() != cached
+
+
+def test_list_cache_per_user(users: list[FlaskClient]) -> None:
+    alice, bob = users
+    alice.get("/todos/")
+    bob.post("/todos/", json={"task": "Bob's"})
+    before = list_cache.stats["hits"]
+    alice.get("/todos/")
+    assert list_cache.stats["hits"] == before + 1
+
+
+def test_list_cache_metrics(users: list[FlaskClient]) -> None:
+    metrics = users[0].get("/metrics").text
+    assert f"mjv_list_cache_hits_total {list_cache.stats['hits']}" in metrics
+
+
+def test_list_read_during_write_not_cached(users: list[FlaskClient]) -> None:
+    generation = list_cache.generation(Todo, 1)
+    # A write commits after the list was read, before it is cached.
+    list_cache.invalidate(Todo, 1)
+    list_cache.set(Todo, 1, "stale", "list", generation)
+    assert list_cache.get(Todo, 1, "stale", list_cache.generation(Todo, 1)) is None
+
+
+def test_list_cache_any_owner_invalidation(users: list[FlaskClient]) -> None:
+    generation = list_cache.generation(Todo, 1)
+    list_cache.set(Todo, 1, "list", "list", generation)
+    list_cache.state.backend.set("other", "entry")
+    list_cache.invalidate(Todo, _ANY_OWNER)
+    assert list_cache.get(Todo, 1, "list", list_cache.generation(Todo, 1)) is None
+    # Only the lists of the model are forgotten, not the whole backend.
+    assert list_cache.state.backend.get("other") == "entry"
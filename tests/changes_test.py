@@ -0,0 +1,120 @@
+"""Test changes module."""
+
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Iterator
+
+import pytest
+import sqlalchemy
+from click.testing import CliRunner
+from flask import Flask
+
+from mjv import __main__
+from mjv.apis.todo.models import Todo
+from mjv.apis.user.models import User
+from mjv.app import create_app
+from mjv.extensions import change_log, db
+
+
+@pytest.fixture(scope="module")
+def owner(app: Flask) -> User:
+    return User.create(username="changer", email="changer@example.com", password="password")
+
+
+def _tombstones(owner: User) -> list[tuple[int, int]]:
+    tombstones = change_log.tombstones
+    rows = db.session.execute(
+        sqlalchemy.select(tombstones.c.record_id, tombstones.c.change_seq)
+        .where(tombstones.c.owner == owner.id)
+        .order_by(tombstones.c.change_seq)
+    )
+    return [tuple(row) for row in rows]
+
+
+def test_writes_numbered_in_order(owner: User) -> None:
+    first = Todo.create(task="First", user_id=owner.id)
+    second = Todo.create(task="Second", user_id=owner.id)
+    assert first.change_seq < second.change_seq
+
+    first.update(task="First, again")
+    assert first.change_seq > second.change_seq
+
+    criteria, last = (Todo.id.in_([first.id, second.id]),), first.change_seq
+    Todo.bulk_update(*criteria, completed=True)
+    numbers = set(db.session.scalars(sqlalchemy.select(Todo.change_seq).where(*criteria)))
+    # A statement numbers the records it writes alike.
+    assert len(numbers) == 1
+    assert numbers.pop() > last
+
+    created = Todo.bulk_create([{"task": "Third", "user_id": owner.id}])
+    assert db.session.scalar(sqlalchemy.select(change_log.counter.c.seq)) == created[0].change_seq
+    updated = Todo.update_returning(Todo.id == created[0].id, task="Third, again")
+    assert updated is not None
+    assert updated.change_seq > created[0].change_seq
+
+
+def test_deletes_leave_tombstones(owner: User) -> None:
+    todo = Todo.create(task="Deleted", user_id=owner.id)
+    others = Todo.bulk_create([{"task": f"Bulk {n}", "user_id": owner.id} for n in range(2)])
+    last = others[-1].change_seq
+
+    todo.delete()
+    Todo.bulk_delete(Todo.id.in_([other.id for other in others]))
+
+    tombstones = _tombstones(owner)[-3:]
+    assert [id for id, _ in tombstones] == [todo.id, *sorted(other.id for other in others)]
+    assert last < tombstones[0][1] < tombstones[1][1] == tombstones[2][1]
+    # Deleted records do not take back their number.
+    assert Todo.create(task="Next", user_id=owner.id).change_seq > tombstones[-1][1]
+
+
+def test_compact(owner: User) -> None:
+    for n in range(3):
+        Todo.create(task=f"Compacted {n}", user_id=owner.id).delete()
+    newest = _tombstones(owner)[-1]
+
+    assert change_log.compact(before=datetime.now() - timedelta(days=1)) == 0
+    assert change_log.compact(before=datetime.now() + timedelta(days=1)) > 0
+    assert _tombstones(owner) == []
+    # The sequence goes on after its last numbers are gone.
+    assert Todo.create(task="After", user_id=owner.id).change_seq > newest[1]
+
+
+def test_compact_command(app: Flask, runner: CliRunner, monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(__main__, "load_app", lambda: app)
+    result = runner.invoke(__main__.cli, ["compact-tombstones"])
+    assert result.exit_code == 0, result.output
+    assert "tombstones removed" in result.output
+
+
+@pytest.fixture
+def file_app(tmp_path: Path) -> Iterator[Flask]:
+    """App on a database file, which concurrent connections share."""
+
+    class Config:
+        SQLALCHEMY_DATABASE_URI = f"sqlite:///{tmp_path / 'changes.db'}"
+        TESTING = True
+
+    app = create_app(Config)
+    with app.app_context():
+        db.create_all()
+        yield app
+        db.session.remove()
+        db.engine.dispose()
+
+
+def test_concurrent_writers_numbered_in_turn(file_app: Flask) -> None:
+    """Test concurrent writers wait for the counter row, each taking the next number."""
+    owner = User.create(username="writer", email="writer@example.com", password="password")
+    start = db.session.execute(sqlalchemy.select(change_log.counter.c.seq)).scalar_one()
+
+    def write(n: int) -> list[int]:
+        with file_app.app_context():
+            todo = Todo.create(task=f"Concurrent {n}", user_id=owner.id)
+            rows = [{"task": f"Bulk {n}", "user_id": owner.id}] * 2
+            return [todo.change_seq, *{todo.change_seq for todo in Todo.bulk_create(rows)}]
+
+    with ThreadPoolExecutor(4) as executor:
+        numbers = [number for numbers in executor.map(write, range(8)) for number in numbers]
+    assert sorted(numbers) == list(range(start + 1, start + 17))
@@ -34,12 +34,30 @@ def test_update_model[T: PkModel](create_model: tuple[type[T], T]) -> None:  # t
     assert instance.name == change
 
 
+def test_update_model_version[T: PkModel](create_model: tuple[type[T], T]) -> None:  # type: ignore
+    model, instance = create_model
+    version, modified_at, etag = instance.version, instance.modified_at, instance.etag
+    instance.update(name="Updated name")
+    instance = model.query.get(instance.id)
+    assert instance
+    assert instance.version == version + 1
+    assert instance.modified_at > modified_at.replace(tzinfo=None)
+    assert instance.etag != etag
+
+
 def test_delete_model[T: PkModel](create_model: tuple[type[T], T]) -> None:  # type: ignore
     model, instance = create_model
     instance.delete()
     assert not model.query.get(instance.id)
 
 
+def test_bulk_create_model[T: PkModel](session: Session, pk_model: type[T]) -> None:  # type: ignore
+    instances = pk_model.bulk_create([{"name": "First"}, {"name": "Second"}])
+    assert [instance.name for instance in instances] == ["First", "Second"]
+    assert all(pk_model.query.get(instance.id) for instance in instances)
+    assert pk_model.bulk_create([]) == []
+
+
 def test_field_descriptions[T: PkModel](pk_model: type[T]) -> None:  # type: ignore
     spec = dict(pk_model.field_descriptions())
     assert "id" in spec
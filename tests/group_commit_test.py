@@ -0,0 +1,116 @@
+"""Test group_commit module."""
+
+from pathlib import Path
+from threading import Barrier, Thread
+from typing import Any, Callable, Iterator
+
+import pytest
+from flask import Flask
+from sqlalchemy.exc import IntegrityError
+
+from mjv.app import create_app
+from mjv.database import Model
+from mjv.extensions import db, group_commit
+
+
+@pytest.fixture
+def grouped_app(tmp_path: Path) -> Iterator[Flask]:
+    """App on a database file, committing up to 3 writes together."""
+
+    class Config:
+        SQLALCHEMY_DATABASE_URI = f"sqlite:///{tmp_path / 'grouped.db'}"
+        SQLITE_PROFILE = "production"
+        GROUP_COMMIT_ENABLED = True
+        GROUP_COMMIT_WINDOW = 5
+        GROUP_COMMIT_MAX_BATCH = 3
+        TESTING = True
+        JWT_SECRET_KEY = "not-so-secret"
+        METRICS_ENABLED = True
+
+    app = create_app(Config)
+    with app.app_context():
+        db.create_all()
+        yield app
+        db.session.remove()
+        db.engine.dispose()
+
+
+def _concurrently(app: Flask, *writes: Callable[[], Any]) -> list[Any]:
+    """Run every write in its own thread, at once, with the value or error of each."""
+    results: list[Any] = [None] * len(writes)
+    barrier = Barrier(len(writes))
+
+    def run(index: int) -> None:
+        with app.app_context():
+            barrier.wait()
+            try:
+                results[index] = writes[index]()
+            except Exception as error:
+                results[index] = error
+            finally:
+                db.session.remove()
+
+    threads = [Thread(target=run, args=(index,)) for index in range(len(writes))]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results
+
+
+def test_writes_committed_together(grouped_app: Flask, crud_model: type[Model]) -> None:
+    """Test concurrent saves share a commit, and their records are usable afterwards."""
+    records = _concurrently(
+        grouped_app, *(lambda n=n: crud_model.create(name=f"n{n}") for n in range(3))
+    )
+    assert sorted(record.name for record in records) == ["n0", "n1", "n2"]
+    assert all(record.id is not None for record in records)
+    sizes = group_commit.state.sizes.snapshot()  # type: ignore
+    assert (sizes.count, sizes.sum) == (1, 3)
+    assert db.session.query(crud_model).count() == 3
+
+    metrics = grouped_app.test_client().get("/metrics").get_data(as_text=True)
+    assert "mjv_group_commit_batch_size_count 1" in metrics
+
+
+def test_failed_write_is_isolated(grouped_app: Flask, pk_model: type[Model]) -> None:
+    """Test a write failing within the batch fails its own request only."""
+    results = _concurrently(
+        grouped_app,
+        lambda: pk_model.create(id=1, name="first"),
+        lambda: pk_model.create(id=1, name="duplicate"),
+        lambda: pk_model.create(id=2, name="second"),
+    )
+    assert sum(isinstance(result, IntegrityError) for result in results) == 1
+    assert {record.id for record in db.session.query(pk_model)} == {1, 2}
+
+
+def test_update_and_delete(
+    grouped_app: Flask, pk_model: type[Model], monkeypatch: pytest.MonkeyPatch
+) -> None:
+    """Test updates and deletes of loaded records are committed together."""
+    state = group_commit.state
+    assert state is not None
+    monkeypatch.setattr(state, "window", 0)
+    for index in (1, 2):
+        pk_model.create(id=index, name="initial")
+    monkeypatch.setattr(state, "window", 5)
+    monkeypatch.setattr(state, "max_batch", 2)
+
+    updated, deleted = _concurrently(
+        grouped_app,
+        lambda: pk_model.get_by_id(1).update(name="updated"),
+        lambda: pk_model.get_by_id(2).delete(),
+    )
+    assert updated.version == 2
+    assert deleted is None
+    assert [(record.id, record.name) for record in db.session.query(pk_model)] == [(1, "updated")]
+
+
+def test_session_with_other_changes(grouped_app: Flask, crud_model: type[Model]) -> None:
+    """Test records saved along with other changes are committed on their own."""
+    db.session.add(crud_model(name="other"))
+    assert not group_commit.coalesces(db.session(), crud_model(name="record"))
+    crud_model.create(name="record")
+    assert group_commit.state.sizes.snapshot().count == 0  # type: ignore
+    assert db.session.query(crud_model).count() == 2
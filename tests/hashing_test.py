@@ -0,0 +1,40 @@
+import pytest
+from flask import Flask
+
+from mjv.extensions import bcrypt, hasher
+from mjv.hashing import MIN_LOG_ROUNDS, HasherBusy, log_rounds
+
+
+def test_hash_and_check_password(app: Flask) -> None:
+    pw_hash = hasher.generate_password_hash("password")
+    assert pw_hash.startswith("$2b$")
+    assert hasher.check_password_hash(pw_hash, "password")
+    assert not hasher.check_password_hash(pw_hash, "wrongpassword")
+
+
+def test_hasher_busy_when_queue_full(app: Flask) -> None:
+    state = hasher.state
+    slots = state.workers + state.queue_depth
+    for _ in range(slots):
+        state.slots.acquire()
+    try:
+        with pytest.raises(HasherBusy) as error:
+            hasher.generate_password_hash("password")
+        assert error.value.retry_after == app.config["BCRYPT_RETRY_AFTER"]
+    finally:
+        for _ in range(slots):
+            state.slots.release()
+    assert hasher.generate_password_hash("password")
+
+
+def test_needs_rehash(app: Flask) -> None:
+    pw_hash = hasher.generate_password_hash("password")
+    assert log_rounds(pw_hash) == app.config["BCRYPT_LOG_ROUNDS"]
+    assert not hasher.needs_rehash(pw_hash)
+    assert hasher.needs_rehash(bcrypt.generate_password_hash("password", 4).decode("utf-8"))
+
+
+def test_recommend_log_rounds() -> None:
+    measured = list(hasher.calibrate(max_ms=0))
+    assert measured == [(MIN_LOG_ROUNDS, measured[0][1])]
+    assert hasher.recommend_log_rounds(target_ms=0) == MIN_LOG_ROUNDS
@@ -0,0 +1,125 @@
+"""Test instrumentation module."""
+
+import os
+import subprocess
+import sys
+import time
+from pathlib import Path
+from typing import Iterator
+
+import pytest
+from flask import Flask
+from flask.testing import FlaskClient
+
+from mjv.app import create_app
+from mjv.extensions import db
+from mjv.metrics import Family, dumps_families
+
+
+class MetricsConfig:
+    """App configuration with metrics enabled."""
+
+    SQLALCHEMY_DATABASE_URI = "sqlite:///:memory:"
+    TESTING = True
+    JWT_SECRET_KEY = "not-so-secret"
+    BCRYPT_LOG_ROUNDS = 4
+    METRICS_ENABLED = True
+
+
+@pytest.fixture(scope="module")
+def metrics_app() -> Iterator[Flask]:
+    """App measuring its requests."""
+    app = create_app(MetricsConfig)
+    with app.app_context():
+        db.create_all()
+        yield app
+        db.drop_all()
+
+
+@pytest.fixture(scope="module")
+def metrics(metrics_app: Flask) -> str:
+    """Metrics after registering, logging in and listing todos."""
+    client: FlaskClient = metrics_app.test_client()
+    credentials = {"username": "metrics", "password": "password"}
+    client.post("/auth/register", json={**credentials, "email": "metrics@example.com"})
+    token = client.post("/auth/login", json=credentials).json["access_token"]  # type: ignore
+    client.get("/todos/", headers={"Authorization": f"Bearer {token}"})
+    response = client.get("/metrics")
+    assert response.status_code == 200
+    assert response.mimetype == "text/plain"
+    return response.text
+
+
+def test_requests_by_resource(metrics: str) -> None:
+    """Test requests are counted by flask-restx resource, method and status."""
+    assert 'mjv_requests_total{resource="Register",method="post",status="201"} 1' in metrics
+    assert 'mjv_requests_total{resource="Login",method="post",status="200"} 1' in metrics
+    assert 'mjv_requests_total{resource="TodoList",method="get",status="200"} 1' in metrics
+    assert 'mjv_request_duration_seconds_count{resource="TodoList",method="get"} 1' in metrics
+    assert 'mjv_response_size_bytes_count{resource="Login",method="post"} 1' in metrics
+
+
+def test_timed_work(metrics: str) -> None:
+    """Test time spent on the database and hashing is reported per request."""
+    assert 'mjv_request_db_seconds_count{resource="TodoList",method="get"} 1' in metrics
+    assert 'mjv_request_bcrypt_seconds_sum{resource="TodoList",method="get"} 0.0' in metrics
+    bcrypt_sum = next(
+        line
+        for line in metrics.splitlines()
+        if line.startswith('mjv_request_bcrypt_seconds_sum{resource="Login"')
+    )
+    assert float(bcrypt_sum.rsplit(" ", 1)[1]) > 0
+
+
+def test_in_flight_and_pool(metrics: str) -> None:
+    """Test the metrics request itself is in flight, and the pool is reported."""
+    assert "mjv_requests_in_flight 1" in metrics
+    assert 'mjv_db_pool_checkouts_total{engine="default"}' in metrics
+
+
+def test_metrics_disabled(client: FlaskClient) -> None:
+    """Test metrics are only served when enabled."""
+    assert client.get("/metrics").status_code == 404
+
+
+def test_metrics_dir(tmp_path: Path) -> None:
+    """Test a scrape adds up the metrics of every worker writing to the directory."""
+
+    class Config(MetricsConfig):
+        METRICS_DIR = str(tmp_path)
+        METRICS_FLUSH_INTERVAL = 0.01
+
+    def worker_metrics(requests: int, in_flight: int) -> str:
+        labels = {"resource": "TodoList", "method": "get", "status": 401}
+        return dumps_families(
+            [
+                Family(
+                    "mjv_requests_in_flight", "gauge", "Requests being handled.", [({}, in_flight)]
+                ),
+                Family("mjv_requests_total", "counter", "Requests handled.", [(labels, requests)]),
+            ]
+        )
+
+    exited = subprocess.run(
+        [sys.executable, "-c", "import os; print(os.getpid())"], capture_output=True
+    )
+    (tmp_path / f"{int(exited.stdout)}.json").write_text(worker_metrics(3, 7))
+    (tmp_path / f"{os.getppid()}.json").write_text(worker_metrics(5, 2))
+
+    app = create_app(Config)
+    with app.app_context():
+        db.create_all()
+    client = app.test_client()
+    assert client.get("/todos/").status_code == 401
+    deadline = time.monotonic() + 5
+    while not (tmp_path / f"{os.getpid()}.json").exists():
+        assert time.monotonic() < deadline, "The metrics were never written"
+        time.sleep(0.01)
+
+    metrics = client.get("/metrics").text
+    assert 'mjv_requests_total{resource="TodoList",method="get",status="401"} 9' in metrics
+    assert "mjv_requests_in_flight 3" in metrics
+    assert sorted(path.name for path in tmp_path.glob("*.json")) == sorted(
+        ["exited.json", f"{os.getpid()}.json", f"{os.getppid()}.json"]
+    )
+    assert "mjv_requests_in_flight 3" in client.get("/metrics").text
@@ -1,8 +1,14 @@
 """Test cases for the __main__ module."""
 
+from pathlib import Path
+
+import pytest
 from click.testing import CliRunner
+from flask import Flask
 
 from mjv import __main__
+from mjv.apis.todo.models import Todo
+from mjv.apis.user.models import User
 
 
 def test_cli_run_help(runner: CliRunner) -> None:
@@ -12,3 +18,52 @@ def test_cli_run_help(runner: CliRunner) -> None:
     assert "--host" in result.output
     assert "--port" in result.output
     assert "--debug" in result.output
+
+
+def test_cli_help(runner: CliRunner) -> None:
+    result = runner.invoke(__main__.cli, ["--help"])
+    assert result.exit_code == 0
+    assert "run" in result.output
+    assert "check-indexes" in result.output
+
+
+def test_cli_auth_calibrate(runner: CliRunner) -> None:
+    result = runner.invoke(__main__.cli, ["auth", "calibrate", "--target-ms", "50"])
+    assert result.exit_code == 0
+    assert "BCRYPT_LOG_ROUNDS=" in result.output
+
+
+def test_cli_import(
+    runner: CliRunner, app: Flask, monkeypatch: pytest.MonkeyPatch, tmp_path: Path
+) -> None:
+    monkeypatch.setattr(__main__, "create_app", lambda: app)
+    user = User.create(username="importer", email="importer@example.com", password="password")
+    path = tmp_path / "todos.csv"
+    path.write_text("task,completed\nFirst,true\n,\nSecond,\n")
+    try:
+        result = runner.invoke(__main__.cli, ["import", str(path), "--user", "importer"])
+        assert result.exit_code == 1
+        assert "line 3: Task details is required" in result.output
+        assert "2 todos imported, 1 lines rejected." in result.output
+        assert [todo.task for todo in Todo.query.filter_by(user_id=user.id).order_by(Todo.id)] == [
+            "First",
+            "Second",
+        ]
+    finally:
+        user.delete()
+
+
+def test_cli_import_unknown_user(
+    runner: CliRunner, app: Flask, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    monkeypatch.setattr(__main__, "create_app", lambda: app)
+    result = runner.invoke(__main__.cli, ["import", "-", "--user", "nobody"], input="")
+    assert result.exit_code == 1
+    assert "No user nobody" in result.output
+
+
+def test_cli_serve_help(runner: CliRunner) -> None:
+    result = runner.invoke(__main__.cli, ["serve", "--help"])
+    assert result.exit_code == 0
+    for option in ("--workers", "--threads", "--backlog", "--keep-alive", "--max-requests"):
+        assert option in result.output
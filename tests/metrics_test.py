@@ -0,0 +1,74 @@
+"""Test metrics module."""
+
+import math
+
+from mjv.metrics import (
+    Family,
+    Histogram,
+    HistogramSnapshot,
+    dumps_families,
+    format_histogram,
+    loads_families,
+    merge_families,
+    record,
+    timed,
+    tracking,
+)
+
+
+def test_histogram_counts_cumulatively() -> None:
+    """Test bucket counts include every observation up to their bound."""
+    histogram = Histogram((0.1, 1))
+    for value in (0.05, 0.1, 0.5, 2):
+        histogram.observe(value)
+    snapshot = histogram.snapshot()
+    assert snapshot.buckets == ((0.1, 2), (1.0, 3), (math.inf, 4))
+    assert snapshot.count == 4
+    assert snapshot.sum == 2.65
+
+
+def test_timed_records_into_tracking() -> None:
+    """Test timed work is recorded only while tracking."""
+    with timed("db"):
+        pass
+    with tracking() as timings:
+        with timed("db"):
+            pass
+        record("db", 1)
+    assert timings["db"] >= 1
+
+
+def test_format_histogram() -> None:
+    """Test histograms are formatted in the Prometheus text format."""
+    histogram = Histogram((1,))
+    histogram.observe(0.5)
+    assert list(format_histogram("latency", {"path": 'a"b'}, histogram.snapshot())) == [
+        'latency_bucket{path="a\\"b",le="1"} 1',
+        'latency_bucket{path="a\\"b",le="+Inf"} 1',
+        'latency_sum{path="a\\"b"} 0.5',
+        'latency_count{path="a\\"b"} 1',
+    ]
+
+
+def test_merge_families() -> None:
+    """Test the metrics of several processes add up sample by sample, through JSON."""
+    histogram = Histogram((1,))
+    histogram.observe(0.5)
+    first = [
+        Family(
+            "requests_total", "counter", "Requests.", [({"status": 200}, 2), ({"status": 404}, 1)]
+        ),
+        Family("latency", "histogram", "Latency.", [({}, histogram.snapshot())]),
+    ]
+    histogram.observe(2)
+    second = [
+        Family("requests_total", "counter", "Requests.", [({"status": 200}, 3)]),
+        Family("latency", "histogram", "Latency.", [({}, histogram.snapshot())]),
+        Family("in_flight", "gauge", "In flight.", [({}, 1)]),
+    ]
+    requests, latency, in_flight = merge_families(
+        loads_families(dumps_families(families)) for families in (first, second)
+    )
+    assert requests.samples == [({"status": 200}, 5), ({"status": 404}, 1)]
+    assert latency.samples == [({}, HistogramSnapshot(((1, 2), (math.inf, 3)), 3.0, 3))]
+    assert in_flight == Family("in_flight", "gauge", "In flight.", [({}, 1)])
@@ -0,0 +1,68 @@
+"""Test pool module."""
+
+import logging
+from pathlib import Path
+from typing import Iterator
+
+import pytest
+from flask import Flask
+from sqlalchemy import text
+from sqlalchemy.pool import QueuePool
+
+from mjv.app import create_app
+from mjv.extensions import db, pool_metrics
+
+
+@pytest.fixture
+def file_app(tmp_path: Path) -> Iterator[Flask]:
+    """App on a database file, pooled with a queue pool."""
+
+    class Config:
+        SQLALCHEMY_DATABASE_URI = f"sqlite:///{tmp_path / 'pool.db'}"
+        SQLALCHEMY_ENGINE_OPTIONS = {"pool_size": 2, "max_overflow": 1, "pool_timeout": 5}
+        TESTING = True
+        JWT_SECRET_KEY = "not-so-secret"
+
+    app = create_app(Config)
+    with app.app_context():
+        yield app
+        db.engine.dispose()
+
+
+def test_pool_stats(file_app: Flask) -> None:
+    """Test checkouts and waits are counted, with the configured pool size."""
+    db.session.execute(text("SELECT 1"))
+    db.session.remove()
+    stats = pool_metrics.stats(file_app)["default"]
+    snapshot = stats.snapshot()
+    assert snapshot["size"] == 2
+    assert snapshot["checkouts"] == 1
+    assert snapshot["connects"] == 1
+    assert snapshot["checked_out"] == 0
+    assert snapshot["wait"].count == 1  # type: ignore
+
+
+def test_pool_created_timed(file_app: Flask) -> None:
+    """Test engines are created with a timed subclass of the pool class they would have."""
+    pool = db.engine.pool
+    assert isinstance(pool, QueuePool)
+    assert type(pool).__name__ == "TimedQueuePool"
+
+
+def test_pool_stats_survive_dispose(file_app: Flask) -> None:
+    """Test the pool recreated by dispose keeps being watched."""
+    stats = pool_metrics.stats(file_app)["default"]
+    db.engine.dispose()
+    db.session.execute(text("SELECT 1"))
+    db.session.remove()
+    assert stats.checkouts == 1
+    assert stats.wait.snapshot().count == 1
+
+
+def test_slow_wait_warning(file_app: Flask, caplog: pytest.LogCaptureFixture) -> None:
+    """Test waits longer than DB_POOL_SLOW_WAIT are logged."""
+    pool_metrics.stats(file_app)["default"].slow_wait = 0
+    with caplog.at_level(logging.WARNING, logger="mjv.pool"):
+        db.session.execute(text("SELECT 1"))
+        db.session.remove()
+    assert "for a database connection" in caplog.text
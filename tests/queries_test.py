@@ -0,0 +1,112 @@
+"""Test queries module."""
+
+import asyncio
+import logging
+
+import pytest
+from flask import Flask
+from sqlalchemy import create_engine, text
+from sqlalchemy.exc import OperationalError
+
+from mjv.app import create_app
+from mjv.extensions import db
+from mjv.queries import QueryBudgetExceeded, QueryMonitor, parameters_shape, query_budget
+
+
+@query_budget(1)
+def two_statements() -> None:
+    """Route going over its budget."""
+    db.session.execute(text("SELECT 1"))
+    db.session.execute(text("SELECT 2"))
+
+
+def test_parameters_shape() -> None:
+    """Test parameters are described by their types only."""
+    assert parameters_shape({"name": "secret", "id": 1}) == "{name: str, id: int}"
+    assert parameters_shape(("secret", None)) == "(str, NoneType)"
+    assert parameters_shape([("a",), ("b",)], executemany=True) == "2 x (str)"
+
+
+def test_query_budget_raises_in_tests(app: Flask) -> None:
+    """Test going over budget fails while testing."""
+    with app.test_request_context():
+        app.preprocess_request()
+        with pytest.raises(QueryBudgetExceeded, match="executed 2 statements, its budget is 1"):
+            two_statements()
+
+
+def test_query_budget_async_route(app: Flask) -> None:
+    """Test async routes are held to their budget too."""
+
+    @query_budget(1)
+    async def route() -> None:
+        db.session.execute(text("SELECT 1"))
+        db.session.execute(text("SELECT 2"))
+
+    with app.test_request_context():
+        app.preprocess_request()
+        with pytest.raises(QueryBudgetExceeded, match="executed 2 statements, its budget is 1"):
+            asyncio.run(route())
+
+
+def test_query_budget_warns(
+    app: Flask, caplog: pytest.LogCaptureFixture, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    """Test going over budget logs a warning otherwise."""
+    monkeypatch.setitem(app.config, "QUERY_BUDGET_RAISE", False)
+    with app.test_request_context(), caplog.at_level(logging.WARNING, "mjv.queries"):
+        app.preprocess_request()
+        two_statements()
+    assert "two_statements executed 2 statements" in caplog.text
+
+
+def test_query_budget_outside_requests(app: Flask) -> None:
+    """Test statements are only counted within requests."""
+    two_statements()
+
+
+def test_slow_statement_log(caplog: pytest.LogCaptureFixture) -> None:
+    """Test statements slower than the threshold are logged with their parameters shape."""
+    app = Flask(__name__)
+    app.config["QUERY_SLOW_THRESHOLD"] = 0
+    engine = create_engine("sqlite://")
+    QueryMonitor.watch(app, engine)
+    with caplog.at_level(logging.WARNING, "mjv.queries"), engine.connect() as connection:
+        connection.execute(text("SELECT :name"), {"name": "secret"})
+    assert "SELECT ?, parameters (str)" in caplog.text
+    assert "secret" not in caplog.text
+
+
+def test_failing_statement_timed(caplog: pytest.LogCaptureFixture) -> None:
+    """Test failing statements are timed too, and not mistaken for the next one."""
+    app = Flask(__name__)
+    app.config["QUERY_SLOW_THRESHOLD"] = 0
+    engine = create_engine("sqlite://")
+    QueryMonitor.watch(app, engine)
+    with caplog.at_level(logging.WARNING, "mjv.queries"), engine.connect() as connection:
+        with pytest.raises(OperationalError):
+            connection.execute(text("SELECT * FROM missing"))
+        connection.execute(text("SELECT 1"))
+    slow = [record.getMessage() for record in caplog.records]
+    assert len(slow) == 2
+    assert "SELECT * FROM missing" in slow[0]
+    assert "SELECT 1" in slow[1]
+
+
+def test_server_timing() -> None:
+    """Test the database time is added to responses when enabled."""
+
+    class Config:
+        SQLALCHEMY_DATABASE_URI = "sqlite:///:memory:"
+        TESTING = True
+        JWT_SECRET_KEY = "not-so-secret"
+        SERVER_TIMING = True
+
+    app = create_app(Config)
+    with app.app_context():
+        db.create_all()
+        response = app.test_client().post("/auth/login", json={"username": "x", "password": "y"})
+    timings = response.headers.getlist("Server-Timing")
+    assert timings[0].startswith("db;dur=")
+    assert timings[0].endswith(';desc="1 statements"')
+    assert timings[1].startswith("app;dur=")
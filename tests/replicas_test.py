@@ -0,0 +1,139 @@
+"""Test replicas module."""
+
+import shutil
+from http import HTTPStatus
+from pathlib import Path
+from typing import Any, Iterator
+
+from flask import Flask, current_app
+from flask.testing import FlaskClient
+from flask_jwt_extended import create_access_token
+from sqlalchemy import text
+
+from mjv.apis.user.models import User
+from mjv.app import create_app
+from mjv.extensions import db, replicas
+from mjv.replicas import STICKY_COOKIE
+
+
+def _replicated_app(tmp_path: Path, **config: Any) -> Flask:
+    """App on a primary database file, with a copy of it as replica."""
+    primary, replica = tmp_path / "primary.db", tmp_path / "replica.db"
+
+    class Config:
+        SQLALCHEMY_DATABASE_URI = f"sqlite:///{primary}"
+        SQLALCHEMY_REPLICA_URIS = [f"sqlite:///{replica}"]
+        TESTING = True
+        SECRET_KEY = "not-so-secret"
+        JWT_SECRET_KEY = "not-so-secret"
+
+    for name, value in config.items():
+        setattr(Config, name, value)
+    app = create_app(Config)
+    with app.app_context():
+        db.create_all()
+        User.create(username="reader", email="reader@example.com", password="password")
+        User.create(username="writer", email="writer@example.com", password="password")
+        db.engine.dispose()
+    shutil.copy(primary, replica)
+    return app
+
+
+def _clients(app: Flask) -> Iterator[FlaskClient]:
+    for user_id in (1, 2):
+        client = app.test_client()
+        with app.app_context():
+            token = create_access_token(identity=user_id)
+        client.environ_base["HTTP_AUTHORIZATION"] = f"Bearer {token}"
+        yield client
+
+
+def _replica_execute(statement: str) -> None:
+    (engine,) = replicas.engines(current_app).values()
+    with engine.begin() as connection:
+        connection.execute(text(statement))
+
+
+def _replicate_todo(task: str) -> None:
+    _replica_execute(
+        f"INSERT INTO todo (id, task, completed, user_id, version) VALUES (1000, '{task}', 0, 1, 1)"
+    )
+
+
+def _tasks(client: FlaskClient) -> list[str]:
+    response = client.get("/todos/")
+    assert response.status_code == HTTPStatus.OK
+    return [todo["task"] for todo in response.get_json()]
+
+
+def test_reads_from_replica(tmp_path: Path) -> None:
+    """Test safe requests read from the replica, writes go to the primary."""
+    app = _replicated_app(tmp_path, REPLICA_STICKY_SECONDS=0)
+    reader, _ = _clients(app)
+    with app.app_context():
+        _replicate_todo("Replicated")
+        response = reader.post("/todos/", json={"task": "Written"})
+        assert response.status_code == HTTPStatus.CREATED
+        assert db.session.scalars(text("SELECT task FROM todo")).all() == ["Written"]
+        assert _tasks(reader) == ["Replicated"]
+
+
+def test_read_your_writes(tmp_path: Path) -> None:
+    """Test users read from the primary for a while after writing, and others from the replica."""
+    app = _replicated_app(tmp_path, REPLICA_STICKY_SECONDS=60, REPLICA_STICKY_COOKIE=False)
+    reader, writer = _clients(app)
+    with app.app_context():
+        _replica_execute(
+            "INSERT INTO todo (id, task, completed, user_id, version) VALUES (1, 'Replicated', 0, 1, 1)"
+        )
+        assert [todo["task"] for todo in reader.get("/todos/").get_json()] == ["Replicated"]
+        assert writer.post("/todos/", json={"task": "Written"}).status_code == HTTPStatus.CREATED
+        # Known by the identity of their token, clients need not keep cookies.
+        assert writer.get_cookie(STICKY_COOKIE) is None
+        assert [todo["task"] for todo in writer.get("/todos/").get_json()] == ["Written"]
+        assert [todo["task"] for todo in reader.get("/todos/").get_json()] == ["Replicated"]
+
+
+def test_read_your_writes_cookie(tmp_path: Path) -> None:
+    """Test the time of the last write is carried by the client, in a signed cookie."""
+    app = _replicated_app(tmp_path, REPLICA_STICKY_SECONDS=60)
+    _, writer = _clients(app)
+    with app.app_context():
+        assert writer.post("/todos/", json={"task": "Written"}).status_code == HTTPStatus.CREATED
+        cookie = writer.get_cookie(STICKY_COOKIE)
+        assert cookie is not None
+        assert _tasks(writer) == ["Written"]
+
+        # Any client, of any worker process, carrying the cookie reads from the primary.
+        app.extensions["replicas"].writers.clear()
+        writer.delete_cookie(STICKY_COOKIE)
+        assert _tasks(writer) == []
+        writer.set_cookie(STICKY_COOKIE, cookie.value)
+        assert _tasks(writer) == ["Written"]
+        writer.set_cookie(STICKY_COOKIE, cookie.value[:-1])
+        assert _tasks(writer) == []
+
+
+def test_fallback_to_primary(tmp_path: Path) -> None:
+    """Test reads go to the primary while the replica is unhealthy."""
+    app = _replicated_app(
+        tmp_path,
+        SQLALCHEMY_REPLICA_URIS=[f"sqlite:///{tmp_path / 'missing' / 'replica.db'}"],
+        REPLICA_STICKY_SECONDS=0,
+    )
+    reader, _ = _clients(app)
+    with app.app_context():
+        reader.post("/todos/", json={"task": "Written"})
+        assert _tasks(reader) == ["Written"]
+        (replica,) = replicas.replicas(app)
+        assert not replica.healthy
+
+
+def test_cached_lists_read_from_primary(tmp_path: Path) -> None:
+    """Test lists missing from the list cache are read from the primary, never cached stale."""
+    app = _replicated_app(tmp_path, REPLICA_STICKY_SECONDS=0, LIST_CACHE_ENABLED=True)
+    reader, _ = _clients(app)
+    with app.app_context():
+        _replicate_todo("Replicated")
+        reader.post("/todos/", json={"task": "Written"})
+        assert _tasks(reader) == _tasks(reader) == ["Written"]
@@ -0,0 +1,47 @@
+import pytest
+import sqlalchemy
+from flask import Flask
+from sqlalchemy.orm import Session
+
+from mjv.apis.todo.models import Todo
+from mjv.apis.todo.search import matching
+from mjv.apis.user.models import User
+
+TASKS = ("Buy milk", "Milky way", "Walk the dog", "Save 100%")
+
+
+@pytest.fixture(scope="module")
+def owner(app: Flask) -> User:
+    user = User.create(username="searcher", email="searcher@example.com", password="password")
+    Todo.bulk_create([{"task": task, "user_id": user.id} for task in TASKS])
+    return user
+
+
+def _search(session: Session, owner: User, terms: str, dialect: str) -> list[str]:
+    query = sqlalchemy.select(Todo.task).where(Todo.user_id == owner.id, matching(terms, dialect))
+    return list(session.scalars(query.order_by(Todo.id)))
+
+
+@pytest.mark.parametrize("dialect", ["sqlite", "postgresql"])
+@pytest.mark.parametrize(
+    ("terms", "expected"),
+    [
+        ("milk", ["Buy milk", "Milky way"]),
+        ("MIL bu", ["Buy milk"]),
+        ("dog walk", ["Walk the dog"]),
+        ("milk dog", []),
+        ("100%", ["Save 100%"]),
+        ("%", []),
+    ],
+)
+def test_search_matches_every_term(
+    session: Session, owner: User, dialect: str, terms: str, expected: list[str]
+) -> None:
+    """Test both the full-text and the ``ILIKE`` search match tasks with every term."""
+    assert _search(session, owner, terms, dialect) == expected
+
+
+def test_fallback_search_matches_within_words(session: Session, owner: User) -> None:
+    """Test the ``ILIKE`` search matches terms anywhere, the full-text one at word starts."""
+    assert _search(session, owner, "ilk", "sqlite") == []
+    assert _search(session, owner, "ilk", "postgresql") == ["Buy milk", "Milky way"]
@@ -0,0 +1,112 @@
+"""Test cases for the prefork server."""
+
+import os
+import re
+import signal
+import socket
+import subprocess
+import sys
+import time
+import urllib.request
+from pathlib import Path
+from types import SimpleNamespace
+from typing import Callable, Iterator
+
+import pytest
+from sqlalchemy import Engine
+
+pytest.importorskip("gunicorn")
+
+from mjv.app import create_app  # noqa: E402
+from mjv.extensions import db, replicas, shards  # noqa: E402
+from mjv.server import post_fork  # noqa: E402
+
+pytestmark = pytest.mark.skipif(not hasattr(os, "fork"), reason="Workers fork")
+
+Server = tuple[subprocess.Popen[bytes], str, Callable[[], str]]
+
+
+def wait_for(condition: Callable[[], object], timeout: float = 10) -> None:
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "Timed out"
+        time.sleep(0.05)
+
+
+@pytest.fixture
+def server(tmp_path: Path) -> Iterator[Server]:
+    """Serve the app on a free port, with one worker replaced after every two requests."""
+    log = tmp_path / "server.log"
+    env = {
+        **os.environ,
+        "DATABASE_URL": f"sqlite:///{tmp_path / 'mjv.db'}",
+        "SECRET_KEY": "not-so-secret",
+        "JWT_SECRET_KEY": "not-so-secret",
+    }
+    with log.open("wb") as output:
+        process = subprocess.Popen(
+            [sys.executable, "-m", "mjv", "serve", "--port", "0", "--workers", "1"]
+            + ["--max-requests", "2", "--keep-alive", "1", "--graceful-timeout", "5"],
+            env=env,
+            stderr=output,
+        )
+    try:
+        wait_for(lambda: "Booting worker" in log.read_text())
+        port = re.search(r"Listening at: http://127.0.0.1:(\d+)", log.read_text())[1]  # type: ignore
+        yield process, f"http://127.0.0.1:{port}", log.read_text
+    finally:
+        if process.poll() is None:
+            process.kill()
+            process.wait()
+
+
+def test_serve(server: Server) -> None:
+    process, url, log = server
+    for _ in range(3):
+        with urllib.request.urlopen(f"{url}/swagger.json") as response:
+            assert response.status == 200
+    wait_for(lambda: log().count("Booting worker") >= 2)
+
+    process.send_signal(signal.SIGHUP)
+    wait_for(lambda: "Handling signal: hup" in log() and log().count("Booting worker") >= 3)
+    with urllib.request.urlopen(f"{url}/swagger.json") as response:
+        assert response.status == 200
+
+    process.send_signal(signal.SIGTERM)
+    assert process.wait(10) == 0
+    assert "Shutting down" in log()
+
+
+def test_serve_slow_client(server: Server) -> None:
+    """Test a client sending its request slower than the keep-alive timeout is served."""
+    _, url, _ = server
+    host, port = url.removeprefix("http://").split(":")
+    with socket.create_connection((host, int(port))) as client:
+        client.sendall(b"GET /swagger.json HTTP/1.1\r\n")
+        time.sleep(1.5)
+        client.sendall(b"Host: localhost\r\nConnection: close\r\n\r\n")
+        assert client.recv(1024).startswith(b"HTTP/1.1 200")
+
+
+def test_worker_disposes_engines(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    """Test a worker disposes of the connections of every engine, opened before the fork."""
+
+    class Config:
+        SQLALCHEMY_DATABASE_URI = f"sqlite:///{tmp_path / 'primary.db'}"
+        SQLALCHEMY_REPLICA_URIS = [f"sqlite:///{tmp_path / 'replica.db'}"]
+        SQLALCHEMY_SHARD_URIS = [f"sqlite:///{tmp_path / 'shard.db'}"]
+        TESTING = True
+        SECRET_KEY = "not-so-secret"
+
+    app = create_app(Config)
+    disposed: list[tuple[Engine, bool]] = []
+    monkeypatch.setattr(
+        Engine, "dispose", lambda engine, close=True: disposed.append((engine, close))
+    )
+    post_fork(SimpleNamespace(app=SimpleNamespace(wsgi=lambda: app)), None)
+
+    with app.app_context():
+        engines = {*db.engines.values(), *replicas.engines(app).values()}
+        engines.update(shards.engines(app).values())
+    assert {engine for engine, _ in disposed} == engines
+    assert not any(close for _, close in disposed)
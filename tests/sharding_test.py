@@ -0,0 +1,172 @@
+"""Test sharding module."""
+
+from http import HTTPStatus
+from pathlib import Path
+from typing import Any, Iterator
+
+import pytest
+from click.testing import CliRunner
+from flask import Flask
+from flask.testing import FlaskClient
+from flask_jwt_extended import create_access_token
+from sqlalchemy import text
+
+from mjv import __main__, sharding
+from mjv.apis.todo.models import Todo
+from mjv.apis.user.models import User
+from mjv.app import create_app
+from mjv.extensions import db, shards
+from mjv.sharding import ShardNotSelected, shard_of
+
+
+@pytest.fixture
+def sharded_app(tmp_path: Path) -> Iterator[Flask]:
+    """App with two shards, users 1 and 3 are on different shards."""
+
+    class Config:
+        SQLALCHEMY_DATABASE_URI = f"sqlite:///{tmp_path / 'primary.db'}"
+        SQLALCHEMY_SHARD_URIS = [f"sqlite:///{tmp_path / f'shard{index}.db'}" for index in range(2)]
+        TESTING = True
+        JWT_SECRET_KEY = "not-so-secret"
+
+    app = create_app(Config)
+    with app.app_context():
+        db.create_all()
+        for name in ("first", "second", "third"):
+            User.create(username=name, email=f"{name}@example.com", password="password")
+        yield app
+        db.session.remove()
+        for engine in (db.engine, *shards.engines(app).values()):
+            engine.dispose()
+
+
+def _client(app: Flask, user_id: int) -> FlaskClient:
+    client = app.test_client()
+    client.environ_base["HTTP_AUTHORIZATION"] = f"Bearer {create_access_token(identity=user_id)}"
+    return client
+
+
+def _shard_tasks(app: Flask, index: int) -> list[tuple[int, str]]:
+    with shards.engines(app)[f"shard_{index}"].connect() as connection:
+        rows = connection.execute(text("SELECT user_id, task FROM todo ORDER BY id"))
+        return [tuple(row) for row in rows]
+
+
+def test_shard_of_is_stable() -> None:
+    assert [shard_of(user_id, 2) for user_id in (1, 3)] == [0, 1]
+    assert shard_of(1, 4) == shard_of("1", 4)
+    assert {shard_of(key, 4) for key in range(100)} == {0, 1, 2, 3}
+
+
+def test_todos_routed_to_user_shard(sharded_app: Flask) -> None:
+    """Test the todos of each user are written to, and read from, their shard."""
+    first, third = _client(sharded_app, 1), _client(sharded_app, 3)
+    assert first.post("/todos/", json={"task": "First"}).status_code == HTTPStatus.CREATED
+    assert third.post("/todos/", json={"task": "Third"}).status_code == HTTPStatus.CREATED
+
+    assert _shard_tasks(sharded_app, 0) == [(1, "First")]
+    assert _shard_tasks(sharded_app, 1) == [(3, "Third")]
+    assert [todo["task"] for todo in first.get("/todos/").get_json()] == ["First"]
+    assert [todo["task"] for todo in third.get("/todos/?q=thi").get_json()] == ["Third"]
+    assert db.session.scalars(text("SELECT count(*) FROM todo")).one() == 0
+
+
+def test_tombstones_routed_to_user_shard(sharded_app: Flask) -> None:
+    third = _client(sharded_app, 3)
+    todo_id = third.post("/todos/", json={"task": "Third"}).get_json()["id"]
+    assert third.delete(f"/todos/{todo_id}").status_code == HTTPStatus.NO_CONTENT
+
+    with shards.engines(sharded_app)["shard_1"].connect() as connection:
+        rows = connection.execute(text("SELECT owner, record_id FROM tombstone"))
+        assert [tuple(row) for row in rows] == [(3, todo_id)]
+    assert third.get("/todos/changes").get_json()["deleted"] == [todo_id]
+
+
+def test_shard_not_selected(sharded_app: Flask) -> None:
+    """Test sharded tables are not queried without a shard, and with one outside requests."""
+    with pytest.raises(ShardNotSelected):
+        Todo.query.all()
+    with shards.using(3):
+        Todo.create(task="Created", user_id=3)
+        assert [todo.task for todo in Todo.query.filter_by(user_id=3)] == ["Created"]
+    assert _shard_tasks(sharded_app, 1) == [(3, "Created")]
+
+
+def test_move_user(sharded_app: Flask, runner: CliRunner, monkeypatch: pytest.MonkeyPatch) -> None:
+    """Test moving the todos of a user pins them to their new shard."""
+    client = _client(sharded_app, 1)
+    client.post("/todos/", json={"task": "Moving"})
+    monkeypatch.setattr(__main__, "load_app", lambda: sharded_app)
+
+    result = runner.invoke(__main__.cli, ["shards", "move", "first", "1"])
+    assert result.exit_code == 0, result.output
+    assert "1 todos of first moved to shard 1" in result.output
+    assert _shard_tasks(sharded_app, 0) == []
+    assert _shard_tasks(sharded_app, 1) == [(1, "Moving")]
+    assert shards.shard_for(1) == 1
+    assert [todo["task"] for todo in client.get("/todos/").get_json()] == ["Moving"]
+
+    result = runner.invoke(__main__.cli, ["shards", "move", "first", "2"])
+    assert result.exit_code != 0
+    assert "No shard 2" in result.output
+
+
+def test_ids_unique_across_shards(sharded_app: Flask) -> None:
+    first, third = _client(sharded_app, 1), _client(sharded_app, 3)
+    ids = {
+        client.post("/todos/", json={"task": "Task"}).get_json()["id"] for client in (first, third)
+    }
+    with shards.using(3):
+        ids.update(todo.id for todo in Todo.bulk_create([{"task": "Bulk", "user_id": 3}] * 2))
+    assert len(ids) == 4
+
+
+def test_moved_todo_keeps_id(sharded_app: Flask) -> None:
+    client = _client(sharded_app, 1)
+    id = client.post("/todos/", json={"task": "Moving"}).get_json()["id"]
+    etag = client.get(f"/todos/{id}").headers["ETag"]
+
+    assert shards.move(1, 1) == 1
+    moved = client.get(f"/todos/{id}")
+    assert moved.status_code == HTTPStatus.OK
+    assert moved.headers["ETag"] == etag
+
+
+def test_failed_move_resumed(sharded_app: Flask, monkeypatch: pytest.MonkeyPatch) -> None:
+    """Test a move failing before the pin removes its copies, and one failing after resumes."""
+    _client(sharded_app, 1).post("/todos/", json={"task": "Moving"})
+
+    def lost(*args: Any) -> None:
+        raise RuntimeError("Connection lost")
+
+    with monkeypatch.context() as patch:
+        patch.setattr(sharding, "shard_of", lost)
+        with pytest.raises(RuntimeError):
+            shards.move(1, 1)
+    assert _shard_tasks(sharded_app, 0) == [(1, "Moving")]
+    assert _shard_tasks(sharded_app, 1) == []
+
+    with monkeypatch.context() as patch:
+        patch.setattr(shards, "_remove_records", lost)
+        with pytest.raises(RuntimeError):
+            shards.move(1, 1)
+    assert shards.shard_for(1) == 1
+    assert _shard_tasks(sharded_app, 0) == _shard_tasks(sharded_app, 1) == [(1, "Moving")]
+    assert shards.move(1, 1) == 1
+    assert _shard_tasks(sharded_app, 0) == []
+    assert _shard_tasks(sharded_app, 1) == [(1, "Moving")]
+
+
+def test_rebalance(sharded_app: Flask, runner: CliRunner, monkeypatch: pytest.MonkeyPatch) -> None:
+    """Test rebalancing moves the todos found on the wrong shard back to their shard."""
+    with shards.engines(sharded_app)["shard_1"].begin() as connection:
+        connection.execute(
+            text("INSERT INTO todo (task, completed, user_id, version) VALUES ('Stray', 0, 1, 1)")
+        )
+    monkeypatch.setattr(__main__, "load_app", lambda: sharded_app)
+
+    result = runner.invoke(__main__.cli, ["shards", "rebalance"])
+    assert result.exit_code == 0, result.output
+    assert "user 1: 1 todos moved from shard 1 to 0" in result.output
+    assert _shard_tasks(sharded_app, 0) == [(1, "Stray")]
+    assert _shard_tasks(sharded_app, 1) == []
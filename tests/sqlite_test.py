@@ -0,0 +1,91 @@
+"""Test sqlite module."""
+
+from pathlib import Path
+from typing import Any, Iterator
+
+import pytest
+from flask import Flask
+from sqlalchemy import event
+
+from mjv.app import create_app
+from mjv.extensions import db, sqlite_tuning
+from mjv.sqlite import _optimize_on_exit, pragmas
+
+
+def _file_app(tmp_path: Path, **config: Any) -> Flask:
+    class Config:
+        SQLALCHEMY_DATABASE_URI = f"sqlite:///{tmp_path / 'tuned.db'}"
+        TESTING = True
+        JWT_SECRET_KEY = "not-so-secret"
+
+    for name, value in config.items():
+        setattr(Config, name, value)
+    return create_app(Config)
+
+
+@pytest.fixture
+def tuned_app(tmp_path: Path) -> Iterator[Flask]:
+    """App on a database file, tuned with the production profile."""
+    app = _file_app(tmp_path, SQLITE_PROFILE="production", SQLITE_PRAGMAS={"busy_timeout": 100})
+    with app.app_context():
+        yield app
+        db.engine.dispose()
+
+
+def _pragma(name: str) -> Any:
+    return db.session.connection().exec_driver_sql(f"PRAGMA {name}").scalar()
+
+
+def test_production_profile(tuned_app: Flask) -> None:
+    """Test the PRAGMAs of the profile and the overrides are set on connect."""
+    assert _pragma("journal_mode") == "wal"
+    assert _pragma("synchronous") == 1
+    assert _pragma("temp_store") == 2
+    assert _pragma("cache_size") == -64 * 1024
+    assert _pragma("busy_timeout") == 100
+
+
+def test_optimize_on_exit(tuned_app: Flask) -> None:
+    """Test PRAGMA optimize runs once before pooled connections are closed on exit only."""
+    statements: list[str] = []
+    event.listen(
+        db.engine, "connect", lambda conn, record: conn.set_trace_callback(statements.append)
+    )
+    db.engine.dispose()
+    db.session.connection()
+    db.session.remove()
+    db.engine.dispose()
+    assert "PRAGMA optimize" not in statements
+
+    sqlite_tuning.watch(tuned_app, db.engine)
+    db.session.connection()
+    db.session.remove()
+    _optimize_on_exit()
+    assert statements[-1] == "PRAGMA optimize"
+    assert statements.count("PRAGMA optimize") == 1
+
+
+def test_no_profile(tmp_path: Path) -> None:
+    """Test connections keep the defaults of SQLite without a profile."""
+    app = _file_app(tmp_path)
+    with app.app_context():
+        assert _pragma("journal_mode") == "delete"
+        db.session.remove()
+        db.engine.dispose()
+
+
+@pytest.mark.parametrize(
+    "profile, overrides",
+    [
+        pytest.param("fastest", {}, id="unknown profile"),
+        pytest.param(None, {"journal_mode": "WAL; DROP TABLE todo"}, id="not a plain value"),
+        pytest.param(None, {"cache size": 1}, id="not a name"),
+    ],
+)
+def test_invalid_pragmas(profile: str | None, overrides: dict[str, Any]) -> None:
+    with pytest.raises(ValueError):
+        pragmas(profile, overrides)
+
+
+def test_unset_pragma() -> None:
+    assert "mmap_size" not in pragmas("production", {"mmap_size": None})
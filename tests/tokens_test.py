@@ -0,0 +1,33 @@
+import inspect
+
+import pytest
+from flask import Flask
+from flask_jwt_extended import create_access_token, decode_token
+from flask_jwt_extended.jwt_manager import JWTManager
+
+from mjv.tokens import CachingJWTManager
+
+
+def test_decode_override_matches() -> None:
+    # The claims cache overrides a private method, which a new release may rename or change.
+    expected = inspect.signature(CachingJWTManager._decode_jwt_from_config).parameters
+    parameters = inspect.signature(JWTManager._decode_jwt_from_config).parameters
+    assert [(p.name, p.default) for p in parameters.values()] == [
+        (p.name, p.default) for p in expected.values()
+    ]
+
+
+def test_claims_are_cached(app: Flask, monkeypatch: pytest.MonkeyPatch) -> None:
+    calls = []
+    decode = JWTManager._decode_jwt_from_config
+
+    def counting_decode(*args, **kwargs):  # type: ignore
+        calls.append(args)
+        return decode(*args, **kwargs)
+
+    monkeypatch.setattr(JWTManager, "_decode_jwt_from_config", counting_decode)
+    token = create_access_token(identity=1)
+    assert decode_token(token) == decode_token(token)
+    assert len(calls) == 1
+    decode_token(token, allow_expired=True)
+    assert len(calls) == 2